@@ -0,0 +1,9 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hypertube.settings")
+
+app = Celery("hypertube")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -259,6 +259,115 @@ TMDB_API_TOKEN = os.getenv('TMDB_API_TOKEN')
 
 OPENSUBTITLES_API_KEY = os.getenv('OPENSUBTITLES_API_KEY')
 
-# Downloads path for movie files
-DOWNLOAD_PATH = '/app/downloads'
+# Downloads path for movie files, the hot storage tier: downloads, conversion output and recently watched titles
+DOWNLOAD_PATH = os.getenv('DOWNLOAD_PATH', '/app/downloads')
 os.makedirs(DOWNLOAD_PATH, exist_ok=True)
+
+# Video packaging mode: "segments" transcodes standalone 10s MP4 files,
+# "hls" runs a single ffmpeg per title producing an fMP4 HLS playlist
+VIDEO_PACKAGING_MODE = os.getenv('VIDEO_PACKAGING_MODE', 'segments')
+
+# Segment transcoding: number of concurrent ffmpeg jobs shared by all titles,
+# and the thread cap given to each ffmpeg process
+VIDEO_TRANSCODE_WORKERS = int(os.getenv('VIDEO_TRANSCODE_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+VIDEO_FFMPEG_THREADS = int(os.getenv('VIDEO_FFMPEG_THREADS', 2))
+
+# Seeking ahead of the download: number of segments after the seek position
+# whose pieces get deadlines, and the deadline step between them
+VIDEO_SEEK_WINDOW_SEGMENTS = int(os.getenv('VIDEO_SEEK_WINDOW_SEGMENTS', 3))
+VIDEO_SEEK_DEADLINE_MS = int(os.getenv('VIDEO_SEEK_DEADLINE_MS', 1000))
+
+# Threads for short blocking work triggered by torrent alerts (probing, final packaging)
+VIDEO_JOB_WORKERS = int(os.getenv('VIDEO_JOB_WORKERS', 4))
+
+# Live download progress is kept in Redis when configured (in-process otherwise)
+# and written to the database on state changes or every N seconds
+REDIS_URL = os.getenv('REDIS_URL')
+VIDEO_PROGRESS_FLUSH_INTERVAL = int(os.getenv('VIDEO_PROGRESS_FLUSH_INTERVAL', 10))
+
+# "threads" runs download jobs inside the web process, "celery" queues them as a
+# fetch metadata -> download and transcode -> finalize chain for `celery -A hypertube worker`.
+VIDEO_PIPELINE = os.getenv('VIDEO_PIPELINE', 'threads')
+# Torrent daemon (`manage.py torrentd`) owning the libtorrent session, e.g. "http://127.0.0.1:6800".
+# Web and Celery workers then only send it commands. Empty: jobs run in the calling process.
+TORRENT_DAEMON_URL = os.getenv('TORRENT_DAEMON_URL', '')
+# Resume data and session (DHT) state of the torrent session, kept across restarts
+TORRENT_STATE_DIR = os.getenv('TORRENT_STATE_DIR', os.path.join(DOWNLOAD_PATH, '.torrent-state'))
+VIDEO_DOWNLOAD_RETRIES = int(os.getenv('VIDEO_DOWNLOAD_RETRIES', 2))
+
+# Without Redis the in-memory broker only reaches workers of the same process (tests, eager mode)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL or 'memory://')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL or 'cache+memory://')
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'false').lower() == 'true'
+CELERY_TASK_ACKS_LATE = True  # A download interrupted by a worker restart is delivered again
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Downloads hold their message for hours, it must not be redelivered meanwhile. Workers read
+# their queues in the order given to -Q, so list "downloads" before "prefetch".
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 12 * 3600, 'queue_order_strategy': 'priority'}
+# Prefetched titles are sent to the "prefetch" queue instead (video.tasks.enqueue_movie)
+CELERY_TASK_ROUTES = {'video.tasks.download_movie': {'queue': 'downloads'}}
+
+# Lifetime of one /video/:id/events stream; clients reconnect automatically.
+# Keep it under the gunicorn worker timeout.
+VIDEO_EVENTS_STREAM_SECONDS = int(os.getenv('VIDEO_EVENTS_STREAM_SECONDS', 25))
+# Event streams open at once per process. Each holds a gunicorn thread (GUNICORN_THREADS),
+# so keep it well below that; clients over the limit poll /video/:id/file-status.
+VIDEO_EVENTS_MAX_STREAMS = int(os.getenv('VIDEO_EVENTS_MAX_STREAMS', 8))
+
+# When set (e.g. "/protected-downloads/"), video files are not streamed by Django:
+# the response carries an X-Accel-Redirect to this internal nginx location instead.
+# Requires clients to reach the API through nginx.
+VIDEO_ACCEL_REDIRECT_PREFIX = os.getenv('VIDEO_ACCEL_REDIRECT_PREFIX', '')
+
+# Startup profile of the segments packaging mode: durations in seconds of the leading
+# segments (e.g. "2,4"), the following ones last the normal segment duration.
+# Short first segments are converted sooner after pressing play. Empty: fixed length.
+VIDEO_STARTUP_SEGMENTS = [float(duration) for duration in os.getenv('VIDEO_STARTUP_SEGMENTS', '').split(',') if duration.strip()]
+# Encode the startup segments at low resolution first when the video is transcoded,
+# and replace them with full-quality output when the transcode workers are idle.
+VIDEO_STARTUP_PREVIEW = os.getenv('VIDEO_STARTUP_PREVIEW', 'false').lower() == 'true'
+
+# Adaptive bitrate ladder of the hls packaging mode, e.g. "1080,720,480". Renditions
+# below the source height are listed in master.m3u8 and packaged on first request.
+VIDEO_ABR_LADDER = [int(height) for height in os.getenv('VIDEO_ABR_LADDER', '').split(',') if height.strip()]
+
+# Download admission: torrents running at once, the others wait in a queue where titles
+# a user waits on come before prefetches. New downloads also wait while the download
+# volume has less free space than the headroom.
+TORRENT_MAX_ACTIVE = int(os.getenv('TORRENT_MAX_ACTIVE', 3))
+TORRENT_DISK_HEADROOM_MB = int(os.getenv('TORRENT_DISK_HEADROOM_MB', 5120))
+# Bandwidth budgets in bytes/s, 0: unlimited
+TORRENT_DOWNLOAD_RATE_LIMIT = int(os.getenv('TORRENT_DOWNLOAD_RATE_LIMIT', 0))
+TORRENT_UPLOAD_RATE_LIMIT = int(os.getenv('TORRENT_UPLOAD_RATE_LIMIT', 0))
+TORRENT_PER_TORRENT_DOWNLOAD_LIMIT = int(os.getenv('TORRENT_PER_TORRENT_DOWNLOAD_LIMIT', 0))
+TORRENT_PER_TORRENT_UPLOAD_LIMIT = int(os.getenv('TORRENT_PER_TORRENT_UPLOAD_LIMIT', 0))
+
+# Eviction of cached titles (downloaded source, segments, subtitles) by a background collector
+# running in the process owning the downloads. Each policy can be disabled with 0.
+VIDEO_CACHE_MAX_IDLE_DAYS = int(os.getenv('VIDEO_CACHE_MAX_IDLE_DAYS', 30))  # Unwatched for this long
+VIDEO_CACHE_QUOTA_GB = float(os.getenv('VIDEO_CACHE_QUOTA_GB', 0))  # Total size of the cached titles
+VIDEO_CACHE_MIN_FREE_GB = float(os.getenv('VIDEO_CACHE_MIN_FREE_GB', 0))  # Free space watermark of the download volume
+# Titles evicted first by the quota and watermark policies: "lru" (least recently watched)
+# or "lfu" (least watched sessions, then least recently watched)
+VIDEO_CACHE_EVICTION_ORDER = os.getenv('VIDEO_CACHE_EVICTION_ORDER', 'lru')
+VIDEO_CACHE_GC_INTERVAL = int(os.getenv('VIDEO_CACHE_GC_INTERVAL', 600))  # Seconds between collections
+
+# Finalize stage: once a title is READY, its output verified and its torrent done seeding,
+# the downloaded original is deleted ("delete"), moved to the cold storage tier ("cold")
+# or kept ("keep"). The converted output alone is streamed afterwards. Opt-in: with
+# "delete" or "cold", the torrent daemon also releases the sources of every READY title at startup.
+VIDEO_SOURCE_RETENTION = os.getenv('VIDEO_SOURCE_RETENTION', 'keep')
+# Cold storage tier, a large slow volume laid out like DOWNLOAD_PATH. Empty: single tier.
+VIDEO_COLD_STORAGE_PATH = os.getenv('VIDEO_COLD_STORAGE_PATH', '')
+# Seeding policy: finished torrents seed until this share ratio (0: no ratio goal)
+# or for this long, then leave the session
+TORRENT_SEED_RATIO = float(os.getenv('TORRENT_SEED_RATIO', 0))
+TORRENT_SEED_MINUTES = int(os.getenv('TORRENT_SEED_MINUTES', 60))
+
+# READY titles unwatched for this many days move to the cold tier in the background (0: never);
+# streaming a cold title moves it back to the hot tier
+VIDEO_STORAGE_DEMOTE_DAYS = int(os.getenv('VIDEO_STORAGE_DEMOTE_DAYS', 7))
+
+# Multi-file torrents only download the selected video file; also download the
+# subtitle files bundled with it
+TORRENT_KEEP_SUBTITLE_FILES = os.getenv('TORRENT_KEEP_SUBTITLE_FILES', 'false').lower() == 'true'
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_moviefile_imdb_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviefile',
+            name='source_path',
+            field=models.CharField(blank=True, max_length=1000, null=True),
+        ),
+        migrations.AlterField(
+            model_name='moviefile',
+            name='tmdb_id',
+            field=models.IntegerField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_moviefile_source_path_alter_moviefile_tmdb_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviefile',
+            name='watch_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_moviefile_watch_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviefile',
+            name='pipeline_task_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
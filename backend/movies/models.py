@@ -1,16 +1,16 @@
 from django.db import models
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.utils import timezone
 from django.conf import settings
-import os
 
 
 class MovieFile(models.Model):
 	"""Model for movie file and streaming information"""
-	tmdb_id = models.IntegerField()  # TMDB movie ID
+	tmdb_id = models.IntegerField(db_index=True)  # TMDB movie ID
 	imdb_id = models.CharField(max_length=20, null=True, blank=True)  # IMDB ID without 'tt' prefix
 	magnet_link = models.TextField()
 	file_path = models.CharField(max_length=1000, null=True, blank=True)
+	source_path = models.CharField(max_length=1000, null=True, blank=True)  # Downloaded original, relative to the downloads root
 	download_status = models.CharField(
 		max_length=20,
 		choices=[
@@ -24,24 +24,25 @@ class MovieFile(models.Model):
 	)
 	download_progress = models.FloatField(default=0)
 	last_watched = models.DateTimeField(null=True, blank=True)
+	watch_count = models.IntegerField(default=0)  # Viewing sessions, used by the LFU eviction order
 	subtitles_path = models.CharField(max_length=1000, null=True, blank=True)
+	pipeline_task_id = models.CharField(max_length=255, null=True, blank=True)  # Celery pipeline queued or running, cleared when it ends
 	created_at = models.DateTimeField(auto_now_add=True)
 
-	def save(self, *args, **kwargs):
-		# Check if file should be deleted (unwatched for a month)
-		if self.last_watched:
-			month_ago = timezone.now() - timedelta(days=30)
-			if self.last_watched < month_ago:
-				if self.file_path and os.path.exists(self.file_path):
-					os.remove(self.file_path)
-				if self.subtitles_path and os.path.exists(self.subtitles_path):
-					os.remove(self.subtitles_path)
-				self.file_path = None
-				self.subtitles_path = None
-				self.download_status = "PENDING"
-				self.download_progress = 0
+	WATCH_SESSION_GAP = timedelta(hours=1)
+	WATCH_TOUCH_INTERVAL = timedelta(minutes=10)
 
-		super().save(*args, **kwargs)
+	def mark_watched(self):
+		"""Record playback, requests less than WATCH_SESSION_GAP apart belong to the same viewing session"""
+		now = timezone.now()
+		idle = now - self.last_watched if self.last_watched else None
+		if idle is not None and idle < self.WATCH_TOUCH_INTERVAL:
+			return
+		fields = {"last_watched": now}
+		if idle is None or idle >= self.WATCH_SESSION_GAP:
+			fields["watch_count"] = models.F("watch_count") + 1
+		MovieFile.objects.filter(pk=self.pk).update(**fields)
+		self.last_watched = now
 
 
 class Comment(models.Model):
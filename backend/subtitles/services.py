@@ -3,6 +3,7 @@ import requests
 import os
 from django.conf import settings
 from movies.models import MovieFile
+from video.storage import storage
 from srt_to_vtt import srt_to_vtt
 
 
@@ -64,7 +65,7 @@ class SubtitleService:
                             download_url = download_data.get('link')
 
                             if download_url:
-                                subtitles_dir = os.path.join(settings.MEDIA_ROOT, 'downloads/subtitles', str(movie.tmdb_id))
+                                subtitles_dir = storage.hot_path(storage.subtitles_root(movie.tmdb_id))
                                 os.makedirs(subtitles_dir, exist_ok=True)
 
                                 srt_path = os.path.join(subtitles_dir, f"{lang}.srt")
@@ -2,8 +2,8 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.http import HttpResponse, Http404
-from django.conf import settings
 from movies.models import MovieFile
+from video.storage import storage
 from .models import Subtitle
 from .serializers import SubtitleSerializer
 from rest_framework.pagination import PageNumberPagination
@@ -57,7 +57,7 @@ class SubtitleViewSet(viewsets.ReadOnlyModelViewSet):
             raise Http404("Movie ID and language are required")
 
         # Construct the file path
-        file_path = os.path.join(settings.MEDIA_ROOT, 'downloads', 'subtitles', movie_id, f'{language}.vtt')
+        file_path = storage.path(os.path.join(storage.subtitles_root(movie_id), f'{language}.vtt'))
         
         if not os.path.exists(file_path):
             raise Http404("Subtitle file not found")
@@ -0,0 +1,117 @@
+import heapq
+import itertools
+import logging
+import shutil
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+
+class AdmissionScheduler:
+    """Admits download jobs into the torrent session within the concurrency and disk budgets.
+
+    Jobs wait in a priority queue: titles a user is waiting on come before
+    prefetches, in arrival order otherwise. A job holds its slot until its
+    torrent finished downloading or the job is closed.
+    """
+
+    WAITING = 0
+    PREFETCH = 1
+    RECHECK_INTERVAL = 30  # seconds between admission attempts while the disk is full
+
+    def __init__(self, max_active: int, disk_headroom: int, download_path: str):
+        self.max_active = max_active
+        self.disk_headroom = disk_headroom
+        self.download_path = download_path
+        self._queue = []  # Heap of [priority, sequence, job], job is None once removed
+        self._entries = {}  # tmdb_id -> heap entry
+        self._active = {}  # tmdb_id -> job
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def submit(self, job, priority: int = WAITING) -> int:
+        """Start the job now if the budgets allow it, queue it otherwise. Returns its queue position (0: started)."""
+        with self._lock:
+            entry = self._entries.get(job.tmdb_id)
+            if entry is None:
+                self._push(job, priority)
+            elif priority < entry[0]:
+                # A user now waits on a prefetched title
+                queued_job, entry[2] = entry[2], None
+                self._push(queued_job, priority)
+            self._admit()
+            return self.position(job.tmdb_id) or 0
+
+    def _push(self, job, priority: int):
+        entry = [priority, next(self._sequence), job]
+        self._entries[job.tmdb_id] = entry
+        heapq.heappush(self._queue, entry)
+
+    def position(self, tmdb_id) -> Optional[int]:
+        """1-based position of a queued title, None when it is not queued."""
+        with self._lock:
+            entry = self._entries.get(tmdb_id)
+            if entry is None:
+                return None
+            return sorted(queued[:2] for queued in self._entries.values()).index(entry[:2]) + 1
+
+    def queued(self) -> list:
+        with self._lock:
+            return [queued[2] for queued in sorted(self._entries.values(), key=lambda queued: queued[:2])]
+
+    def cancel(self, tmdb_id) -> bool:
+        with self._lock:
+            entry = self._entries.pop(tmdb_id, None)
+            if entry is None:
+                return False
+            entry[2] = None
+            return True
+
+    def release(self, job):
+        """Give back the slot of a job whose download finished or stopped."""
+        with self._lock:
+            if self._active.get(job.tmdb_id) is job:
+                del self._active[job.tmdb_id]
+                self._admit()
+
+    def has_disk_headroom(self) -> bool:
+        return shutil.disk_usage(self.download_path).free >= self.disk_headroom
+
+    def _admit(self):
+        while self._entries and len(self._active) < self.max_active:
+            if not self.has_disk_headroom():
+                logging.warning(f"Less than {self.disk_headroom // 2 ** 20} MB free, {len(self._entries)} downloads wait")
+                self._schedule_recheck()
+                return
+
+            _, _, job = heapq.heappop(self._queue)
+            if job is None:
+                continue  # Cancelled or re-queued with a higher priority
+            del self._entries[job.tmdb_id]
+            self._active[job.tmdb_id] = job
+            job.admission_release = self.release
+            try:
+                job.start()
+            except Exception as e:
+                logging.error(f"Could not start download of movie {job.tmdb_id}: {e}")
+                self._active.pop(job.tmdb_id, None)
+
+    def _schedule_recheck(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(self.RECHECK_INTERVAL, self._recheck)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _recheck(self):
+        with self._lock:
+            self._admit()
+
+
+admission = AdmissionScheduler(
+    settings.TORRENT_MAX_ACTIVE,
+    settings.TORRENT_DISK_HEADROOM_MB * 2 ** 20,
+    settings.DOWNLOAD_PATH,
+)
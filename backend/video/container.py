@@ -0,0 +1,297 @@
+import struct
+from typing import List, Optional, Tuple
+
+from .fmp4 import _boxes, _child
+
+HEAD_BYTES = 1024 * 1024  # Holds the container header, or tells where the index is
+TAIL_BYTES = 4 * 1024 * 1024  # Fetched first when the layout is unknown (e.g. AVI idx1)
+INDEX_MAX_BYTES = 16 * 1024 * 1024
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+CUES_ID = 0x1C53BB6B
+CLUSTER_ID = 0x1F43B675
+INFO_ID = 0x1549A966
+TIMESTAMP_SCALE_ID = 0x2AD7B1
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_NUMBER_ID = 0xD7
+TRACK_TYPE_ID = 0x83
+CUE_POINT_ID = 0xBB
+CUE_TIME_ID = 0xB3
+CUE_TRACK_POSITIONS_ID = 0xB7
+CUE_TRACK_ID = 0xF7
+CUE_CLUSTER_POSITION_ID = 0xF1
+
+
+def trailing_index_range(head: bytes, file_size: int) -> Optional[Tuple[int, int]]:
+    """Byte range [start, end) of the seek index of a video when it lies after its head.
+
+    The index is the moov box of MP4/MOV files and the Cues of Matroska files.
+    Returns None when the head already holds it (or the file has none, e.g.
+    fragmented MP4), and the tail of the file when the layout is unknown.
+    """
+    if head[4:8] == b"ftyp":
+        return _mp4_moov_range(head, file_size)
+    if head[:4] == struct.pack(">I", EBML_ID):
+        return _mkv_cues_range(head, file_size)
+    return max(0, file_size - TAIL_BYTES), file_size
+
+
+def _mp4_moov_range(head: bytes, file_size: int) -> Optional[Tuple[int, int]]:
+    position = 0
+    while position + 8 <= len(head):
+        size, box_type = struct.unpack(">I4s", head[position:position + 8])
+        if size == 1:
+            if position + 16 > len(head):
+                break
+            size = struct.unpack(">Q", head[position + 8:position + 16])[0]
+        elif size == 0:
+            return None  # Last box, extends to the end of the file
+        if size < 8:
+            return None
+        if box_type == b"moov":
+            return None if position + size <= len(head) else (position, min(position + size, file_size))
+        position += size
+    # Boxes after mdat: the moov box and whatever trails it
+    return (position, file_size) if position < file_size else None
+
+
+def _read_vint(data: bytes, position: int, keep_marker: bool = False) -> Tuple[Optional[int], int]:
+    """EBML variable-length integer at position: (value, next position), value None when truncated."""
+    if position >= len(data):
+        return None, position
+    first = data[position]
+    length = next((bit + 1 for bit in range(8) if first & (0x80 >> bit)), None)
+    if length is None or position + length > len(data):
+        return None, position
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[position + 1:position + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = -1  # Unknown size
+    return value, position + length
+
+
+def _elements(data: bytes, start: int, end: int):
+    """Yield (id, payload_start, payload_end) of the EBML elements in data[start:end]"""
+    position = start
+    while position < end:
+        element_id, position = _read_vint(data, position, keep_marker=True)
+        size, position = _read_vint(data, position) if element_id is not None else (None, position)
+        if element_id is None or size is None:
+            return
+        payload_end = end if size < 0 else position + size
+        yield element_id, position, payload_end
+        position = payload_end
+
+
+def _mkv_layout(head: bytes) -> Optional[Tuple[int, dict]]:
+    """(segment payload start, {element id: absolute position}) of the top-level elements known from the head"""
+    segment = next(((start, end) for kind, start, end in _elements(head, 0, len(head)) if kind == SEGMENT_ID), None)
+    if segment is None:
+        return None
+    segment_start, segment_end = segment
+    positions = {}
+    header = segment_start  # Elements follow each other, each header starts where the previous payload ends
+    for kind, start, end in _elements(head, segment_start, min(segment_end, len(head))):
+        if kind == CLUSTER_ID:
+            break
+        positions.setdefault(kind, header)
+        header = end
+        if kind != SEEK_HEAD_ID:
+            continue
+        for seek_kind, seek_start, seek_end in _elements(head, start, min(end, len(head))):
+            if seek_kind != SEEK_ID:
+                continue
+            fields = {
+                field: head[field_start:field_end]
+                for field, field_start, field_end in _elements(head, seek_start, seek_end)
+            }
+            if SEEK_ID_ID in fields and SEEK_POSITION_ID in fields:
+                element_id = int.from_bytes(fields[SEEK_ID_ID], "big")
+                positions.setdefault(element_id, segment_start + int.from_bytes(fields[SEEK_POSITION_ID], "big"))
+    return segment_start, positions
+
+
+def _mkv_cues_range(head: bytes, file_size: int) -> Optional[Tuple[int, int]]:
+    layout = _mkv_layout(head)
+    cues_start = layout[1].get(CUES_ID) if layout else None
+    if cues_start is None:
+        # No seek head pointing at the Cues: they usually follow the last cluster
+        return max(0, file_size - TAIL_BYTES), file_size
+    if cues_start < len(head):
+        return None  # Indexed before the clusters, or right after the head: the sequential download gets there first
+    return cues_start, min(cues_start + INDEX_MAX_BYTES, file_size)
+
+
+def read_keyframes(path: str) -> Optional[List[List[float]]]:
+    """[pts_time, byte_offset] of the video keyframes, from the container's own index.
+
+    Reads the sample tables of MP4/MOV files (stss, stco, stsz...) and the Cues of
+    Matroska files instead of scanning every packet. Returns None when the file
+    has no such index or it is not on disk yet; callers fall back to ffprobe.
+    """
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+        try:
+            if head[4:8] == b"ftyp":
+                return _mp4_keyframes(f)
+            if head[:4] == struct.pack(">I", EBML_ID):
+                return _mkv_keyframes(f, head)
+        except (struct.error, IndexError, ValueError, ZeroDivisionError):
+            return None  # Truncated or not downloaded yet (zeros)
+    return None
+
+
+def _mp4_keyframes(f) -> Optional[List[List[float]]]:
+    file_size = f.seek(0, 2)
+    position = 0
+    while position + 8 <= file_size:
+        f.seek(position)
+        header = f.read(16)
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - position
+        if size < header_size:
+            return None
+        if box_type == b"moov":
+            f.seek(position + header_size)
+            return _moov_keyframes(f.read(size - header_size))
+        position += size
+    return None
+
+
+def _moov_keyframes(moov: bytes) -> Optional[List[List[float]]]:
+    for kind, payload, end in _boxes(moov):
+        if kind != b"trak":
+            continue
+        mdia = _child(moov, payload, end, b"mdia")
+        if not mdia:
+            continue
+        hdlr = _child(moov, mdia[0], mdia[1], b"hdlr")
+        mdhd = _child(moov, mdia[0], mdia[1], b"mdhd")
+        minf = _child(moov, mdia[0], mdia[1], b"minf")
+        if not hdlr or not mdhd or not minf or moov[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+            continue
+        stbl = _child(moov, minf[0], minf[1], b"stbl")
+        if not stbl:
+            return None
+        timescale_at = mdhd[0] + (20 if moov[mdhd[0]] == 1 else 12)
+        timescale = struct.unpack(">I", moov[timescale_at:timescale_at + 4])[0]
+        tables = {kind: moov[start:end] for kind, start, end in _boxes(moov, stbl[0], stbl[1])}
+        return _sample_table_keyframes(tables, timescale)
+    return None
+
+
+def _table(data: bytes, entry_format: str) -> list:
+    """Entries of a full box table: version and flags, entry count, then the entries"""
+    count = struct.unpack(">I", data[4:8])[0]
+    entry_size = struct.calcsize(entry_format)
+    return [struct.unpack_from(entry_format, data, 8 + number * entry_size) for number in range(count)]
+
+
+def _sample_table_keyframes(tables: dict, timescale: int) -> Optional[List[List[float]]]:
+    uniform_size, sample_count = struct.unpack(">II", tables[b"stsz"][4:12])
+    sizes = [uniform_size] * sample_count if uniform_size else struct.unpack_from(f">{sample_count}I", tables[b"stsz"], 12)
+    if b"co64" in tables:
+        chunk_offsets = [offset for offset, in _table(tables[b"co64"], ">Q")]
+    else:
+        chunk_offsets = [offset for offset, in _table(tables[b"stco"], ">I")]
+
+    # Byte offset of every sample, from the chunk offsets and the sample-to-chunk runs
+    sample_offsets = []
+    sample_to_chunk = _table(tables[b"stsc"], ">III")
+    for run, (first_chunk, samples_per_chunk, _) in enumerate(sample_to_chunk):
+        last_chunk = sample_to_chunk[run + 1][0] - 1 if run + 1 < len(sample_to_chunk) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(samples_per_chunk):
+                if len(sample_offsets) >= sample_count:
+                    break
+                sample_offsets.append(offset)
+                offset += sizes[len(sample_offsets) - 1]
+
+    # Presentation time of every sample: decode time plus composition offset
+    times = []
+    decode_time = 0
+    for count, delta in _table(tables[b"stts"], ">II"):
+        for _ in range(count):
+            times.append(decode_time)
+            decode_time += delta
+    if b"ctts" in tables:
+        composition = [offset for count, offset in _table(tables[b"ctts"], ">Ii") for _ in range(count)]
+        times = [time + offset for time, offset in zip(times, composition)] + times[len(composition):]
+
+    # Without a stss box every sample is a sync sample
+    sync_samples = [number for number, in _table(tables[b"stss"], ">I")] if b"stss" in tables else range(1, sample_count + 1)
+    keyframes = [
+        [round(times[number - 1] / timescale, 3), sample_offsets[number - 1]]
+        for number in sync_samples
+        if number - 1 < min(len(times), len(sample_offsets))
+    ]
+    return sorted(keyframes) or None
+
+
+def _read_element(f, position: int, element_id: int) -> Optional[bytes]:
+    """Payload of the EBML element expected at position, None when something else (or nothing yet) is there"""
+    f.seek(position)
+    header = f.read(12)
+    kind, offset = _read_vint(header, 0, keep_marker=True)
+    size, offset = _read_vint(header, offset)
+    if kind != element_id or size is None or size < 0:
+        return None
+    f.seek(position + offset)
+    payload = f.read(size)
+    return payload if len(payload) == size else None
+
+
+def _uint_fields(data: bytes, start: int, end: int) -> dict:
+    return {kind: int.from_bytes(data[field_start:field_end], "big") for kind, field_start, field_end in _elements(data, start, end)}
+
+
+def _mkv_keyframes(f, head: bytes) -> Optional[List[List[float]]]:
+    layout = _mkv_layout(head)
+    if layout is None or CUES_ID not in layout[1]:
+        return None
+    segment_start, positions = layout
+
+    timestamp_scale = 1000000  # Nanoseconds per timestamp unit, the Matroska default
+    info = _read_element(f, positions[INFO_ID], INFO_ID) if INFO_ID in positions else None
+    if info is not None:
+        timestamp_scale = _uint_fields(info, 0, len(info)).get(TIMESTAMP_SCALE_ID, timestamp_scale)
+
+    video_track = None
+    tracks = _read_element(f, positions[TRACKS_ID], TRACKS_ID) if TRACKS_ID in positions else None
+    for kind, start, end in _elements(tracks or b"", 0, len(tracks or b"")):
+        fields = _uint_fields(tracks, start, end) if kind == TRACK_ENTRY_ID else {}
+        if fields.get(TRACK_TYPE_ID) == 1:
+            video_track = fields.get(TRACK_NUMBER_ID)
+            break
+
+    cues = _read_element(f, positions[CUES_ID], CUES_ID)
+    if cues is None:
+        return None
+    keyframes = []
+    for kind, start, end in _elements(cues, 0, len(cues)):
+        if kind != CUE_POINT_ID:
+            continue
+        cue_time = cluster_position = None
+        for field, field_start, field_end in _elements(cues, start, end):
+            if field == CUE_TIME_ID:
+                cue_time = int.from_bytes(cues[field_start:field_end], "big")
+            elif field == CUE_TRACK_POSITIONS_ID and cluster_position is None:
+                track_position = _uint_fields(cues, field_start, field_end)
+                if video_track is None or track_position.get(CUE_TRACK_ID) == video_track:
+                    cluster_position = track_position.get(CUE_CLUSTER_POSITION_ID)
+        if cue_time is not None and cluster_position is not None:
+            keyframes.append([round(cue_time * timestamp_scale / 1e9, 3), segment_start + cluster_position])
+    return sorted(keyframes) or None
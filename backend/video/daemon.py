@@ -0,0 +1,105 @@
+import json
+import logging
+import re
+import signal
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import close_old_connections
+from movies.models import MovieFile
+from .engine import LocalEngine
+from .eviction import collector
+from .retention import release_finished_sources
+from .torrent import TorrentSessionManager
+
+job_path_re = re.compile(r"^/jobs/(\d+)(/seek)?/?$")
+
+
+class TorrentDaemonHandler(BaseHTTPRequestHandler):
+    """JSON API of the torrent daemon, only meant to be reachable from localhost.
+
+    GET /jobs                   - Active jobs
+    POST /jobs/:tmdb_id         - Start downloading and converting a title
+    GET /jobs/:tmdb_id          - Live state of a job
+    POST /jobs/:tmdb_id/seek    - Prioritize the segments after {"position": seconds}
+    DELETE /jobs/:tmdb_id       - Cancel a job
+    """
+
+    engine = LocalEngine()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/jobs":
+            return self._reply(200, self.engine.jobs())
+        self._dispatch(lambda tmdb_id, seek: None if seek else self.engine.status(tmdb_id))
+
+    def do_POST(self):
+        def post(tmdb_id, seek):
+            if seek:
+                return self.engine.seek(tmdb_id, float(self._body().get("position", 0)))
+            return self.engine.start(tmdb_id, prefetch=bool(self._body().get("prefetch")))
+
+        self._dispatch(post)
+
+    def do_DELETE(self):
+        def delete(tmdb_id, seek):
+            if seek or not self.engine.remove(tmdb_id):
+                return None
+            return {"removed": True}
+
+        self._dispatch(delete)
+
+    def _dispatch(self, handler):
+        match = job_path_re.match(self.path)
+        if not match:
+            return self._reply(404, {"error": "Not found"})
+        close_old_connections()
+        try:
+            result = handler(int(match.group(1)), bool(match.group(2)))
+        except MovieFile.DoesNotExist:
+            result = None
+        except (TypeError, ValueError) as e:
+            return self._reply(400, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"Torrent daemon error on {self.command} {self.path}: {e}")
+            return self._reply(500, {"error": str(e)})
+        if result is None:
+            return self._reply(404, {"error": "No such job"})
+        self._reply(200, result)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _reply(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"torrentd: {format % args}")
+
+
+def serve(host: str, port: int, resume: bool = True):
+    if resume:
+        resumed = TorrentDaemonHandler.engine.resume_unfinished()
+        logging.info(f"Resumed {resumed} unfinished downloads")
+    # Torrents are not restored for finished titles, nothing seeds their sources anymore
+    released = release_finished_sources()
+    if released:
+        logging.info(f"Released the sources of {released} converted movies")
+
+    collector.start()
+
+    # Exit through SystemExit on SIGTERM so the torrent state is saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = ThreadingHTTPServer((host, port), TorrentDaemonHandler)
+    server.daemon_threads = True
+    logging.info(f"Torrent daemon listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        TorrentSessionManager().shutdown()
@@ -0,0 +1,139 @@
+import logging
+import time
+from typing import Optional
+
+import requests
+from django.conf import settings
+from movies.models import MovieFile
+from .admission import AdmissionScheduler, admission
+from .eviction import collector
+from .jobs import DownloadJob, active_jobs
+
+
+class EngineUnavailable(Exception):
+    """The torrent daemon could not be reached"""
+
+
+class LocalEngine:
+    """Runs download jobs in this process (single worker deployments, and the torrent daemon itself)."""
+
+    UNFINISHED_STATUSES = ["DOWNLOADING", "DL_AND_CONVERT", "CONVERTING"]
+
+    def resume_unfinished(self) -> int:
+        """Restart the jobs a previous run left unfinished, their torrents continue from saved resume data."""
+        unfinished = MovieFile.objects.filter(download_status__in=self.UNFINISHED_STATUSES) | MovieFile.objects.filter(
+            download_status="PLAYABLE", download_progress__lt=100
+        )
+        resumed = 0
+        for movie_file in unfinished:
+            try:
+                self.start(movie_file.tmdb_id)
+                resumed += 1
+            except Exception as e:
+                logging.error(f"Could not resume movie {movie_file.tmdb_id}: {e}")
+        return resumed
+
+    def start(self, tmdb_id, prefetch: bool = False) -> dict:
+        """Admit the title's download job, or queue it until the budgets allow it."""
+        collector.start()
+        job = active_jobs.get(int(tmdb_id))
+        if job is None:
+            queued = next((job for job in admission.queued() if job.tmdb_id == int(tmdb_id)), None)
+            job = queued or DownloadJob(MovieFile.objects.get(tmdb_id=tmdb_id))
+            admission.submit(job, AdmissionScheduler.PREFETCH if prefetch else AdmissionScheduler.WAITING)
+        return self.status(tmdb_id)
+
+    def status(self, tmdb_id) -> Optional[dict]:
+        job = active_jobs.get(int(tmdb_id))
+        if job is not None:
+            return dict(job.torrent_status(), queue_position=0)
+        position = admission.position(int(tmdb_id))
+        if position is not None:
+            return {"tmdb_id": int(tmdb_id), "status": "PENDING", "queue_position": position, "closed": False}
+        return None
+
+    def seek(self, tmdb_id, position: float) -> Optional[dict]:
+        job = active_jobs.get(int(tmdb_id))
+        if job is None:
+            return None
+        segment = job.seek(position)
+        return {"segment": segment, "ready": job.is_segment_ready(segment)}
+
+    def remove(self, tmdb_id) -> bool:
+        if admission.cancel(int(tmdb_id)):
+            return True
+        job = active_jobs.get(int(tmdb_id))
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def jobs(self) -> list:
+        queued = [self.status(job.tmdb_id) for job in admission.queued()]
+        return [dict(job.torrent_status(), queue_position=0) for job in list(active_jobs.values())] + queued
+
+    def wait(self, tmdb_id, timeout: Optional[float] = None):
+        deadline = time.time() + timeout if timeout else None
+        while admission.position(int(tmdb_id)) is not None:
+            if deadline and time.time() >= deadline:
+                return
+            time.sleep(1)
+        job = active_jobs.get(int(tmdb_id))
+        if job is not None:
+            job.wait(deadline - time.time() if deadline else None)
+
+
+class DaemonEngine:
+    """Thin client of the torrent daemon (`manage.py torrentd`), which owns the only libtorrent session."""
+
+    TIMEOUT = 5
+    WAIT_POLL_INTERVAL = 5
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def _request(self, method: str, path: str, **kwargs):
+        try:
+            response = requests.request(method, f"{self.url}{path}", timeout=self.TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            raise EngineUnavailable(f"Torrent daemon unreachable: {e}") from e
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 400:
+            raise EngineUnavailable(f"Torrent daemon error {response.status_code}: {response.text}")
+        return response.json()
+
+    def start(self, tmdb_id, prefetch: bool = False) -> dict:
+        return self._request("POST", f"/jobs/{tmdb_id}", json={"prefetch": prefetch})
+
+    def status(self, tmdb_id) -> Optional[dict]:
+        return self._request("GET", f"/jobs/{tmdb_id}")
+
+    def seek(self, tmdb_id, position: float) -> Optional[dict]:
+        return self._request("POST", f"/jobs/{tmdb_id}/seek", json={"position": position})
+
+    def remove(self, tmdb_id) -> bool:
+        return self._request("DELETE", f"/jobs/{tmdb_id}") is not None
+
+    def jobs(self) -> list:
+        return self._request("GET", "/jobs") or []
+
+    def wait(self, tmdb_id, timeout: Optional[float] = None):
+        deadline = time.time() + timeout if timeout else None
+        while deadline is None or time.time() < deadline:
+            try:
+                state = self.status(tmdb_id)
+                if state is None or state.get("closed"):
+                    return
+            except EngineUnavailable as e:
+                logging.warning(str(e))
+            time.sleep(self.WAIT_POLL_INTERVAL)
+
+
+def create_engine():
+    if settings.TORRENT_DAEMON_URL:
+        return DaemonEngine(settings.TORRENT_DAEMON_URL)
+    return LocalEngine()
+
+
+engine = create_engine()
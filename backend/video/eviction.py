@@ -0,0 +1,248 @@
+import logging
+import os
+import shutil
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from movies.models import MovieFile
+from .admission import admission
+from .jobs import active_jobs
+from .models import ProbeResult, Segment
+from .storage import storage
+
+DiskUsage = namedtuple("DiskUsage", ["cached", "free"])
+
+
+def disk_usage(path: str) -> int:
+    """Bytes allocated to the files under path (partial torrent files are sparse)."""
+    if os.path.isfile(path):
+        return os.lstat(path).st_blocks * 512
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass  # Removed meanwhile
+    return total
+
+
+class Footprint:
+    """Disk usage of one title across storage tiers: downloaded source, converted output and subtitles"""
+
+    def __init__(self, movie_file: MovieFile):
+        self.movie_file = movie_file
+        self.tmdb_id = movie_file.tmdb_id
+        self.movie_root = storage.movie_root(movie_file.tmdb_id)
+        self.subtitles_root = storage.subtitles_root(movie_file.tmdb_id)
+        source_path = storage.path(movie_file.source_path) if movie_file.source_path else None
+        self.source = disk_usage(source_path) if source_path and os.path.exists(source_path) else 0
+        movie_dirs = [os.path.join(root, self.movie_root) for root in storage.roots()]
+        self.hot = disk_usage(movie_dirs[0]) if os.path.isdir(movie_dirs[0]) else 0
+        self.converted = sum(disk_usage(path) for path in movie_dirs if os.path.isdir(path)) - self.source
+        subtitles_dir = storage.hot_path(self.subtitles_root)
+        self.subtitles = disk_usage(subtitles_dir) if os.path.isdir(subtitles_dir) else 0
+
+    @property
+    def total(self) -> int:
+        return self.source + self.converted + self.subtitles
+
+    @property
+    def last_used(self):
+        return self.movie_file.last_watched or self.movie_file.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "tmdb_id": self.tmdb_id,
+            "source": self.source,
+            "converted": self.converted,
+            "subtitles": self.subtitles,
+            "total": self.total,
+            "hot": self.hot,
+            "last_used": self.last_used.isoformat(),
+            "watch_count": self.movie_file.watch_count,
+        }
+
+
+class MaxIdlePolicy:
+    """Evict the titles nobody watched for max_idle."""
+
+    def __init__(self, max_idle: timedelta):
+        self.max_idle = max_idle
+
+    def select(self, candidates: List[Footprint], usage: DiskUsage) -> List[Footprint]:
+        cutoff = timezone.now() - self.max_idle
+        return [footprint for footprint in candidates if footprint.last_used < cutoff]
+
+
+class QuotaPolicy:
+    """Evict titles in eviction order until the cached titles fit in the quota."""
+
+    def __init__(self, quota: int):
+        self.quota = quota
+
+    def select(self, candidates: List[Footprint], usage: DiskUsage) -> List[Footprint]:
+        return _take_until(candidates, usage.cached - self.quota)
+
+
+class FreeSpacePolicy:
+    """Evict titles in eviction order until the download volume has min_free bytes free."""
+
+    def __init__(self, min_free: int):
+        self.min_free = min_free
+
+    def select(self, candidates: List[Footprint], usage: DiskUsage) -> List[Footprint]:
+        # Only files on the hot tier free space on the download volume
+        return _take_until([footprint for footprint in candidates if footprint.hot], self.min_free - usage.free, "hot")
+
+
+def _take_until(candidates: List[Footprint], excess: int, size: str = "total") -> List[Footprint]:
+    selected = []
+    for footprint in candidates:
+        if excess <= 0:
+            break
+        selected.append(footprint)
+        excess -= getattr(footprint, size)
+    return selected
+
+
+class DiskGarbageCollector:
+    """Evicts cached titles from disk in the background, by least recent (lru) or least frequent (lfu) use.
+
+    Each policy picks titles from the candidates sorted in eviction order; a title
+    selected by any policy is evicted. Titles being downloaded, queued or watched
+    are never candidates.
+    """
+
+    ORDERS = {
+        "lru": lambda footprint: (footprint.last_used,),
+        "lfu": lambda footprint: (footprint.movie_file.watch_count, footprint.last_used),
+    }
+    # Statuses of titles a job may still be writing to, possibly in another process
+    BUSY_STATUSES = ["PENDING", "DOWNLOADING", "DL_AND_CONVERT", "CONVERTING"]
+
+    def __init__(self, policies: list, order: str = "lru", interval: float = 600):
+        if order not in self.ORDERS:
+            raise ValueError(f"Unknown eviction order {order}, expected one of {sorted(self.ORDERS)}")
+        self.policies = policies
+        self.order = order
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def footprints(self) -> List[Footprint]:
+        footprints = [Footprint(movie_file) for movie_file in MovieFile.objects.all()]
+        return [footprint for footprint in footprints if footprint.total]
+
+    def is_busy(self, movie_file: MovieFile) -> bool:
+        if movie_file.tmdb_id in active_jobs or admission.position(movie_file.tmdb_id) is not None:
+            return True
+        if movie_file.download_status in self.BUSY_STATUSES:
+            return True
+        if movie_file.download_status == "PLAYABLE" and movie_file.download_progress < 100:
+            return True
+        watched = movie_file.last_watched
+        return watched is not None and timezone.now() - watched < MovieFile.WATCH_SESSION_GAP
+
+    def collect(self, dry_run: bool = False) -> List[Footprint]:
+        """Run every policy once and evict the selected titles. Returns them."""
+        with self._lock:
+            footprints = self.footprints()
+            usage = DiskUsage(
+                cached=sum(footprint.total for footprint in footprints),
+                free=shutil.disk_usage(settings.DOWNLOAD_PATH).free,
+            )
+            candidates = sorted(
+                (footprint for footprint in footprints if not self.is_busy(footprint.movie_file)),
+                key=self.ORDERS[self.order],
+            )
+
+            selected = {}
+            for policy in self.policies:
+                for footprint in policy.select(candidates, usage):
+                    selected.setdefault(footprint.tmdb_id, footprint)
+            evicted = list(selected.values())
+            if not dry_run:
+                for footprint in evicted:
+                    self.evict(footprint)
+            return evicted
+
+    def evict(self, footprint: Footprint):
+        movie_file = footprint.movie_file
+        logging.info(
+            f"Evicting movie {movie_file.tmdb_id} ({footprint.total // 2 ** 20} MB, "
+            f"last used {footprint.last_used:%Y-%m-%d}, watched {movie_file.watch_count} times)"
+        )
+        Segment.objects.filter(movie_file=movie_file).delete()
+        for root in storage.roots():
+            ProbeResult.objects.filter(path__startswith=os.path.join(root, footprint.movie_root) + os.sep).delete()
+        MovieFile.objects.filter(pk=movie_file.pk).update(
+            file_path=None,
+            source_path=None,
+            subtitles_path=None,
+            pipeline_task_id=None,
+            download_status="PENDING",
+            download_progress=0,
+        )
+        storage.remove(footprint.movie_root)
+        storage.remove(footprint.subtitles_root)
+
+    def demote_idle(self) -> int:
+        """Move titles unwatched for VIDEO_STORAGE_DEMOTE_DAYS from the hot to the cold tier."""
+        if not storage.cold_root or not settings.VIDEO_STORAGE_DEMOTE_DAYS:
+            return 0
+        cutoff = timezone.now() - timedelta(days=settings.VIDEO_STORAGE_DEMOTE_DAYS)
+        demoted = 0
+        for footprint in self.footprints():
+            movie_file = footprint.movie_file
+            if not footprint.hot or movie_file.download_status != "READY" or footprint.last_used >= cutoff:
+                continue
+            if self.is_busy(movie_file):
+                continue
+            moved = storage.demote(movie_file.tmdb_id)
+            logging.info(f"Moved movie {movie_file.tmdb_id} to the cold tier ({moved // 2 ** 20} MB)")
+            demoted += 1
+        return demoted
+
+    def start(self):
+        """Run collections every interval in a daemon thread, once per process."""
+        with self._lock:
+            if self._thread is not None or (not self.policies and not storage.cold_root) or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._loop, name="disk-gc", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            close_old_connections()
+            try:
+                self.demote_idle()
+                evicted = self.collect()
+                if evicted:
+                    freed = sum(footprint.total for footprint in evicted)
+                    logging.info(f"Evicted {len(evicted)} movies, freed {freed // 2 ** 20} MB")
+            except Exception as e:
+                logging.error(f"Disk garbage collection failed: {e}")
+
+
+def create_collector() -> DiskGarbageCollector:
+    policies = []
+    if settings.VIDEO_CACHE_MAX_IDLE_DAYS:
+        policies.append(MaxIdlePolicy(timedelta(days=settings.VIDEO_CACHE_MAX_IDLE_DAYS)))
+    if settings.VIDEO_CACHE_QUOTA_GB:
+        policies.append(QuotaPolicy(int(settings.VIDEO_CACHE_QUOTA_GB * 2 ** 30)))
+    if settings.VIDEO_CACHE_MIN_FREE_GB:
+        policies.append(FreeSpacePolicy(int(settings.VIDEO_CACHE_MIN_FREE_GB * 2 ** 30)))
+    return DiskGarbageCollector(policies, settings.VIDEO_CACHE_EVICTION_ORDER, settings.VIDEO_CACHE_GC_INTERVAL)
+
+
+collector = create_collector()
@@ -0,0 +1,129 @@
+import struct
+from typing import List, Optional, Tuple
+
+
+def _boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Yield (type, payload_start, box_end) for the boxes laid out in data[start:end]"""
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[position:position + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[position + 8:position + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield box_type, position + header, position + size
+        position += size
+
+
+def _child(data: bytes, start: int, end: int, box_type: bytes):
+    return next(((payload, box_end) for kind, payload, box_end in _boxes(data, start, end) if kind == box_type), None)
+
+
+def _video_track(moov: bytes) -> Optional[Tuple[int, int]]:
+    """(track_ID, timescale) of the first video track of a moov box"""
+    for kind, payload, end in _boxes(moov):
+        if kind != b"trak":
+            continue
+        tkhd = _child(moov, payload, end, b"tkhd")
+        mdia = _child(moov, payload, end, b"mdia")
+        if not tkhd or not mdia:
+            continue
+        hdlr = _child(moov, mdia[0], mdia[1], b"hdlr")
+        mdhd = _child(moov, mdia[0], mdia[1], b"mdhd")
+        if not hdlr or not mdhd or moov[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+            continue
+
+        version = moov[tkhd[0]]
+        track_id_at = tkhd[0] + (20 if version == 1 else 12)
+        track_id = struct.unpack(">I", moov[track_id_at:track_id_at + 4])[0]
+        version = moov[mdhd[0]]
+        timescale_at = mdhd[0] + (20 if version == 1 else 12)
+        timescale = struct.unpack(">I", moov[timescale_at:timescale_at + 4])[0]
+        return track_id, timescale
+    return None
+
+
+# tfhd flag: the fragment carries an absolute base_data_offset into the file it was written to
+BASE_DATA_OFFSET_PRESENT = 0x000001
+
+
+def _is_relocatable(moof: bytes) -> bool:
+    """Whether the data offsets of a moof are relative to it (movflags default_base_moof), so it can be spliced"""
+    for kind, payload, end in _boxes(moof):
+        tfhd = _child(moof, payload, end, b"tfhd") if kind == b"traf" else None
+        if tfhd and struct.unpack(">I", moof[tfhd[0]:tfhd[0] + 4])[0] & BASE_DATA_OFFSET_PRESENT:
+            return False
+    return True
+
+
+def _fragment_time(moof: bytes, track_id: int) -> Optional[int]:
+    """baseMediaDecodeTime of the given track in a moof box"""
+    for kind, payload, end in _boxes(moof):
+        if kind != b"traf":
+            continue
+        tfhd = _child(moof, payload, end, b"tfhd")
+        tfdt = _child(moof, payload, end, b"tfdt")
+        if not tfhd or not tfdt:
+            continue
+        if struct.unpack(">I", moof[tfhd[0] + 4:tfhd[0] + 8])[0] != track_id:
+            continue
+        if moof[tfdt[0]] == 1:
+            return struct.unpack(">Q", moof[tfdt[0] + 4:tfdt[0] + 12])[0]
+        return struct.unpack(">I", moof[tfdt[0] + 4:tfdt[0] + 8])[0]
+    return None
+
+
+def fragment_index(path: str) -> Tuple[Optional[int], List[List[float]]]:
+    """Index of a fragmented MP4 (movflags frag_keyframe+empty_moov+default_base_moof).
+
+    Returns the size of the init section (ftyp + moov) and the
+    [time, byte_offset] of every fragment, time being relative to the first
+    fragment. Each fragment starts on a video keyframe. Fragments addressing
+    their samples by absolute file offset (written without default_base_moof)
+    break once moved after the init section, so none of them are indexed.
+    """
+    init_size = None
+    track = None
+    fragments = []
+    first_time = None
+
+    with open(path, "rb") as f:
+        position = 0
+        while True:
+            f.seek(position)
+            header = f.read(16)
+            if len(header) < 8:
+                break
+            size, box_type = struct.unpack(">I4s", header[:8])
+            header_size = 8
+            if size == 1 and len(header) == 16:
+                size = struct.unpack(">Q", header[8:16])[0]
+                header_size = 16
+            elif size == 0:
+                break  # Box extending to the end of the file (mdat), nothing to index after it
+            if size < header_size:
+                break
+
+            if box_type == b"moov":
+                f.seek(position + header_size)
+                track = _video_track(f.read(size - header_size))
+            elif box_type == b"moof" and track is not None:
+                if init_size is None:
+                    init_size = position
+                f.seek(position + header_size)
+                moof = f.read(size - header_size)
+                if not _is_relocatable(moof):
+                    return init_size, []
+                decode_time = _fragment_time(moof, track[0])
+                if decode_time is not None:
+                    if first_time is None:
+                        first_time = decode_time
+                    fragments.append([round((decode_time - first_time) / track[1], 3), position])
+            position += size
+
+    return init_size, fragments
@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import ffmpeg
+
+
+class HlsPackager:
+    """Long-lived ffmpeg process packaging one title as an fMP4 HLS playlist.
+
+    The packager either reads the source file directly, or is fed the bytes
+    of a file that is still downloading through stdin as they become available.
+    """
+
+    PLAYLIST_NAME = "playlist.m3u8"
+    MASTER_NAME = "master.m3u8"
+    INIT_NAME = "init.mp4"
+    SEGMENT_PATTERN = "segment_%05d.m4s"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, input_path: str, output_dir: str, segment_duration: int, output_options: dict, from_file: bool = False,
+                 input_options: Optional[dict] = None):
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.segment_duration = segment_duration
+        self.output_options = output_options
+        self.input_options = input_options or {}
+        self.from_file = from_file
+        self.process = None
+        self._available = 0
+        self._written = 0
+        self._complete = False
+        self._condition = threading.Condition()
+        self._feed_thread = None
+
+    @property
+    def playlist_path(self) -> str:
+        return os.path.join(self.output_dir, self.PLAYLIST_NAME)
+
+    def start(self):
+        """Spawn ffmpeg and, when reading from a growing file, the feeder thread."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        source = self.input_path if self.from_file else "pipe:0"
+        stream = (
+            ffmpeg
+            .input(source, **self.input_options)
+            .output(
+                self.playlist_path,
+                format="hls",
+                hls_time=self.segment_duration,
+                hls_playlist_type="event",
+                hls_segment_type="fmp4",
+                hls_fmp4_init_filename=self.INIT_NAME,
+                hls_segment_filename=os.path.join(self.output_dir, self.SEGMENT_PATTERN),
+                hls_flags="independent_segments+temp_file",
+                **self.output_options
+            )
+            .global_args("-loglevel", "error")
+            .overwrite_output()
+        )
+        self.process = stream.run_async(pipe_stdin=not self.from_file)
+        logging.info(f"Started HLS packager for {self.input_path} ({'file' if self.from_file else 'pipe'} input)")
+
+        if not self.from_file:
+            self._feed_thread = threading.Thread(target=self._feed_loop, daemon=True)
+            self._feed_thread.start()
+
+    def feed(self, available_bytes: int, complete: bool = False):
+        """Announce how many leading bytes of the source are on disk."""
+        with self._condition:
+            self._available = max(self._available, available_bytes)
+            self._complete = self._complete or complete
+            self._condition.notify()
+
+    def _feed_loop(self):
+        try:
+            with open(self.input_path, "rb") as source:
+                while True:
+                    with self._condition:
+                        while self._written >= self._available and not self._complete:
+                            self._condition.wait()
+                        limit = self._available
+                        complete = self._complete
+
+                    if complete:
+                        limit = os.path.getsize(self.input_path)
+                    if self._written >= limit:
+                        break
+
+                    source.seek(self._written)
+                    data = source.read(min(self.CHUNK_SIZE, limit - self._written))
+                    if not data:
+                        break
+                    self.process.stdin.write(data)
+                    self._written += len(data)
+        except (BrokenPipeError, ValueError):
+            logging.warning(f"HLS packager stopped reading {self.input_path}")
+        except Exception as e:
+            logging.error(f"Error feeding HLS packager: {e}")
+        finally:
+            try:
+                self.process.stdin.close()
+            except Exception:
+                pass
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def has_failed(self) -> bool:
+        return self.process is not None and self.process.poll() not in (None, 0)
+
+    def wait(self) -> int:
+        """Wait for ffmpeg to write the final playlist and return its exit code."""
+        self.feed(self._available, complete=True)
+        if self._feed_thread:
+            self._feed_thread.join()
+        return self.process.wait()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    @classmethod
+    def count_segments(cls, playlist_path: str) -> int:
+        """Count media segments already listed in a playlist."""
+        try:
+            with open(playlist_path) as playlist:
+                return sum(1 for line in playlist if line.startswith("#EXTINF"))
+        except OSError:
+            return 0
+
+    @classmethod
+    def write_master_playlist(cls, output_dir: str, variants: list):
+        """Write the master playlist listing (uri, bandwidth, width, height) variants."""
+        lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+        for uri, bandwidth, width, height in variants:
+            resolution = f",RESOLUTION={width}x{height}" if width and height else ""
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}{resolution}")
+            lines.append(uri)
+
+        os.makedirs(output_dir, exist_ok=True)
+        master_path = os.path.join(output_dir, cls.MASTER_NAME)
+        with open(f"{master_path}.tmp", "w") as master:
+            master.write("\n".join(lines) + "\n")
+        os.replace(f"{master_path}.tmp", master_path)
+        return master_path
+
+    @classmethod
+    def is_complete(cls, playlist_path: str) -> bool:
+        try:
+            with open(playlist_path) as playlist:
+                return "#EXT-X-ENDLIST" in playlist.read()
+        except OSError:
+            return False
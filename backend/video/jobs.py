@@ -0,0 +1,538 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from movies.models import MovieFile
+from .container import HEAD_BYTES, read_keyframes, trailing_index_range
+from .fmp4 import fragment_index
+from .hls import HlsPackager
+from .models import Segment
+from .pieces import PieceMap, select_files
+from .progress import progress_store
+from .retention import release_source
+from .services import VideoService
+from .storage import storage
+from .torrent import TorrentSessionManager
+from .transcoding import TranscodeJob
+
+# Blocking work triggered by torrent events (ffprobe, final packaging) runs here, off the alert dispatcher
+background = ThreadPoolExecutor(max_workers=settings.VIDEO_JOB_WORKERS, thread_name_prefix="video-job")
+
+# Titles currently downloading or transcoding, keyed by TMDB id
+active_jobs = {}
+
+
+class DownloadJob:
+    """Download and transcode pipeline of one title, driven by torrent alerts."""
+
+    PROBE_INTERVAL = 2  # seconds between attempts to read the duration of a partial file
+    KEYFRAME_REFRESH_INTERVAL = 30
+    FILE_PRIORITY = 4  # libtorrent's default priority, 0 skips a file
+    INDEX_DEADLINE_STEP_MS = 100  # Deadlines of consecutive head / index pieces
+    RESUMED_STATUSES = ("DL_AND_CONVERT", "PLAYABLE")  # Conversion began before a restart, the status is kept
+
+    def __init__(self, movie_file: MovieFile):
+        self.movie_file = movie_file
+        self.tmdb_id = movie_file.tmdb_id
+        self.movie_root = storage.movie_root(movie_file.tmdb_id)
+        self.movie_dir = storage.hot_path(self.movie_root)
+        self.video_service = VideoService()
+        self.handle = None
+        self.handle_id = None
+        self.piece_map = None
+        self.downloaded_path = None
+        self.video_duration = None
+        self.keyframes = []
+        self.transcode_job = None
+        self.packager = None
+        self.unqueued_segments = set()
+        self.first_segment_ready = False
+        self.hls_segments = 0
+        self._lock = threading.RLock()
+        self._probing = False
+        self._last_probe = 0
+        self._indexing = False
+        self._keyframes_indexed_at = 0
+        self._pieces_changed = False
+        self._download_finished = False
+        self._index_located = False
+        self._index_range = None  # Bytes of a trailing seek index, None when it is in the head
+        self._seek_pieces = set()  # Pieces given a deadline by the last seek
+        self._seeding_done = False
+        self._output_complete = False
+        self.closed = False
+        self._closed_event = threading.Event()
+        self.admission_release = None  # Set by the admission scheduler, frees the download slot
+        self._dirty_fields = set()
+        self._last_flush = 0
+
+    def _save(self, **fields):
+        """Publish fields to the progress store; write them to the database on state transitions or every few seconds."""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self.movie_file, name, value)
+                self._dirty_fields.add(name)
+            progress_store.set(
+                self.tmdb_id,
+                download_status=self.movie_file.download_status,
+                download_progress=self.movie_file.download_progress,
+                file_path=self.movie_file.file_path,
+                source_path=self.movie_file.source_path,
+            )
+            progress_store.publish(self.tmdb_id, {
+                "type": "status",
+                "status": self.movie_file.download_status,
+                "progress": self.movie_file.download_progress,
+            })
+
+            now = time.time()
+            transition = "download_status" in fields or "file_path" in fields
+            if self._dirty_fields and (transition or now - self._last_flush >= settings.VIDEO_PROGRESS_FLUSH_INTERVAL):
+                self.movie_file.save(update_fields=sorted(self._dirty_fields))
+                self._dirty_fields.clear()
+                self._last_flush = now
+
+    def start(self):
+        """Add the torrent to the session; everything else happens in alert callbacks."""
+        # A resumed PLAYABLE title stays streamable while its torrent is added again
+        if self.movie_file.download_status not in self.RESUMED_STATUSES:
+            self._save(download_status="DOWNLOADING")
+        active_jobs[self.tmdb_id] = self
+
+        # Downloads and conversion write to the hot tier. Copying a title back takes a while,
+        # so it runs in the background rather than under the admission lock or on the alert thread.
+        if storage.has_cold_files(self.tmdb_id):
+            background.submit(self._promote_and_add_torrent)
+        else:
+            self._add_torrent()
+
+    def _promote_and_add_torrent(self):
+        try:
+            storage.promote(self.tmdb_id)
+            if not self.closed:
+                self._add_torrent()
+        except Exception as e:
+            logging.error(f"Could not start download of movie {self.tmdb_id}: {e}")
+            self._fail()
+
+    def _add_torrent(self):
+        os.makedirs(self.movie_dir, exist_ok=True)
+        logging.info(f"Using movie directory: {self.movie_dir}")
+
+        torrent_manager = TorrentSessionManager()
+        self.handle_id = torrent_manager.add_torrent(self.movie_file.magnet_link, self.movie_dir, job=self)
+        self.handle = torrent_manager.get_handle(self.handle_id)
+
+        if not self.handle:
+            logging.error(f"Failed to get torrent handle for movie {self.movie_file.id}")
+            self._fail()
+            return
+
+        self.handle.set_sequential_download(True)
+        if self.handle.has_metadata():
+            self.on_metadata()
+
+    def on_metadata(self):
+        if self.piece_map is not None:
+            return
+        torrent_info = self.handle.get_torrent_info()
+        files = torrent_info.files()
+        file_index, subtitle_indexes = select_files(files)
+        # Only the selected video (and optionally its subtitles) competes for bandwidth
+        priorities = [0] * files.num_files()
+        priorities[file_index] = self.FILE_PRIORITY
+        if settings.TORRENT_KEEP_SUBTITLE_FILES:
+            for index in subtitle_indexes:
+                priorities[index] = self.FILE_PRIORITY
+        self.handle.prioritize_files(priorities)
+        file_path_in_torrent = files.file_path(file_index)
+        skipped = priorities.count(0)
+        if skipped:
+            logging.info(f"Skipping {skipped} files of the torrent, downloading {file_path_in_torrent}")
+        self.downloaded_path = os.path.join(self.movie_dir, file_path_in_torrent)
+        self.piece_map = PieceMap(self.handle, file_index)
+        self._set_deadlines(self._index_pieces())
+
+        # Store the full relative path including any subdirectories
+        relative_path = os.path.join(self.movie_root, file_path_in_torrent)
+        self._save(file_path=relative_path, source_path=relative_path)
+
+        # Ensure the full directory structure exists
+        os.makedirs(os.path.dirname(self.downloaded_path), exist_ok=True)
+
+    def on_piece_finished(self, piece: int):
+        # Coalesced: segment readiness is re-checked on the next state update
+        self._pieces_changed = True
+
+    def on_state_update(self, status):
+        if self.closed:
+            return
+        # Progress of the selected file, the torrent may hold others
+        progress = self.piece_map.downloaded_bytes() / self.piece_map.file_size * 100 if self.piece_map else 0
+
+        if self.downloaded_path is not None and not self._download_finished:
+            if self.video_duration is None:
+                if not self._index_located:
+                    self._locate_index()
+                self._schedule_probe()
+            elif self.packager is not None:
+                self._feed_packager()
+            elif self.transcode_job is not None and self._pieces_changed:
+                self._pieces_changed = False
+                self._queue_ready_segments()
+
+        self._save(download_progress=progress)
+        logging.info(f"Download progress: {progress:.2f}%")
+
+    def on_finished(self):
+        if self._download_finished or self.downloaded_path is None:
+            return
+        self._download_finished = True
+        self._release_slot()
+        self._save(download_progress=100)
+        background.submit(self._finish_processing)
+
+    def on_seeding_done(self):
+        """The torrent left the session, the source is only needed by the converted output now."""
+        self._seeding_done = True
+        self._release_source()
+
+    def on_error(self, message: str):
+        logging.error(f"Torrent error for movie {self.movie_file.id}: {message}")
+        self._fail(message)
+
+    def cancel(self):
+        """Stop downloading and converting the title."""
+        if self.closed:
+            return
+        TorrentSessionManager().remove_torrent(self.handle_id)
+        self._fail("Download cancelled")
+
+    def torrent_status(self) -> dict:
+        """Live state of the job, as reported by the torrent engine."""
+        state = {
+            "tmdb_id": self.tmdb_id,
+            "status": self.movie_file.download_status,
+            "progress": self.movie_file.download_progress,
+            "closed": self.closed,
+        }
+        if self.handle is not None and self.handle.is_valid():
+            status = self.handle.status()
+            state.update(
+                bytes_remaining=status.total_wanted - status.total_wanted_done,
+                download_rate=status.download_rate,
+                upload_rate=status.upload_rate,
+                peers=status.num_peers,
+                seeds=status.num_seeds,
+            )
+        return state
+
+    def _fail(self, message: str = "Processing failed"):
+        if self.packager is not None:
+            self.packager.stop()
+        progress_store.publish(self.tmdb_id, {"type": "error", "message": message})
+        self._save(download_status="ERROR")
+        self._close()
+
+    def _release_slot(self):
+        release, self.admission_release = self.admission_release, None
+        if release:
+            release(self)
+
+    def _close(self):
+        self.closed = True
+        self._release_slot()
+        active_jobs.pop(self.tmdb_id, None)
+        # Every state change has been flushed, the database row is authoritative again
+        progress_store.delete(self.tmdb_id)
+        self._closed_event.set()
+        self._release_source()
+
+    def _release_source(self):
+        """Finalize stage: drop the source once the output is complete and the torrent stopped seeding."""
+        if self._output_complete and self._seeding_done:
+            if self.transcode_job is not None and self.transcode_job.previews:
+                return  # Checked again as each preview is replaced by its full-quality segment
+            self._output_complete = False  # Only once
+            background.submit(release_source, self.movie_file)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the pipeline finished (READY, PLAYABLE with gaps, or ERROR)."""
+        return self._closed_event.wait(timeout)
+
+    def _set_deadlines(self, pieces):
+        """Fetch these pieces before the sequential download reaches them, in order."""
+        for order, piece in enumerate(pieces):
+            if not self.handle.have_piece(piece):
+                self.handle.set_piece_deadline(piece, order * self.INDEX_DEADLINE_STEP_MS)
+
+    def _index_pieces(self) -> range:
+        """Pieces of the file head, then of a trailing seek index, until they are located and on disk."""
+        if not self._index_located:
+            return self.piece_map.pieces_for(0, HEAD_BYTES)
+        if self._index_range is not None:
+            return self.piece_map.pieces_for(*self._index_range)
+        return range(0)
+
+    def _locate_index(self):
+        """Once the head of the file is on disk, fetch a trailing seek index (moov, Cues) next.
+
+        Probing and segmenting need the index; left to the sequential download, an
+        index at the end of the file would only arrive with the last pieces.
+        """
+        head_size = min(HEAD_BYTES, self.piece_map.file_size)
+        if not self.piece_map.have_range(0, head_size):
+            return
+        self._index_located = True
+        with open(self.downloaded_path, "rb") as source:
+            head = source.read(head_size)
+        index = self._index_range = trailing_index_range(head, self.piece_map.file_size)
+        if index is not None:
+            logging.info(f"Seek index of {self.downloaded_path} at bytes {index[0]}-{index[1]}, fetching it first")
+            self._set_deadlines(self.piece_map.pieces_for(*index))
+
+    def _schedule_probe(self):
+        now = time.time()
+        if self._probing or now - self._last_probe < self.PROBE_INTERVAL or not os.path.exists(self.downloaded_path):
+            return
+        self._probing = True
+        self._last_probe = now
+        background.submit(self._probe)
+
+    def _probe(self):
+        """Start segmentation as soon as the partial file reports a duration."""
+        try:
+            video_duration = self.video_service.get_video_duration(self.downloaded_path)
+            if video_duration and self.video_duration is None:
+                self._start_conversion(video_duration, from_file=False)
+        except Exception as e:
+            logging.debug(f"File not ready yet: {e}")
+        finally:
+            self._probing = False
+
+    def _start_conversion(self, video_duration: float, from_file: bool):
+        with self._lock:
+            if self.video_duration is not None:
+                return
+            if settings.VIDEO_PACKAGING_MODE == "hls":
+                self.packager = self.video_service.create_hls_packager(self.downloaded_path, from_file=from_file)
+                self.packager.start()
+            else:
+                self.transcode_job = TranscodeJob(
+                    self.video_service,
+                    self.downloaded_path,
+                    self.movie_dir,
+                    video_duration,
+                    on_ready=self._on_segment_ready,
+                    on_complete=self._finalize,
+                    on_converted=self._record_segment,
+                )
+                self.unqueued_segments = set(range(self.transcode_job.total_segments))
+                self._pieces_changed = True
+
+                # Segments converted before a restart are kept
+                converted = self._converted_segments()
+                self.transcode_job.mark_done(converted)
+                self.unqueued_segments -= converted
+                self.first_segment_ready = 0 in converted
+            self.video_duration = video_duration
+            self._save(download_status="PLAYABLE" if self.first_segment_ready else "DL_AND_CONVERT")
+        logging.info(f"Starting segmentation at {self.movie_file.download_progress:.2f}% for {self.downloaded_path}")
+
+    def _converted_segments(self) -> set:
+        return {
+            segment.index
+            for segment in self.movie_file.segments.filter(preview=False)
+            if os.path.exists(storage.path(segment.path))
+        }
+
+    def _feed_packager(self):
+        if not self.packager.from_file:
+            self.packager.feed(self.piece_map.downloaded_prefix())
+        available_segments = HlsPackager.count_segments(self.packager.playlist_path)
+        for segment in range(self.hls_segments, available_segments):
+            progress_store.publish(self.tmdb_id, {"type": "segment", "segment": segment})
+        self.hls_segments = available_segments
+        if not self.first_segment_ready and available_segments > 0:
+            self.first_segment_ready = True
+            self._save(file_path=self._relative(self.packager.playlist_path), download_status="PLAYABLE")
+            logging.info("First HLS segment ready, movie is now playable")
+
+    def _queue_ready_segments(self):
+        """Queue every segment whose source bytes are on disk, the pool converts them in parallel."""
+        service = self.video_service
+        index_complete = self.keyframes and self.keyframes[-1][0] + service.segment_duration >= self.video_duration
+        if not index_complete and not self._indexing and time.time() - self._keyframes_indexed_at > self.KEYFRAME_REFRESH_INTERVAL:
+            # The container index grows with the download for formats without an up-front index
+            self._indexing = True
+            background.submit(self._refresh_keyframes)
+
+        if not self.piece_map.have_range(0, 1):
+            return
+        for segment in sorted(self.unqueued_segments):
+            start, end = service.segment_byte_range(self.keyframes, segment, self.video_duration, self.piece_map.file_size)
+            if self.piece_map.have_range(start, end):
+                self.transcode_job.submit(segment)
+                self.unqueued_segments.discard(segment)
+
+    def _refresh_keyframes(self):
+        """Index keyframes from the container index once its bytes are on disk, else probe only the new tail."""
+        try:
+            keyframes = None
+            if self._index_located and (self._index_range is None or self.piece_map.have_range(*self._index_range)):
+                keyframes = read_keyframes(self.downloaded_path)
+            if keyframes is None:
+                last = self.keyframes[-1][0] if self.keyframes else None
+                tail = self.video_service.get_keyframes(self.downloaded_path, since=last or 0.0)
+                keyframes = self.keyframes + [keyframe for keyframe in tail if last is None or keyframe[0] > last]
+            self.keyframes = keyframes
+            self._keyframes_indexed_at = time.time()
+            self._pieces_changed = True
+        finally:
+            self._indexing = False
+
+    def _record_segment(self, segment: int):
+        """Add a converted segment to the database manifest."""
+        service = self.video_service
+        segment_path = service.get_segment_path(self.downloaded_path, self.movie_dir, segment)
+        start_time, _ = service.segment_bounds(segment)
+        probe = service.probe(segment_path)
+
+        checksum = hashlib.sha256()
+        with open(segment_path, "rb") as segment_file:
+            for chunk in iter(lambda: segment_file.read(1024 * 1024), b""):
+                checksum.update(chunk)
+
+        keyframe_times = [keyframe[0] for keyframe in self.keyframes if keyframe[0] <= start_time]
+        init_size, keyframe_index = fragment_index(segment_path)
+        Segment.objects.update_or_create(
+            movie_file=self.movie_file,
+            index=segment,
+            defaults={
+                "path": self._relative(segment_path),
+                "size": os.path.getsize(segment_path),
+                "start_time": start_time,
+                "duration": probe.duration if probe else None,
+                "keyframe_start": keyframe_times[-1] if keyframe_times else None,
+                "checksum": checksum.hexdigest(),
+                "init_size": init_size,
+                "keyframe_index": keyframe_index,
+                "preview": self.transcode_job.is_preview(segment),
+            },
+        )
+        self._release_source()
+
+    def _on_segment_ready(self, segment: int):
+        progress_store.publish(self.tmdb_id, {"type": "segment", "segment": segment})
+        if segment == 0 and not self.first_segment_ready:
+            self.first_segment_ready = True
+            self._save(file_path=self._first_segment_path(), download_status="PLAYABLE")
+            logging.info("First segment ready, movie is now playable")
+
+    def _finish_processing(self):
+        """Convert whatever is left once the whole file is on disk."""
+        try:
+            if self.video_duration is None:
+                video_duration = self.video_service.get_video_duration(self.downloaded_path)
+                if not video_duration:
+                    logging.error(f"Could not determine duration of {self.downloaded_path}")
+                    self._fail("Could not determine video duration")
+                    return
+                self._start_conversion(video_duration, from_file=True)
+
+            if self.packager is not None:
+                self._finish_hls()
+                return
+
+            for segment in sorted(self.unqueued_segments):
+                self.transcode_job.submit(segment)
+            self.unqueued_segments.clear()
+            if self.transcode_job.is_complete():
+                self._finalize()
+        except Exception as e:
+            logging.error(f"Error processing video {self.movie_file.id}: {str(e)}")
+            self._fail(str(e))
+
+    def _finish_hls(self):
+        return_code = self.packager.wait()
+        if return_code != 0 and not self.packager.from_file:
+            # Sources with a trailing index (moov at the end) cannot be read from a pipe
+            logging.warning("Pipe-fed HLS packaging failed, repackaging from the complete file")
+            self.packager = self.video_service.create_hls_packager(self.downloaded_path, from_file=True)
+            self.packager.start()
+            return_code = self.packager.wait()
+
+        if return_code == 0:
+            self._save(file_path=self._relative(self.packager.playlist_path), download_status="READY")
+            self._output_complete = True
+        else:
+            logging.error(f"HLS packaging failed for {self.downloaded_path} (exit code {return_code})")
+            progress_store.publish(self.tmdb_id, {"type": "error", "message": "HLS packaging failed"})
+            if not self.first_segment_ready:
+                self._save(download_status="ERROR")
+        self._close()
+
+    def _finalize(self):
+        """Called once every segment has been converted or skipped."""
+        if not self._download_finished or self.closed:
+            return
+        failed_segments = self.video_service.failed_segments
+        with self._lock:
+            if not failed_segments:
+                if not self.first_segment_ready:
+                    self._save(file_path=self._first_segment_path())
+                self._save(download_status="READY")
+                self._output_complete = True
+            else:
+                logging.error(f"Failed segments: {sorted(list(failed_segments))}")
+                progress_store.publish(self.tmdb_id, {
+                    "type": "error",
+                    "message": "Some segments could not be converted",
+                    "failed_segments": sorted(failed_segments),
+                })
+                self._save(download_status="PLAYABLE" if self.first_segment_ready else "ERROR")
+            self._close()
+
+    def _relative(self, path: str) -> str:
+        """Path relative to the downloads root, as stored on MovieFile."""
+        return os.path.join(self.movie_root, os.path.relpath(path, self.movie_dir))
+
+    def _first_segment_path(self) -> str:
+        base_name = os.path.splitext(self.downloaded_path)[0]
+        return self._relative(f"{base_name}_segment_000.mp4")
+
+    def seek(self, position: float) -> int:
+        """Move download and transcode priority to the segments after a playback position."""
+        segment = self.video_service.segment_at(position)
+        if self.transcode_job is None:
+            return segment
+
+        window = range(segment, min(segment + settings.VIDEO_SEEK_WINDOW_SEGMENTS, self.transcode_job.total_segments))
+        window_pieces = {}
+        for offset, window_segment in enumerate(window):
+            start, end = self.video_service.segment_byte_range(
+                self.keyframes, window_segment, self.video_duration, self.piece_map.file_size
+            )
+            for piece in self.piece_map.pieces_for(start, end):
+                if not self.handle.have_piece(piece):
+                    window_pieces.setdefault(piece, settings.VIDEO_SEEK_DEADLINE_MS * (offset + 1))
+        # Only the previous seek window is dropped, the head and seek index keep their deadlines
+        for piece in self._seek_pieces - window_pieces.keys():
+            self.handle.reset_piece_deadline(piece)
+        for piece, deadline in window_pieces.items():
+            self.handle.set_piece_deadline(piece, deadline)
+        self._seek_pieces = set(window_pieces)
+        # ... and come first while missing, probing and segmenting the window need them
+        self._set_deadlines(self._index_pieces())
+
+        self.transcode_job.prioritize(window)
+        logging.info(f"Seek to {position:.1f}s, prioritizing segments {window.start}-{window.stop - 1}")
+        return segment
+
+    def is_segment_ready(self, segment: int) -> bool:
+        return self.transcode_job is not None and self.transcode_job.is_done(segment)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from video.eviction import collector
+
+
+class Command(BaseCommand):
+    help = "Evict cached titles selected by the disk eviction policies"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list the titles that would be evicted")
+
+    def handle(self, *args, **options):
+        evicted = collector.collect(dry_run=options["dry_run"])
+        for footprint in evicted:
+            self.stdout.write(
+                f"{footprint.tmdb_id}: {footprint.total // 2 ** 20} MB, last used {footprint.last_used:%Y-%m-%d}"
+            )
+        verb = "Would evict" if options["dry_run"] else "Evicted"
+        freed = sum(footprint.total for footprint in evicted)
+        self.stdout.write(f"{verb} {len(evicted)} movies ({freed // 2 ** 20} MB)")
@@ -0,0 +1,18 @@
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from video.daemon import serve
+
+
+class Command(BaseCommand):
+    help = "Run the torrent daemon owning the libtorrent session and the download jobs of every web worker"
+
+    def add_arguments(self, parser):
+        url = urlparse(settings.TORRENT_DAEMON_URL or "http://127.0.0.1:6800")
+        parser.add_argument("--host", default=url.hostname)
+        parser.add_argument("--port", type=int, default=url.port or 6800)
+        parser.add_argument("--no-resume", action="store_true", help="Do not restart unfinished downloads")
+
+    def handle(self, *args, **options):
+        serve(options["host"], options["port"], resume=not options["no_resume"])
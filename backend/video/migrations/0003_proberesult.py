@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0002_delete_moviefile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProbeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1000, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('format_name', models.CharField(blank=True, default='', max_length=100)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('bit_rate', models.BigIntegerField(blank=True, null=True)),
+                ('streams', models.JSONField(default=list)),
+                ('keyframes', models.JSONField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:05
+
+import os
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_segments(apps, schema_editor):
+    """Record the segment files and source of movies converted before segments were tracked in the database."""
+    MovieFile = apps.get_model('movies', 'MovieFile')
+    Segment = apps.get_model('video', 'Segment')
+    suffix = '_segment_000.mp4'
+
+    for movie_file in MovieFile.objects.filter(download_status__in=['READY', 'PLAYABLE'], file_path__endswith=suffix):
+        base_path = os.path.join(settings.DOWNLOAD_PATH, movie_file.file_path)[:-len(suffix)]
+
+        # The downloaded original sits next to its segments, under the same name
+        if not movie_file.source_path:
+            for extension in ['.mkv', '.mp4', '.avi']:
+                if os.path.exists(f"{base_path}{extension}"):
+                    movie_file.source_path = os.path.relpath(f"{base_path}{extension}", settings.DOWNLOAD_PATH)
+                    movie_file.save(update_fields=['source_path'])
+                    break
+
+        index = 0
+        while os.path.exists(f"{base_path}_segment_{index:03d}.mp4"):
+            segment_path = f"{base_path}_segment_{index:03d}.mp4"
+            Segment.objects.get_or_create(
+                movie_file=movie_file,
+                index=index,
+                defaults={
+                    'path': os.path.relpath(segment_path, settings.DOWNLOAD_PATH),
+                    'size': os.path.getsize(segment_path),
+                    'start_time': index * 10,
+                },
+            )
+            index += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_moviefile_source_path_alter_moviefile_tmdb_id'),
+        ('video', '0003_proberesult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('path', models.CharField(max_length=1000)),
+                ('size', models.BigIntegerField()),
+                ('start_time', models.FloatField()),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('keyframe_start', models.FloatField(blank=True, null=True)),
+                ('checksum', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('movie_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='movies.moviefile')),
+            ],
+            options={
+                'ordering': ['index'],
+                'constraints': [models.UniqueConstraint(fields=('movie_file', 'index'), name='unique_segment_index')],
+            },
+        ),
+        migrations.RunPython(backfill_segments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0004_segment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segment',
+            name='init_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='keyframe_index',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
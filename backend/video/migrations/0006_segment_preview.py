@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0005_segment_init_size_segment_keyframe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segment',
+            name='preview',
+            field=models.BooleanField(default=False),
+        ),
+    ]
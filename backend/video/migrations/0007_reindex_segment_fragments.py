@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reset_fragment_indexes(apps, schema_editor):
+    """Segments written before default_base_moof are re-indexed on their next seek, which refuses to splice them."""
+    Segment = apps.get_model('video', 'Segment')
+    Segment.objects.filter(keyframe_index__isnull=False).update(keyframe_index=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0006_segment_preview'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_fragment_indexes, migrations.RunPython.noop),
+    ]
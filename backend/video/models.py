@@ -0,0 +1,56 @@
+import bisect
+
+from django.db import models
+from movies.models import MovieFile
+
+
+class ProbeResult(models.Model):
+    """Cached ffprobe metadata for a media file, valid while its size and mtime are unchanged"""
+    path = models.CharField(max_length=1000, unique=True)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    format_name = models.CharField(max_length=100, blank=True, default="")
+    duration = models.FloatField(null=True, blank=True)
+    bit_rate = models.BigIntegerField(null=True, blank=True)
+    streams = models.JSONField(default=list)  # [{"index", "codec_type", "codec_name", ...}]
+    keyframes = models.JSONField(null=True, blank=True)  # [[pts_time, byte_offset], ...] of the first video stream
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def matches(self, size: int, mtime: float) -> bool:
+        return self.size == size and self.mtime == mtime
+
+    def video_stream(self):
+        return next((stream for stream in self.streams if stream.get("codec_type") == "video"), None)
+
+    def audio_stream(self):
+        return next((stream for stream in self.streams if stream.get("codec_type") == "audio"), None)
+
+
+class Segment(models.Model):
+    """A converted segment of a movie, recorded by the transcoder"""
+    movie_file = models.ForeignKey(MovieFile, on_delete=models.CASCADE, related_name="segments")
+    index = models.IntegerField()
+    path = models.CharField(max_length=1000)  # Relative to the downloads root
+    size = models.BigIntegerField()
+    start_time = models.FloatField()  # Position of the segment in the movie, in seconds
+    duration = models.FloatField(null=True, blank=True)
+    keyframe_start = models.FloatField(null=True, blank=True)  # Source keyframe the segment was cut from
+    checksum = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the file
+    init_size = models.BigIntegerField(null=True, blank=True)  # Bytes of ftyp + moov before the first fragment
+    keyframe_index = models.JSONField(null=True, blank=True)  # [[time_in_segment, byte_offset], ...], one per fragment
+    preview = models.BooleanField(default=False)  # Low-resolution startup encode, replaced later
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["index"]
+        constraints = [
+            models.UniqueConstraint(fields=["movie_file", "index"], name="unique_segment_index"),
+        ]
+
+    def keyframe_offset(self, position: float):
+        """(time, byte_offset) of the last fragment starting at or before a position in the segment"""
+        if not self.keyframe_index:
+            return None
+        times = [time for time, _ in self.keyframe_index]
+        fragment = max(bisect.bisect_right(times, position) - 1, 0)
+        return tuple(self.keyframe_index[fragment])
@@ -0,0 +1,63 @@
+import os
+
+VIDEO_EXTENSIONS = {".mkv", ".mp4", ".m4v", ".avi", ".mov", ".webm", ".wmv", ".flv", ".mpg", ".mpeg", ".ts"}
+SUBTITLE_EXTENSIONS = {".srt", ".vtt", ".ass", ".ssa", ".sub", ".idx"}
+
+
+def select_files(files) -> tuple:
+    """(video_index, subtitle_indexes) of the files worth downloading in a torrent's file storage.
+
+    The video is the largest video file that is not a sample, falling back to the
+    largest file; ISO bundles, extras and samples are left out.
+    """
+    indexes = range(files.num_files())
+    extension = {index: os.path.splitext(files.file_path(index))[1].lower() for index in indexes}
+    videos = [index for index in indexes if extension[index] in VIDEO_EXTENSIONS]
+    features = [index for index in videos if "sample" not in os.path.basename(files.file_path(index)).lower()]
+    video_index = max(features or videos or indexes, key=files.file_size)
+    subtitle_indexes = [index for index in indexes if extension[index] in SUBTITLE_EXTENSIONS]
+    return video_index, subtitle_indexes
+
+
+class PieceMap:
+    """Maps byte ranges of one file inside a torrent to the pieces holding them."""
+
+    def __init__(self, handle, file_index: int):
+        torrent_info = handle.get_torrent_info()
+        files = torrent_info.files()
+        self.handle = handle
+        self.file_index = file_index
+        self.file_offset = files.file_offset(file_index)
+        self.file_size = files.file_size(file_index)
+        self.piece_length = torrent_info.piece_length()
+        self.num_pieces = torrent_info.num_pieces()
+
+    def pieces_for(self, start: int, end: int) -> range:
+        """Pieces covering bytes [start, end) of the file."""
+        start = max(0, min(start, self.file_size - 1))
+        end = max(start + 1, min(end, self.file_size))
+        first_piece = (self.file_offset + start) // self.piece_length
+        last_piece = (self.file_offset + end - 1) // self.piece_length
+        return range(first_piece, last_piece + 1)
+
+    def have_range(self, start: int, end: int) -> bool:
+        """Whether every piece under bytes [start, end) of the file is downloaded."""
+        return all(self.handle.have_piece(piece) for piece in self.pieces_for(start, end))
+
+    def downloaded_bytes(self) -> int:
+        """Bytes of the file whose pieces are downloaded."""
+        file_end = self.file_offset + self.file_size
+        downloaded = 0
+        for piece in self.pieces_for(0, self.file_size):
+            if self.handle.have_piece(piece):
+                piece_start = piece * self.piece_length
+                downloaded += min(piece_start + self.piece_length, file_end) - max(piece_start, self.file_offset)
+        return downloaded
+
+    def downloaded_prefix(self) -> int:
+        """Number of leading bytes of the file whose pieces are all downloaded."""
+        pieces = self.pieces_for(0, self.file_size)
+        piece = pieces.start
+        while piece < pieces.stop and self.handle.have_piece(piece):
+            piece += 1
+        return max(0, min(piece * self.piece_length - self.file_offset, self.file_size))
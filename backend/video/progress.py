@@ -0,0 +1,133 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from django.conf import settings
+
+
+class LocalSubscription:
+    def __init__(self, store, tmdb_id):
+        self.store = store
+        self.tmdb_id = str(tmdb_id)
+        self.queue = queue.Queue()
+
+    def next_event(self, timeout: float) -> Optional[dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.store._unsubscribe(self)
+
+
+class LocalProgressStore:
+    """In-process stand-in for the Redis progress store (single worker deployments, tests)."""
+
+    def __init__(self):
+        self._entries = {}
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def set(self, tmdb_id, **fields):
+        with self._lock:
+            self._entries.setdefault(str(tmdb_id), {}).update(fields)
+
+    def get(self, tmdb_id) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(str(tmdb_id))
+            return dict(entry) if entry else None
+
+    def delete(self, tmdb_id):
+        with self._lock:
+            self._entries.pop(str(tmdb_id), None)
+
+    def publish(self, tmdb_id, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(tmdb_id), []))
+        for subscription in subscribers:
+            subscription.queue.put(event)
+
+    def subscribe(self, tmdb_id) -> LocalSubscription:
+        subscription = LocalSubscription(self, tmdb_id)
+        with self._lock:
+            self._subscribers[subscription.tmdb_id].append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: LocalSubscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.tmdb_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.tmdb_id, None)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def next_event(self, timeout: float) -> Optional[dict]:
+        message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None or message["type"] != "message":
+            return None
+        return json.loads(message["data"])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisProgressStore:
+    """Live status of downloading titles kept in Redis, visible to every web worker.
+
+    Pipeline events (status changes, new segments, errors) go through Redis pub/sub.
+    """
+
+    KEY_PREFIX = "hypertube:progress:"
+    TTL = 3600  # Entries of a crashed pipeline expire, the database row stays authoritative
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, tmdb_id) -> str:
+        return f"{self.KEY_PREFIX}{tmdb_id}"
+
+    def set(self, tmdb_id, **fields):
+        key = self._key(tmdb_id)
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+        pipeline.expire(key, self.TTL)
+        pipeline.execute()
+
+    def get(self, tmdb_id) -> Optional[dict]:
+        entry = self.client.hgetall(self._key(tmdb_id))
+        if not entry:
+            return None
+        return {name.decode(): json.loads(value) for name, value in entry.items()}
+
+    def delete(self, tmdb_id):
+        self.client.delete(self._key(tmdb_id))
+
+    def _channel(self, tmdb_id) -> str:
+        return f"{self.KEY_PREFIX}{tmdb_id}:events"
+
+    def publish(self, tmdb_id, event: dict):
+        self.client.publish(self._channel(tmdb_id), json.dumps(event))
+
+    def subscribe(self, tmdb_id) -> RedisSubscription:
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(self._channel(tmdb_id))
+        return RedisSubscription(pubsub)
+
+
+def create_progress_store():
+    if settings.REDIS_URL:
+        return RedisProgressStore(settings.REDIS_URL)
+    return LocalProgressStore()
+
+
+progress_store = create_progress_store()
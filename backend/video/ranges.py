@@ -0,0 +1,129 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from .streaming import BLOCK_SIZE, FileRange
+
+range_header_re = re.compile(r"^\s*bytes\s*=\s*(.+)$", re.I)
+range_spec_re = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+MAX_RANGES = 16  # Larger range sets are answered with the whole file
+
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested ranges overlaps the file (416)"""
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into sorted, merged (first, last) byte positions.
+
+    Returns None when the header is malformed or should be ignored, in which
+    case the whole file is served.
+    """
+    match = range_header_re.match(header or "")
+    if not match:
+        return None
+
+    ranges = []
+    for spec in match.group(1).split(","):
+        if not spec.strip():
+            continue
+        spec_match = range_spec_re.match(spec)
+        if not spec_match:
+            return None
+        first, last = spec_match.groups()
+
+        if not first:
+            # Suffix range: the last N bytes
+            if not last:
+                return None
+            length = int(last)
+            if length > 0 and size > 0:
+                ranges.append((max(0, size - length), size - 1))
+            continue
+
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        last = int(last) if last else size - 1
+        if first < size:
+            ranges.append((first, min(last, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for first, last in ranges[1:]:
+        previous_first, previous_last = merged[-1]
+        if first <= previous_last + 1:
+            merged[-1] = (previous_first, max(previous_last, last))
+        else:
+            merged.append((first, last))
+
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def make_etag(size: int, mtime: float) -> str:
+    return f'"{size:x}-{int(mtime * 1000000):x}"'
+
+
+def is_not_modified(headers, etag: str, mtime: float) -> bool:
+    """If-None-Match / If-Modified-Since evaluation for a GET request"""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        return _strip_weak(etag) in [_strip_weak(tag) for tag in parse_etags(if_none_match)]
+
+    since = parse_http_date_safe(headers.get("If-Modified-Since", ""))
+    return since is not None and int(mtime) <= since
+
+
+def if_range_matches(headers, etag: str, mtime: float) -> bool:
+    """Whether the Range header applies: If-Range must name the current version of the file"""
+    if_range = (headers.get("If-Range") or "").strip()
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag  # Weak tags never match
+    if if_range.startswith("W/"):
+        return False
+    return if_range == http_date(mtime)
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def multipart_byteranges(
+    file_path: str, ranges: List[Tuple[int, int]], size: int, content_type: str, boundary: str
+) -> Tuple[Iterator[bytes], int]:
+    """Body of a multipart/byteranges response and its exact length"""
+    headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n"
+        ).encode()
+        for first, last in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    length = sum(len(header) + (last - first + 1) + 2 for header, (first, last) in zip(headers, ranges)) + len(closing)
+
+    def body():
+        for header, (first, last) in zip(headers, ranges):
+            yield header
+            part = FileRange(file_path, first, last - first + 1)
+            try:
+                for block in iter(lambda: part.read(BLOCK_SIZE), b""):
+                    yield block
+            finally:
+                part.close()
+            yield b"\r\n"
+        yield closing
+
+    return body(), length
@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from movies.models import MovieFile
+from .hls import HlsPackager
+from .services import VideoService
+from .storage import storage
+
+video_service = VideoService()
+
+
+def _checksum(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def verify_output(movie_file: MovieFile) -> bool:
+    """Whether the converted output can be played without the source: every segment on disk and intact."""
+    if not movie_file.file_path:
+        return False
+
+    if movie_file.file_path.endswith(".m3u8"):
+        # Ladder renditions are packaged from this playlist, not from the source
+        playlist_path = storage.path(movie_file.file_path)
+        if not HlsPackager.is_complete(playlist_path):
+            return False
+        with open(playlist_path) as playlist:
+            names = [line.strip() for line in playlist if line.strip() and not line.startswith("#")]
+        hls_root = os.path.dirname(movie_file.file_path)
+        names.append(HlsPackager.INIT_NAME)
+        return all(os.path.exists(storage.path(os.path.join(hls_root, name))) for name in names)
+
+    segments = list(movie_file.segments.all())
+    duration = video_service.get_video_duration(storage.path(movie_file.source_path))
+    if not duration or [segment.index for segment in segments] != list(range(video_service.segment_count(duration))):
+        return False
+    for segment in segments:
+        path = storage.path(segment.path)
+        if segment.preview or not os.path.exists(path) or os.path.getsize(path) != segment.size:
+            return False
+        if segment.checksum and _checksum(path) != segment.checksum:
+            logging.error(f"Segment {segment.index} of movie {movie_file.tmdb_id} does not match its checksum")
+            return False
+    return True
+
+
+def release_source(movie_file: MovieFile) -> bool:
+    """Delete the downloaded original of a converted title, or move it to cold storage (VIDEO_SOURCE_RETENTION)."""
+    if settings.VIDEO_SOURCE_RETENTION == "keep" or not movie_file.source_path:
+        return False
+    source = storage.path(movie_file.source_path)
+    if not os.path.exists(source) or storage.tier(source) == storage.COLD:
+        return False
+    if not verify_output(movie_file):
+        logging.warning(f"Keeping the source of movie {movie_file.tmdb_id}, its converted output is incomplete")
+        return False
+
+    if settings.VIDEO_SOURCE_RETENTION == "cold":
+        if not storage.cold_root:
+            logging.error("VIDEO_SOURCE_RETENTION is cold but VIDEO_COLD_STORAGE_PATH is not set, keeping sources")
+            return False
+        storage.demote(movie_file.tmdb_id, movie_file.source_path)
+        logging.info(f"Moved the source of movie {movie_file.tmdb_id} to the cold tier")
+    else:
+        os.remove(source)
+        logging.info(f"Removed the source of movie {movie_file.tmdb_id}, {movie_file.file_path} is complete")
+    return True
+
+
+def release_finished_sources() -> int:
+    """Release the sources of READY titles a previous run left on disk (their torrent no longer seeds)."""
+    released = 0
+    for movie_file in MovieFile.objects.filter(download_status="READY", source_path__isnull=False):
+        try:
+            released += release_source(movie_file)
+        except Exception as e:
+            logging.error(f"Could not release the source of movie {movie_file.tmdb_id}: {e}")
+    return released
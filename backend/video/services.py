@@ -1,15 +1,32 @@
+import bisect
 import logging
 import os
-from typing import Optional, Union
-from django.http import StreamingHttpResponse, FileResponse
-import re
+from typing import Optional, Tuple, Union
+from urllib.parse import quote
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
+from django.utils.http import http_date
+import secrets
+import threading
 import time
 import ffmpeg
-
-range_re = re.compile(r"bytes\s*=\s*(\d+)\s*-\s*(\d*)", re.I)
+from .container import read_keyframes
+from .fmp4 import fragment_index
+from .hls import HlsPackager
+from .models import ProbeResult, Segment
+from .ranges import RangeNotSatisfiable, if_range_matches, is_not_modified, make_etag, multipart_byteranges, parse_range_header
+from .storage import storage
+from .streaming import BLOCK_SIZE, FileParts, FileRange, slice_parts
+from .transcoding import TranscodeJob
 
 
 class VideoService:
+    COPY_VIDEO_CODECS = {'h264'}
+    COPY_AUDIO_CODECS = {'aac', 'mp3'}
+    PREVIEW_HEIGHT = 360
+    LADDER_BITRATES = {1080: 5000000, 720: 2800000, 480: 1400000, 360: 800000}
+    RENDITION_STALE_SECONDS = 60  # A rendition playlist not updated for this long has no packager left
+
     def __init__(self):
         self.segment_duration = 10  # 10 seconds
         self.processed_segments = set()
@@ -18,48 +35,206 @@ class VideoService:
         self.segment_last_attempt = {}
         self.max_retries = 3
         self.retry_cooldown = 30  # Wait 30 seconds before retrying a failed segment
+        self.source_codec_options = {}
+        self.ffmpeg_threads = settings.VIDEO_FFMPEG_THREADS
+        self.startup_segments = settings.VIDEO_STARTUP_SEGMENTS
+        self.startup_preview = settings.VIDEO_STARTUP_PREVIEW
+        self.abr_ladder = settings.VIDEO_ABR_LADDER
+        self.renditions = {}  # Rendition packagers started by this process, by output directory
+        self._renditions_lock = threading.Lock()
+
+    def segment_bounds(self, index: int) -> Tuple[float, float]:
+        """(start time, nominal duration) of a segment, the leading ones follow the startup profile."""
+        if index < len(self.startup_segments):
+            return sum(self.startup_segments[:index]), self.startup_segments[index]
+        start = sum(self.startup_segments) + (index - len(self.startup_segments)) * self.segment_duration
+        return start, self.segment_duration
+
+    def segment_at(self, position: float) -> int:
+        """Index of the segment containing a playback position."""
+        position = max(position, 0)
+        start = 0
+        for index, duration in enumerate(self.startup_segments):
+            if position < start + duration:
+                return index
+            start += duration
+        return len(self.startup_segments) + int((position - start) // self.segment_duration)
+
+    def segment_count(self, video_duration: float) -> int:
+        if not video_duration or video_duration <= 0:
+            return 0
+        last = self.segment_at(video_duration)
+        start, _ = self.segment_bounds(last)
+        # A segment starting exactly at the end of the video would be empty
+        return last if start >= video_duration else last + 1
+
+    def probe(self, video_path: str) -> Optional[ProbeResult]:
+        """Get ffprobe metadata, reusing the cached result while the file is unchanged."""
+        try:
+            stat = os.stat(video_path)
+        except OSError as e:
+            logging.error(f"Error probing video: {e}")
+            return None
+
+        cached = ProbeResult.objects.filter(path=video_path).first()
+        if cached and cached.matches(stat.st_size, stat.st_mtime):
+            return cached
 
-    def get_video_duration(self, video_path: str) -> Optional[float]:
-        """Get video duration using ffprobe."""
         try:
             probe = ffmpeg.probe(video_path)
-            return float(probe['format']['duration'])
         except ffmpeg.Error as e:
-            logging.error(f"Error getting video duration: {e.stderr.decode()}")
+            logging.error(f"Error probing video: {e.stderr.decode()}")
             return None
         except Exception as e:
-            logging.error(f"Error getting video duration: {e}")
+            logging.error(f"Error probing video: {e}")
             return None
 
-    def is_web_compatible_mp4(self, input_path: str) -> bool:
-        """Check if the MP4 file is already web-compatible."""
+        probe_format = probe.get('format', {})
+        result, _ = ProbeResult.objects.update_or_create(
+            path=video_path,
+            defaults={
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "format_name": probe_format.get('format_name', ''),
+                "duration": float(probe_format['duration']) if probe_format.get('duration') else None,
+                "bit_rate": int(probe_format['bit_rate']) if probe_format.get('bit_rate') else None,
+                "streams": [
+                    {
+                        "index": stream.get('index'),
+                        "codec_type": stream.get('codec_type'),
+                        "codec_name": stream.get('codec_name'),
+                        "width": stream.get('width'),
+                        "height": stream.get('height'),
+                        "channels": stream.get('channels'),
+                        "pix_fmt": stream.get('pix_fmt'),
+                    }
+                    for stream in probe.get('streams', [])
+                ],
+                # The file changed, so any keyframe index is stale
+                "keyframes": None,
+            },
+        )
+        return result
+
+    def get_keyframes(self, video_path: str, since: Optional[float] = None) -> list:
+        """Get the (pts_time, byte_offset) keyframe index of the first video stream.
+
+        Read from the container's own index (moov, Cues) when it has one, else by
+        probing every packet. With since, only the packets from that time on are
+        probed: the caller holds the earlier keyframes of a file still downloading.
+        """
+        if since is not None:
+            return self._probe_keyframes(video_path, read_intervals=f"{since}%")
+
+        result = self.probe(video_path)
+        if result is None:
+            return []
+        if result.keyframes is not None:
+            return result.keyframes
+
+        keyframes = read_keyframes(video_path) or self._probe_keyframes(video_path)
+        # Only store the index if the file did not change while it was being read
+        ProbeResult.objects.filter(pk=result.pk, size=result.size, mtime=result.mtime).update(keyframes=keyframes)
+        return keyframes
+
+    def _probe_keyframes(self, video_path: str, **options) -> list:
         try:
-            probe = ffmpeg.probe(input_path)
-            format_name = probe['format']['format_name']
-            
-            # Check if it's an MP4 container
-            if 'mp4' not in format_name.lower():
-                return False
-
-            # Check video codec
-            video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-            if not video_stream or video_stream['codec_name'] not in ['h264', 'avc1']:
-                return False
-
-            # Check audio codec
-            audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-            if not audio_stream or audio_stream['codec_name'] not in ['aac']:
-                return False
-
-            return True
-        except Exception as e:
-            logging.error(f"Error checking MP4 compatibility: {e}")
-            return False
+            probe = ffmpeg.probe(video_path, select_streams='v:0', show_entries='packet=pts_time,pos,flags', **options)
+        except ffmpeg.Error as e:
+            logging.error(f"Error indexing keyframes: {e.stderr.decode()}")
+            return []
+
+        return [
+            [float(packet['pts_time']), int(packet['pos'])]
+            for packet in probe.get('packets', [])
+            if packet.get('flags', '').startswith('K') and packet.get('pts_time') not in (None, 'N/A') and packet.get('pos') not in (None, 'N/A')
+        ]
+
+    def segment_byte_range(self, keyframes: list, current_segment: int, video_duration: float, file_size: int) -> Tuple[int, int]:
+        """Source bytes [start, end) ffmpeg has to read to produce a segment."""
+        start_time, duration = self.segment_bounds(current_segment)
+        end_time = min(start_time + duration, video_duration)
+
+        # Constant-bitrate estimate with a safety margin, used where the keyframe index does not reach
+        start = int(file_size * start_time / video_duration)
+        end = min(file_size, int(file_size * end_time / video_duration * 1.05) + 1)
+
+        if keyframes:
+            index_complete = keyframes[-1][0] + self.segment_duration >= video_duration
+            # Decoding starts at the last keyframe at or before the segment start
+            position = bisect.bisect_right(keyframes, start_time, key=lambda keyframe: keyframe[0])
+            if position > 0:
+                start = keyframes[position - 1][1]
+            # ... and runs until the first keyframe after the segment end
+            position = bisect.bisect_left(keyframes, end_time, key=lambda keyframe: keyframe[0])
+            if position < len(keyframes):
+                end = keyframes[position][1]
+            elif index_complete:
+                end = file_size
+
+        return start, max(end, start + 1)
 
-    def convert_segment(self, input_path: str, output_dir: str, current_segment: int, video_duration: float) -> bool:
-        """Convert a single segment of the video to web-compatible format."""
-        start_time = current_segment * self.segment_duration
-        
+    def get_video_duration(self, video_path: str) -> Optional[float]:
+        """Get video duration using ffprobe."""
+        result = self.probe(video_path)
+        return result.duration if result else None
+
+    def codec_options(self, input_path: str) -> dict:
+        """ffmpeg output options re-encoding only the streams browsers cannot play.
+
+        H.264 video is copied whatever the container (MKV, AVI, MP4), audio is copied when
+        it is AAC or MP3 and converted to stereo AAC otherwise.
+        """
+        result = self.probe(input_path)
+        video_stream = result.video_stream() if result else None
+        audio_stream = result.audio_stream() if result else None
+
+        options = {"sn": None, "dn": None}  # Subtitles are served separately
+        if (
+            video_stream
+            and video_stream.get('codec_name') in self.COPY_VIDEO_CODECS
+            and video_stream.get('pix_fmt') in (None, 'yuv420p', 'yuvj420p')  # 10-bit H.264 does not decode in browsers
+        ):
+            options["vcodec"] = "copy"
+        else:
+            options.update(vcodec="libx264", preset="ultrafast", pix_fmt="yuv420p")
+
+        if audio_stream is None:
+            options["an"] = None
+        elif audio_stream.get('codec_name') in self.COPY_AUDIO_CODECS:
+            options["acodec"] = "copy"
+        else:
+            options.update(acodec="aac", ac=2)
+
+        logging.info(f"Stream plan for {input_path}: {self.describe_codec_options(options)}")
+        return options
+
+    def get_codec_options(self, input_path: str) -> dict:
+        """codec_options of a source, decided once (codecs don't change while the file grows)."""
+        if input_path not in self.source_codec_options:
+            self.source_codec_options[input_path] = self.codec_options(input_path)
+        return self.source_codec_options[input_path]
+
+    def segment_codec_options(self, input_path: str, current_segment: int, preview: bool = False) -> dict:
+        """get_codec_options adjusted for one segment.
+
+        Copied video can only be cut on source keyframes, so the short startup segments are
+        re-encoded: copied, they would last a whole GOP instead of their startup duration.
+        """
+        codec_options = self.get_codec_options(input_path)
+        if codec_options.get("vcodec") == "copy":
+            if current_segment < len(self.startup_segments):
+                codec_options = dict(codec_options, vcodec="libx264", preset="ultrafast", pix_fmt="yuv420p")
+        elif preview:
+            codec_options = dict(codec_options, vf=f"scale=-2:{self.PREVIEW_HEIGHT}", crf=30)
+        return codec_options
+
+    def describe_codec_options(self, options: dict) -> str:
+        audio = "none" if "an" in options else options.get("acodec")
+        return f"video {options.get('vcodec')}, audio {audio}"
+
+    def get_segment_path(self, input_path: str, output_dir: str, current_segment: int) -> str:
+        """Path of a converted segment, next to the source file."""
         # Get relative path structure from input_path
         rel_path = os.path.relpath(input_path, output_dir)
         dir_path = os.path.dirname(rel_path)
@@ -67,11 +242,21 @@ class VideoService:
         base_name = os.path.splitext(file_name)[0]
         segment_name = f"{base_name}_segment_{current_segment:03d}.mp4"
         if dir_path and dir_path != '.':
-            segment_path = os.path.join(output_dir, dir_path, segment_name)
-            # Ensure the subdirectory exists
-            os.makedirs(os.path.dirname(segment_path), exist_ok=True)
-        else:
-            segment_path = os.path.join(output_dir, segment_name)
+            return os.path.join(output_dir, dir_path, segment_name)
+        return os.path.join(output_dir, segment_name)
+
+    def convert_segment(self, input_path: str, output_dir: str, current_segment: int, video_duration: float,
+                        preview: bool = False) -> bool:
+        """Convert a single segment of the video to web-compatible format.
+
+        Preview conversions are a fast low-resolution encode, only used when the video is transcoded anyway.
+        The output replaces any previous version of the segment atomically.
+        """
+        start_time, duration = self.segment_bounds(current_segment)
+        segment_path = self.get_segment_path(input_path, output_dir, current_segment)
+        partial_path = f"{segment_path}.part"
+        # Ensure the subdirectory exists
+        os.makedirs(os.path.dirname(segment_path), exist_ok=True)
 
         # Record attempt time
         self.segment_last_attempt[current_segment] = time.time()
@@ -84,72 +269,55 @@ class VideoService:
             )
             logging.info(f"Converting segment {current_segment}{retry_info}...")
 
-            # Check if input is already a web-compatible MP4
-            is_compatible = self.is_web_compatible_mp4(input_path)
-            
-            if is_compatible:
-                # For compatible MP4s, just copy the stream without re-encoding
-                stream = (
-                    ffmpeg
-                    .input(input_path, ss=start_time, t=min(self.segment_duration, video_duration - start_time))
-                    .output(
-                        segment_path,
-                        c='copy',  # Copy streams without re-encoding
-                        movflags='frag_keyframe+empty_moov'  # Optimize for web streaming
-                    )
-                    .overwrite_output()
-                )
-            else:
-                # For other formats, convert to web-compatible format
-                stream = (
-                    ffmpeg
-                    .input(input_path, ss=start_time, t=min(self.segment_duration, video_duration - start_time))
-                    .output(
-                        segment_path,
-                        format='mp4',
-                        preset='ultrafast',
-                        movflags='frag_keyframe+empty_moov'
-                    )
-                    .overwrite_output()
+            codec_options = self.segment_codec_options(input_path, current_segment, preview)
+
+            stream = (
+                ffmpeg
+                .input(input_path, ss=start_time, t=min(duration, video_duration - start_time))
+                .output(
+                    partial_path,
+                    format='mp4',
+                    movflags='frag_keyframe+empty_moov+default_base_moof',  # Fragments stay valid when spliced after the init section
+                    threads=self.ffmpeg_threads,  # Cap per-job threads so titles share cores
+                    **codec_options
                 )
+                .overwrite_output()
+            )
 
             # Run ffmpeg
             stream.run(capture_stdout=True, capture_stderr=True)
 
-            # Verify the output file exists and is valid
-            if os.path.exists(segment_path) and os.path.getsize(segment_path) > 0:
-                try:
-                    ffmpeg.probe(segment_path)
-                    logging.info(f"✓ {'Copied' if is_compatible else 'Converted'} segment {current_segment}: {segment_path}")
+            # Verify the output file exists and is valid before it replaces the served segment
+            if os.path.exists(partial_path) and os.path.getsize(partial_path) > 0:
+                init_size, fragments = fragment_index(partial_path)
+                if init_size is not None and fragments:
+                    os.replace(partial_path, segment_path)
+                    self.probe(segment_path)
+                    logging.info(f"✓ Converted segment {current_segment} ({self.describe_codec_options(codec_options)}): {segment_path}")
                     self.processed_segments.add(current_segment)
                     return True
-                except ffmpeg.Error as e:
-                    logging.error(f"Invalid output file for segment {current_segment}: {e.stderr.decode()}")
-                    if os.path.exists(segment_path):
-                        os.remove(segment_path)
-                    return False
+                logging.error(f"Invalid output file for segment {current_segment}")
+                os.remove(partial_path)
             else:
                 logging.error(f"Output file not created for segment {current_segment}")
-                return False
 
         except ffmpeg.Error as e:
             error_msg = e.stderr.decode() if hasattr(e, 'stderr') else str(e)
             logging.error(f"FFmpeg error for segment {current_segment}: {error_msg}")
-            self.segment_retry_count[current_segment] = self.segment_retry_count.get(current_segment, 0) + 1
-            logging.error(
-                f"✗ Error {'copying' if is_compatible else 'converting'} segment {current_segment} "
-                f"(attempt {self.segment_retry_count[current_segment]}/{self.max_retries})"
-            )
-            return False
         except Exception as e:
             logging.error(f"Exception during segment {current_segment} conversion: {e}")
-            self.segment_retry_count[current_segment] = self.segment_retry_count.get(current_segment, 0) + 1
-            return False
+
+        # Every failed attempt counts towards max_retries, whatever the cause
+        self.segment_retry_count[current_segment] = self.segment_retry_count.get(current_segment, 0) + 1
+        logging.error(
+            f"✗ Error converting segment {current_segment} "
+            f"(attempt {self.segment_retry_count[current_segment]}/{self.max_retries})"
+        )
+        return False
 
     def convert_to_mp4(self, input_path: str) -> str:
         """Convert video to MP4 format in segments."""
         output_dir = os.path.dirname(input_path)
-        current_segment = 0
 
         # Get video duration
         video_duration = self.get_video_duration(input_path)
@@ -157,26 +325,10 @@ class VideoService:
             raise Exception("Could not determine video duration")
         if not os.path.exists(input_path):
             raise Exception("Input file not found")
-        while (current_segment * self.segment_duration) < video_duration:
-            # Check cooldown period for retries
-            last_attempt_time = self.segment_last_attempt.get(current_segment, 0)
-            cooldown_passed = (time.time() - last_attempt_time) >= self.retry_cooldown
-
-            if (
-                current_segment not in self.processed_segments
-                and self.segment_retry_count.get(current_segment, 0) < self.max_retries
-                and (self.segment_retry_count.get(current_segment, 0) == 0 or cooldown_passed)
-            ):
-                success = self.convert_segment(input_path, output_dir, current_segment, video_duration)
-
-                if success:
-                    current_segment += 1
-                elif self.segment_retry_count.get(current_segment, 0) >= self.max_retries:
-                    self.failed_segments.add(current_segment)
-                    logging.error(f"⚠ Skipping segment {current_segment} after {self.max_retries} failed attempts")
-                    current_segment += 1
-
-            time.sleep(1)  # Small delay to prevent CPU overload
+
+        job = TranscodeJob(self, input_path, output_dir, video_duration)
+        job.submit_range(0, job.total_segments)
+        job.wait()
 
         if self.failed_segments:
             logging.error(f"Failed segments: {sorted(list(self.failed_segments))}")
@@ -186,79 +338,224 @@ class VideoService:
         first_segment = f"{os.path.splitext(input_path)[0]}_segment_000.mp4"
         return first_segment
 
-    def stream_video(self, file_path: str, range_header: str = "", start_time: float = 0) -> Union[StreamingHttpResponse, FileResponse]:
-        """Stream video content with support for range requests and segment switching."""
+    def get_hls_dir(self, input_path: str) -> str:
+        """Directory holding the HLS playlist, init segment and media segments of a title."""
+        return f"{os.path.splitext(input_path)[0]}_hls"
+
+    def create_hls_packager(self, input_path: str, from_file: bool = False) -> HlsPackager:
+        """Build a single ffmpeg HLS packager for the whole title."""
+        if self.abr_ladder:
+            self.write_master_playlist(input_path)
+        return HlsPackager(
+            input_path,
+            self.get_hls_dir(input_path),
+            self.segment_duration,
+            self.codec_options(input_path),
+            from_file=from_file,
+        )
+
+    def rendition_bitrate(self, height: int) -> int:
+        return self.LADDER_BITRATES.get(height, int(self.LADDER_BITRATES[720] * (height / 720) ** 2))
+
+    def write_master_playlist(self, input_path: str) -> str:
+        """List the source rendition and the lower ladder renditions in master.m3u8."""
+        result = self.probe(input_path)
+        video_stream = result.video_stream() if result else None
+        width = video_stream.get('width') if video_stream else None
+        height = video_stream.get('height') if video_stream else None
+
+        variants = [(
+            HlsPackager.PLAYLIST_NAME,
+            result.bit_rate if result and result.bit_rate else self.rendition_bitrate(height or 1080),
+            width,
+            height,
+        )]
+        for rendition in sorted(self.abr_ladder, reverse=True):
+            if height and rendition >= height:
+                continue
+            rendition_width = int(width * rendition / height) // 2 * 2 if width and height else None
+            variants.append((
+                f"{rendition}p/{HlsPackager.PLAYLIST_NAME}",
+                self.rendition_bitrate(rendition),
+                rendition_width,
+                rendition,
+            ))
+        return HlsPackager.write_master_playlist(self.get_hls_dir(input_path), variants)
+
+    def rendition_options(self, height: int) -> dict:
+        """Encode a lower rendition with the keyframes of the source rendition, so segments line up."""
+        bitrate = self.rendition_bitrate(height)
+        return {
+            "vcodec": "libx264",
+            "preset": "veryfast",
+            "vf": f"scale=-2:{height}",
+            "b:v": bitrate,
+            "maxrate": bitrate,
+            "bufsize": bitrate * 2,
+            "force_key_frames": "source",
+            "sc_threshold": 0,  # No extra keyframes, they would move segment boundaries
+            "g": 9999,
+            "acodec": "aac",
+            "ac": 2,
+            "b:a": "128k",
+            "sn": None,
+            "dn": None,
+            "threads": self.ffmpeg_threads,
+        }
+
+    def start_rendition(self, hls_dir: str, height: int) -> Optional[str]:
+        """Package a ladder rendition from the source rendition, unless it exists or is in progress.
+
+        Returns the rendition playlist path, None when the height is not part of the ladder.
+        """
+        if height not in self.abr_ladder:
+            return None
+        output_dir = os.path.join(hls_dir, f"{height}p")
+        playlist_path = os.path.join(output_dir, HlsPackager.PLAYLIST_NAME)
+
+        with self._renditions_lock:
+            packager = self.renditions.get(output_dir)
+            if packager is not None and packager.is_running():
+                return playlist_path
+            if HlsPackager.is_complete(playlist_path):
+                return playlist_path
+            # Another worker process may be producing it
+            last_update = max(
+                (os.path.getmtime(path) for path in (playlist_path, output_dir) if os.path.exists(path)), default=0
+            )
+            if packager is None and time.time() - last_update < self.RENDITION_STALE_SECONDS:
+                return playlist_path
+
+            packager = HlsPackager(
+                os.path.join(hls_dir, HlsPackager.PLAYLIST_NAME),
+                output_dir,
+                self.segment_duration,
+                self.rendition_options(height),
+                from_file=True,
+                # Read the event playlist from its first segment and follow it while it grows
+                input_options={"live_start_index": 0},
+            )
+            packager.start()
+            self.renditions[output_dir] = packager
+            logging.info(f"Started {height}p rendition in {output_dir}")
+        return playlist_path
+
+    def accel_redirect(self, file_path: str, content_type: str = 'video/mp4') -> HttpResponse:
+        """Hand the file over to nginx, which serves it with sendfile and native range support."""
+        relative_path = os.path.relpath(file_path, settings.DOWNLOAD_PATH)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{settings.VIDEO_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(relative_path)}"
+        response['Cache-Control'] = 'no-cache'  # nginx passes it on, its own ETag revalidates the file
+        return response
+
+    def stream_video(
+        self,
+        file_path: str,
+        range_header: str = "",
+        start_time: float = 0,
+        request_headers=None,
+        segment: Optional[Segment] = None,
+    ) -> Union[StreamingHttpResponse, FileResponse, HttpResponse]:
+        """Stream video content with support for range requests and conditional requests.
+
+        With an indexed segment, start_time (seconds into the segment) skips to the preceding keyframe.
+        """
         try:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Video file not found: {file_path}")
 
-            file_size = os.path.getsize(file_path)
-            content_type = 'video/mp4'
+            keyframe = None
+            if segment is not None and start_time > 0 and segment.init_size:
+                keyframe = segment.keyframe_offset(start_time)
+                if keyframe and keyframe[1] <= segment.init_size:
+                    keyframe = None  # Already the first fragment
 
-            # Handle range request
-            if range_header:
+            # The nginx location only maps the hot tier
+            if settings.VIDEO_ACCEL_REDIRECT_PREFIX and keyframe is None and storage.tier(file_path) == storage.HOT:
+                return self.accel_redirect(file_path)
+
+            stat = os.stat(file_path)
+            file_size = stat.st_size
+            content_type = 'video/mp4'
+            request_headers = request_headers or {}
+            etag = make_etag(file_size, stat.st_mtime)
+
+            # Seeking inside a segment: the init section, then the fragments from the keyframe on
+            parts = [(0, file_size)]
+            if keyframe:
+                parts = [(0, segment.init_size), (keyframe[1], file_size - keyframe[1])]
+                etag = f'{etag[:-1]}-{keyframe[1]:x}"'
+            content_size = sum(length for _, length in parts)
+
+            if is_not_modified(request_headers, etag, stat.st_mtime):
+                response = HttpResponse(status=304)
+                self._set_stream_headers(response, etag, stat.st_mtime)
+                return response
+
+            ranges = None
+            if range_header and if_range_matches(request_headers, etag, stat.st_mtime):
                 try:
-                    ranges = range_header.replace('bytes=', '').split('-')
-                    first_byte = int(ranges[0])
-                    last_byte = int(ranges[1]) if ranges[1] else file_size - 1
-                except (IndexError, ValueError):
-                    first_byte = 0
-                    last_byte = file_size - 1
+                    ranges = parse_range_header(range_header, content_size)
+                except RangeNotSatisfiable:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{content_size}'
+                    self._set_stream_headers(response, etag, stat.st_mtime)
+                    return response
+                if ranges and len(ranges) > 1 and keyframe:
+                    ranges = None  # Multipart bodies are only built from the plain file
+
+            if ranges is None:
+                response = FileResponse(self._file_body(file_path, parts), status=200, content_type=content_type)
+                response.block_size = BLOCK_SIZE
+                response['Content-Length'] = str(content_size)
+            elif len(ranges) == 1:
+                # The WSGI server sends the range with sendfile() when it provides wsgi.file_wrapper
+                first_byte, last_byte = ranges[0]
+                length = last_byte - first_byte + 1
+                response = FileResponse(
+                    self._file_body(file_path, slice_parts(parts, first_byte, last_byte)),
+                    status=206,
+                    content_type=content_type
+                )
+                response.block_size = BLOCK_SIZE
+                response['Content-Length'] = str(length)
+                response['Content-Range'] = f'bytes {first_byte}-{last_byte}/{content_size}'
             else:
-                first_byte = 0
-                last_byte = file_size - 1
-
-            # Ensure valid range
-            if first_byte >= file_size or first_byte < 0:
-                first_byte = 0
-            if last_byte >= file_size:
-                last_byte = file_size - 1
-
-            length = last_byte - first_byte + 1
-
-            # Create response
-            response = StreamingHttpResponse(
-                self._stream_video_content(file_path, first_byte, last_byte),
-                status=206 if range_header else 200,
-                content_type=content_type
-            )
-
-            # Set headers
-            response['Accept-Ranges'] = 'bytes'
-            response['Content-Length'] = str(length)
-            if range_header:
-                response['Content-Range'] = f'bytes {first_byte}-{last_byte}/{file_size}'
-            
-            # CORS headers
-            response['Access-Control-Allow-Origin'] = '*'
-            response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response['Access-Control-Allow-Headers'] = 'Range'
-            
-            # Cache control
-            response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response['Pragma'] = 'no-cache'
-            response['Expires'] = '0'
+                boundary = secrets.token_hex(16)
+                body, length = multipart_byteranges(file_path, ranges, file_size, content_type, boundary)
+                response = StreamingHttpResponse(
+                    body,
+                    status=206,
+                    content_type=f'multipart/byteranges; boundary={boundary}'
+                )
+                response['Content-Length'] = str(length)
 
+            self._set_stream_headers(response, etag, stat.st_mtime)
+            if keyframe:
+                response['X-Start-Time'] = str(keyframe[0])
             return response
 
         except Exception as e:
             logging.error(f"Error in stream_video: {str(e)}")
             raise
 
-    def _stream_video_content(self, file_path: str, start: int, end: int):
-        """Generator to stream video content in chunks."""
-        chunk_size = 8192
-        try:
-            with open(file_path, 'rb') as f:
-                f.seek(start)
-                remaining = end - start + 1
-                while remaining > 0:
-                    chunk = min(chunk_size, remaining)
-                    data = f.read(chunk)
-                    if not data:
-                        break
-                    yield data
-                    remaining -= len(data)
-        except Exception as e:
-            logging.error(f"Error in _stream_video_content: {str(e)}")
-            raise
\ No newline at end of file
+    def _file_body(self, file_path: str, parts) -> Union[FileRange, FileParts]:
+        if len(parts) == 1:
+            offset, length = parts[0]
+            return FileRange(file_path, offset, length)
+        return FileParts(file_path, parts)
+
+    def _set_stream_headers(self, response: HttpResponse, etag: str, mtime: float):
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+
+        # CORS headers
+        response['Access-Control-Allow-Origin'] = '*'
+        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        response['Access-Control-Allow-Headers'] = 'Range, If-Range, If-None-Match, If-Modified-Since'
+        response['Access-Control-Expose-Headers'] = 'Accept-Ranges, Content-Length, Content-Range, ETag, X-Start-Time'
+
+        # Segments are rewritten when a preview is replaced or an evicted title is converted again,
+        # so caches revalidate them against the ETag on every use
+        response['Cache-Control'] = 'no-cache'
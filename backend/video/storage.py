@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from django.conf import settings
+
+
+class TieredStorage:
+    """Places title files on a fast hot volume and an optional large cold volume.
+
+    Paths stored in the database are relative, e.g. "movies/<tmdb_id>/...", and
+    resolve to the same relative location under either root. New files are always
+    written to the hot root; titles move between tiers file by file, each file
+    being copied completely before the other copy is removed, so a relative path
+    resolves to a complete file at any time.
+    """
+
+    HOT = "hot"
+    COLD = "cold"
+
+    def __init__(self, hot_root: str, cold_root: Optional[str] = None):
+        self.hot_root = hot_root
+        self.cold_root = cold_root or None
+        self._title_locks = {}
+        self._locks_lock = threading.Lock()
+        self._promotions = set()
+        self._promoter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-promote")
+
+    @staticmethod
+    def movie_root(tmdb_id) -> str:
+        return os.path.join("movies", str(tmdb_id))
+
+    @staticmethod
+    def subtitles_root(tmdb_id) -> str:
+        return os.path.join("subtitles", str(tmdb_id))
+
+    def roots(self) -> List[str]:
+        return [self.hot_root] + ([self.cold_root] if self.cold_root else [])
+
+    def hot_path(self, relative_path: str) -> str:
+        """Where new files are written."""
+        return os.path.join(self.hot_root, relative_path)
+
+    def path(self, relative_path: str) -> str:
+        """Absolute path of a stored file, on the tier holding it (the hot root when it does not exist)."""
+        for root in self.roots():
+            candidate = os.path.join(root, relative_path)
+            if os.path.exists(candidate):
+                return candidate
+        return self.hot_path(relative_path)
+
+    def relative(self, path: str) -> str:
+        for root in self.roots():
+            if os.path.commonpath([root, path]) == root:
+                return os.path.relpath(path, root)
+        raise ValueError(f"{path} is outside of the storage roots")
+
+    def tier(self, path: str) -> Optional[str]:
+        """Tier of an absolute path returned by path()."""
+        if self.cold_root and os.path.commonpath([self.cold_root, path]) == self.cold_root:
+            return self.COLD
+        return self.HOT
+
+    def has_cold_files(self, tmdb_id) -> bool:
+        if not self.cold_root:
+            return False
+        cold_dir = os.path.join(self.cold_root, self.movie_root(tmdb_id))
+        return any(files for _, _, files in os.walk(cold_dir))
+
+    def _title_lock(self, tmdb_id) -> threading.Lock:
+        with self._locks_lock:
+            return self._title_locks.setdefault(int(tmdb_id), threading.Lock())
+
+    def _move_tree(self, relative_dir: str, source_root: str, destination_root: str) -> int:
+        moved = 0
+        source_dir = os.path.join(source_root, relative_dir)
+        for directory, _, files in os.walk(source_dir):
+            for name in files:
+                if name.endswith(".part"):
+                    continue  # Being written
+                source = os.path.join(directory, name)
+                destination = os.path.join(destination_root, os.path.relpath(source, source_root))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                try:
+                    shutil.copy2(source, f"{destination}.{os.getpid()}.part")
+                except FileNotFoundError:
+                    continue  # Moved by another process meanwhile
+                os.replace(f"{destination}.{os.getpid()}.part", destination)
+                os.remove(source)
+                moved += os.path.getsize(destination)
+        # Leave no empty directories behind
+        for directory, _, _ in sorted(os.walk(source_dir), key=lambda entry: len(entry[0]), reverse=True):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        return moved
+
+    def demote(self, tmdb_id, relative_dir: Optional[str] = None) -> int:
+        """Move a title (or one of its files or directories) to the cold root. Returns the bytes moved."""
+        if not self.cold_root:
+            return 0
+        relative_dir = relative_dir or self.movie_root(tmdb_id)
+        with self._title_lock(tmdb_id):
+            source = os.path.join(self.hot_root, relative_dir)
+            if os.path.isfile(source):
+                destination = os.path.join(self.cold_root, relative_dir)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copy2(source, f"{destination}.{os.getpid()}.part")
+                os.replace(f"{destination}.{os.getpid()}.part", destination)
+                os.remove(source)
+                return os.path.getsize(destination)
+            return self._move_tree(relative_dir, self.hot_root, self.cold_root)
+
+    def promote(self, tmdb_id) -> int:
+        """Move the cold files of a title back to the hot root. Returns the bytes moved."""
+        if not self.cold_root:
+            return 0
+        with self._title_lock(tmdb_id):
+            moved = self._move_tree(self.movie_root(tmdb_id), self.cold_root, self.hot_root)
+        if moved:
+            logging.info(f"Promoted movie {tmdb_id} to the hot tier ({moved // 2 ** 20} MB)")
+        return moved
+
+    def promote_async(self, tmdb_id):
+        """Promote a title in the background, once at a time, when a client streams it from the cold tier."""
+        with self._locks_lock:
+            if int(tmdb_id) in self._promotions:
+                return
+            self._promotions.add(int(tmdb_id))
+
+        def run():
+            try:
+                self.promote(tmdb_id)
+            except Exception as e:
+                logging.error(f"Could not promote movie {tmdb_id}: {e}")
+            finally:
+                with self._locks_lock:
+                    self._promotions.discard(int(tmdb_id))
+
+        self._promoter.submit(run)
+
+    def remove(self, relative_path: str):
+        """Delete a file or directory from every tier."""
+        for root in self.roots():
+            path = os.path.join(root, relative_path)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+storage = TieredStorage(settings.DOWNLOAD_PATH, settings.VIDEO_COLD_STORAGE_PATH)
@@ -0,0 +1,80 @@
+import mmap
+
+BLOCK_SIZE = 1024 * 1024  # Read size when the range is not sent with sendfile()
+
+
+class FileRange:
+    """Read-only file object limited to bytes [offset, offset + length) of a file.
+
+    It exposes fileno() with the descriptor positioned at ``offset``, so a WSGI
+    server with wsgi.file_wrapper support (gunicorn) can sendfile() the range
+    using the response Content-Length. Otherwise the range is read in large
+    blocks from an mmap of the file.
+    """
+
+    def __init__(self, path: str, offset: int, length: int):
+        self.name = path
+        self.offset = offset
+        self.length = length
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+        self._position = 0
+        self._mmap = None
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self.length - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+
+        if self._mmap is None:
+            # Only mapped when the server does not use sendfile
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self.offset + self._position
+        data = self._mmap[start:start + size]
+        self._position += len(data)
+        return data
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class FileParts:
+    """Read-only file object concatenating several (offset, length) parts of one file."""
+
+    def __init__(self, path: str, parts):
+        self.name = path
+        self.parts = [FileRange(path, offset, length) for offset, length in parts if length > 0]
+
+    def read(self, size: int = -1) -> bytes:
+        while self.parts:
+            data = self.parts[0].read(size)
+            if data:
+                return data
+            self.parts.pop(0).close()
+        return b""
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+        self.parts = []
+
+
+def slice_parts(parts, first: int, last: int):
+    """Bytes first..last (inclusive) of the concatenation of parts, as parts of the file"""
+    sliced = []
+    position = 0
+    for offset, length in parts:
+        start = max(first - position, 0)
+        end = min(last - position + 1, length)
+        if start < end:
+            sliced.append((offset + start, end - start))
+        position += length
+    return sliced
@@ -0,0 +1,153 @@
+import logging
+import os
+
+import requests
+from celery import chain, current_app, shared_task, states
+from celery.result import AsyncResult
+from django.conf import settings
+from movies.models import MovieFile
+from movies.services import TMDBService
+from .engine import engine
+from .models import Segment
+from .storage import storage
+
+PIPELINE_QUEUES = ["celery", "downloads", "prefetch"]
+PIPELINE_CLAIM = "claimed"  # pipeline_task_id while a request is queueing the pipeline
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def fetch_metadata(self, tmdb_id):
+    """Store the IMDb id of a title (used to look up subtitles) before downloading it."""
+    movie_file = MovieFile.objects.get(tmdb_id=tmdb_id)
+    if movie_file.imdb_id:
+        return tmdb_id
+
+    try:
+        response = requests.get(
+            f"{TMDBService.BASE_URL}/movie/{tmdb_id}/external_ids", headers=TMDBService.get_headers(), timeout=10
+        )
+        response.raise_for_status()
+        imdb_id = response.json().get("imdb_id")
+        if imdb_id:
+            MovieFile.objects.filter(pk=movie_file.pk).update(imdb_id=imdb_id.removeprefix("tt"))
+    except requests.RequestException as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        logging.error(f"Could not fetch metadata of movie {tmdb_id}, downloading without it: {e}")
+    return tmdb_id
+
+
+@shared_task(bind=True, max_retries=settings.VIDEO_DOWNLOAD_RETRIES, default_retry_delay=60)
+def download_movie(self, tmdb_id, prefetch=False):
+    """Download a title and convert it while it downloads; returns once the job is closed.
+
+    Segments are converted as soon as their source pieces arrive, so transcoding
+    runs alongside the download, in this worker or in the torrent daemon.
+    """
+    movie_file = MovieFile.objects.get(tmdb_id=tmdb_id)
+    if movie_file.download_status == "READY":
+        return tmdb_id
+
+    engine.start(tmdb_id, prefetch=prefetch)
+    engine.wait(tmdb_id)
+
+    movie_file.refresh_from_db(fields=["download_status"])
+    if movie_file.download_status == "ERROR":
+        raise self.retry(exc=RuntimeError(f"Processing of movie {tmdb_id} failed"))
+    return tmdb_id
+
+
+@shared_task
+def finalize_movie(tmdb_id):
+    """Check the segment manifest against the files on disk once a title is processed."""
+    movie_file = MovieFile.objects.get(tmdb_id=tmdb_id)
+    broken = [
+        segment.pk
+        for segment in movie_file.segments.all()
+        if not os.path.exists(storage.path(segment.path)) or os.path.getsize(storage.path(segment.path)) != segment.size
+    ]
+    if broken:
+        logging.warning(f"Removing {len(broken)} segments of movie {tmdb_id} missing or changed on disk")
+        Segment.objects.filter(pk__in=broken).delete()
+    logging.info(f"Movie {tmdb_id} finished processing with status {movie_file.download_status}")
+    MovieFile.objects.filter(pk=movie_file.pk).update(pipeline_task_id=None)
+    return tmdb_id
+
+
+@shared_task
+def pipeline_failed(tmdb_id):
+    """Error callback of the pipeline: nothing is queued for the title anymore, it can be started again."""
+    logging.error(f"Processing pipeline of movie {tmdb_id} failed")
+    MovieFile.objects.filter(tmdb_id=tmdb_id).update(pipeline_task_id=None)
+
+
+def pipeline_queued(movie_file: MovieFile) -> bool:
+    """Whether a pipeline of the title is queued or running."""
+    if not movie_file.pipeline_task_id:
+        return False
+    if movie_file.pipeline_task_id == PIPELINE_CLAIM:
+        return True
+    # A pipeline that ended without clearing its id (worker lost) does not block the title
+    return AsyncResult(movie_file.pipeline_task_id, app=current_app).state not in states.READY_STATES
+
+
+def enqueue_movie(tmdb_id, prefetch=False):
+    """Queue the processing pipeline of a title. Returns None when one is already queued or running.
+
+    The id of the queued pipeline is stored on the MovieFile until it ends, so a
+    title reset to PENDING (evicted, or a failed attempt) can be queued again.
+    """
+    movie_file = MovieFile.objects.get(tmdb_id=tmdb_id)
+    if pipeline_queued(movie_file):
+        return None
+    # Claim the title first, concurrent requests must not queue it twice
+    claimed = MovieFile.objects.filter(pk=movie_file.pk, pipeline_task_id=movie_file.pipeline_task_id).update(
+        pipeline_task_id=PIPELINE_CLAIM, download_status="PENDING"
+    )
+    if not claimed:
+        return None
+
+    download = download_movie.si(tmdb_id, prefetch=prefetch)
+    if prefetch:
+        # Workers take prefetches only when no title a user waits for is queued
+        download = download.set(queue="prefetch")
+    pipeline = chain(fetch_metadata.si(tmdb_id), download, finalize_movie.si(tmdb_id)).on_error(pipeline_failed.si(tmdb_id))
+    try:
+        result = pipeline.apply_async()
+    except Exception:
+        MovieFile.objects.filter(pk=movie_file.pk).update(pipeline_task_id=None)
+        raise
+    # Unless the pipeline already ended (eager mode, fast workers)
+    MovieFile.objects.filter(pk=movie_file.pk, pipeline_task_id=PIPELINE_CLAIM).update(pipeline_task_id=result.id)
+    return result
+
+
+def queue_overview() -> dict:
+    """Waiting, reserved and running pipeline tasks across workers."""
+    waiting = {}
+    try:
+        with current_app.connection_for_read() as connection:
+            channel = connection.default_channel
+            for queue in PIPELINE_QUEUES:
+                try:
+                    waiting[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+                except Exception:
+                    waiting[queue] = 0  # Not declared yet, nothing was ever queued
+    except Exception as e:
+        logging.error(f"Could not read queue lengths: {e}")
+
+    def describe(tasks):
+        return [
+            {"task": task["name"], "tmdb_id": (task.get("args") or [None])[0], "worker": worker}
+            for worker, worker_tasks in (tasks or {}).items()
+            for task in worker_tasks
+        ]
+
+    try:
+        inspect = current_app.control.inspect(timeout=1)
+        running, reserved = describe(inspect.active()), describe(inspect.reserved())
+    except Exception as e:
+        logging.error(f"Could not inspect workers: {e}")
+        running, reserved = [], []
+
+    return {"waiting": waiting, "reserved": reserved, "running": running}
@@ -0,0 +1,44 @@
+from video.admission import AdmissionScheduler
+
+
+class FakeJob:
+    def __init__(self, tmdb_id):
+        self.tmdb_id = tmdb_id
+        self.started = False
+        self.admission_release = None
+
+    def start(self):
+        self.started = True
+
+
+def test_queue_respects_concurrency_and_priority(tmp_path):
+    """ Test waiting titles are admitted before prefetches once a slot frees up """
+    scheduler = AdmissionScheduler(1, 0, str(tmp_path))
+    first, prefetch, waiting = FakeJob(1), FakeJob(2), FakeJob(3)
+
+    assert scheduler.submit(first) == 0
+    assert scheduler.submit(prefetch, AdmissionScheduler.PREFETCH) == 1
+    assert scheduler.submit(waiting) == 1
+    assert scheduler.position(2) == 2
+    assert first.started and not prefetch.started and not waiting.started
+
+    first.admission_release(first)
+    assert waiting.started and not prefetch.started
+    assert scheduler.position(2) == 1
+
+
+def test_cancel_and_promote(tmp_path):
+    """ Test queued titles can be cancelled or promoted when a user starts waiting """
+    scheduler = AdmissionScheduler(1, 0, str(tmp_path))
+    running, prefetch, other = FakeJob(1), FakeJob(2), FakeJob(3)
+    scheduler.submit(running)
+    scheduler.submit(other, AdmissionScheduler.PREFETCH)
+    scheduler.submit(prefetch, AdmissionScheduler.PREFETCH)
+
+    scheduler.submit(prefetch, AdmissionScheduler.WAITING)
+    assert scheduler.position(2) == 1
+    assert scheduler.cancel(3)
+    assert scheduler.queued() == [prefetch]
+
+    scheduler.release(running)
+    assert prefetch.started and not other.started
@@ -0,0 +1,98 @@
+import struct
+
+from video.container import CUES_ID, TAIL_BYTES, read_keyframes, trailing_index_range
+
+
+def box(kind, payload=b"", size=None):
+    return struct.pack(">I4s", size or 8 + len(payload), kind) + payload
+
+
+def element(element_id, payload):
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + bytes([0x80 | len(payload)]) + payload
+
+
+def test_mp4_moov_after_mdat():
+    """ Test the moov box following a large mdat is located from the mdat header """
+    head = box(b"ftyp", b"isom\x00\x00\x02\x00") + box(b"mdat", size=50_000_000) + b"\x00" * 1000
+    assert trailing_index_range(head, 50_100_000) == (16 + 50_000_000, 50_100_000)
+
+
+def test_mp4_moov_in_head():
+    """ Test faststart files need nothing beyond the head """
+    head = box(b"ftyp", b"isom\x00\x00\x02\x00") + box(b"moov", b"\x00" * 100) + box(b"mdat", size=50_000_000)
+    assert trailing_index_range(head, 50_000_200) is None
+
+
+def test_mkv_cues_from_seek_head():
+    """ Test the Cues position is read from the SeekHead, relative to the Segment payload """
+    cues_position = element(0x53AC, (40_000_000).to_bytes(4, "big"))
+    seek = element(0x4DBB, element(0x53AB, struct.pack(">I", CUES_ID)) + cues_position)
+    segment_payload = element(0x114D9B74, seek) + b"\x00" * 100
+    head = element(0x1A45DFA3, b"\x42\x86\x81\x01") + bytes.fromhex("18538067") + b"\x01\xff\xff\xff\xff\xff\xff\xff"
+    segment_start = len(head)
+    head += segment_payload
+
+    start, end = trailing_index_range(head, 41_000_000)
+    assert start == segment_start + 40_000_000
+    assert end == 41_000_000
+
+
+def test_unknown_layout_falls_back_to_tail():
+    """ Test files of unknown layout fetch their tail first """
+    assert trailing_index_range(b"RIFF\x00\x00\x00\x00AVI ", 100_000_000) == (100_000_000 - TAIL_BYTES, 100_000_000)
+
+
+def full_box(kind, entries, entry_format):
+    return box(kind, struct.pack(">II", 0, len(entries)) + b"".join(struct.pack(entry_format, *entry) for entry in entries))
+
+
+def test_mp4_keyframes_from_sample_tables(tmp_path):
+    """ Test sync samples are mapped to their presentation time and byte offset """
+    stbl = box(b"stbl", b"".join([
+        full_box(b"stts", [(6, 1000)], ">II"),
+        full_box(b"ctts", [(6, 500)], ">II"),
+        full_box(b"stss", [(1,), (4,)], ">I"),
+        full_box(b"stsc", [(1, 3, 1)], ">III"),
+        box(b"stsz", struct.pack(">III", 0, 0, 6) + struct.pack(">6I", 100, 10, 10, 200, 20, 20)),
+        full_box(b"stco", [(5000,), (9000,)], ">I"),
+    ]))
+    mdhd = box(b"mdhd", b"\x00" * 12 + struct.pack(">I", 1000) + b"\x00" * 8)
+    hdlr = box(b"hdlr", b"\x00" * 8 + b"vide" + b"\x00" * 12)
+    moov = box(b"moov", box(b"trak", box(b"mdia", mdhd + hdlr + box(b"minf", stbl))))
+    path = tmp_path / "movie.mp4"
+    path.write_bytes(box(b"ftyp", b"isom\x00\x00\x02\x00") + box(b"mdat", b"\x00" * 100) + moov)
+
+    assert read_keyframes(str(path)) == [[0.5, 5000], [3.5, 9000]]
+
+
+def test_mp4_keyframes_missing_moov(tmp_path):
+    """ Test a moov not downloaded yet gives no index instead of a wrong one """
+    path = tmp_path / "movie.mp4"
+    path.write_bytes(box(b"ftyp", b"isom\x00\x00\x02\x00") + box(b"mdat", b"\x00" * 100) + b"\x00" * 200)
+    assert read_keyframes(str(path)) is None
+
+
+def test_mkv_keyframes_from_cues(tmp_path):
+    """ Test cue points of the video track are read at the SeekHead position, in seconds """
+    cue_points = b"".join(
+        element(0xBB, element(0xB3, time.to_bytes(2, "big")) + element(0xB7, element(0xF7, b"\x01") + element(0xF1, position.to_bytes(3, "big"))))
+        for time, position in [(0, 1000), (5000, 70000)]
+    )
+    cues = element(CUES_ID, cue_points)
+    tracks = element(0x1654AE6B, element(0xAE, element(0xD7, b"\x01") + element(0x83, b"\x01")))
+    info = element(0x1549A966, element(0x2AD7B1, (1000000).to_bytes(3, "big")))
+
+    def seek(element_id, position):
+        return element(0x4DBB, element(0x53AB, struct.pack(">I", element_id)) + element(0x53AC, position.to_bytes(4, "big")))
+
+    seek_head_size = len(element(0x114D9B74, seek(CUES_ID, 0) * 2))
+    cues_position = seek_head_size + len(info) + len(tracks) + 50
+    seek_head = element(0x114D9B74, seek(CUES_ID, cues_position) + seek(0x1654AE6B, seek_head_size + len(info)))
+    segment_payload = seek_head + info + tracks + b"\x00" * 50 + cues
+    head = element(0x1A45DFA3, b"\x42\x86\x81\x01") + bytes.fromhex("18538067") + b"\x01\xff\xff\xff\xff\xff\xff\xff"
+    segment_start = len(head)
+    path = tmp_path / "movie.mkv"
+    path.write_bytes(head + segment_payload)
+
+    assert read_keyframes(str(path)) == [[0.0, segment_start + 1000], [5.0, segment_start + 70000]]
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from video.eviction import DiskUsage, FreeSpacePolicy, QuotaPolicy
+
+GB = 2 ** 30
+
+
+def footprints(*sizes, cold=()):
+    """ Titles in eviction order, those listed in cold have every file on the cold tier """
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            tmdb_id=index, total=size * GB, hot=0 if index in cold else size * GB, last_used=now - timedelta(days=index)
+        )
+        for index, size in enumerate(sizes)
+    ]
+
+
+def test_quota_policy_evicts_until_titles_fit():
+    """ Test the quota policy takes candidates in order until the excess is covered """
+    candidates = footprints(4, 3, 2)
+    selected = QuotaPolicy(5 * GB).select(candidates, DiskUsage(cached=9 * GB, free=100 * GB))
+    assert [footprint.tmdb_id for footprint in selected] == [0]
+    assert QuotaPolicy(10 * GB).select(candidates, DiskUsage(cached=9 * GB, free=100 * GB)) == []
+
+
+def test_free_space_policy_evicts_until_watermark():
+    """ Test the free space policy frees enough space to reach the watermark """
+    candidates = footprints(1, 1, 1)
+    selected = FreeSpacePolicy(10 * GB).select(candidates, DiskUsage(cached=3 * GB, free=8 * GB))
+    assert [footprint.tmdb_id for footprint in selected] == [0, 1]
+
+
+def test_free_space_policy_skips_cold_titles():
+    """ Test titles on the cold tier are not evicted to free the download volume, and free nothing there """
+    candidates = footprints(4, 1, 1, 1, cold=(0, 2))
+    selected = FreeSpacePolicy(10 * GB).select(candidates, DiskUsage(cached=7 * GB, free=8 * GB))
+    assert [footprint.tmdb_id for footprint in selected] == [1, 3]
@@ -0,0 +1,57 @@
+import struct
+
+from video.fmp4 import fragment_index
+
+
+def box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type, payload):
+    return box(box_type, b"\0\0\0\0" + payload)
+
+
+def track(track_id, handler, timescale):
+    tkhd = full_box(b"tkhd", struct.pack(">III", 0, 0, track_id) + bytes(68))
+    mdhd = full_box(b"mdhd", struct.pack(">III", 0, 0, timescale) + bytes(8))
+    hdlr = full_box(b"hdlr", b"\0\0\0\0" + handler + bytes(12))
+    return box(b"trak", tkhd, box(b"mdia", mdhd, hdlr))
+
+
+def tfhd_box(track_id, base_data_offset=None):
+    if base_data_offset is None:
+        return full_box(b"tfhd", struct.pack(">I", track_id))
+    return box(b"tfhd", struct.pack(">IIQ", 0x000001, track_id, base_data_offset))
+
+
+def fragment(decode_times, base_data_offset=None):
+    trafs = [
+        box(b"traf", tfhd_box(track_id, base_data_offset), full_box(b"tfdt", struct.pack(">I", time)))
+        for track_id, time in decode_times
+    ]
+    return box(b"moof", *trafs) + box(b"mdat", bytes(100))
+
+
+def test_fragment_index(tmp_path):
+    """ Test fragments are indexed by video decode time and byte offset """
+    init = box(b"ftyp", b"isom") + box(b"moov", track(1, b"soun", 48000), track(2, b"vide", 1000))
+    first = fragment([(1, 96000), (2, 2000)])
+    second = fragment([(1, 336000), (2, 7000)])
+    path = tmp_path / "segment.mp4"
+    path.write_bytes(init + first + second)
+
+    init_size, fragments = fragment_index(str(path))
+
+    assert init_size == len(init)
+    assert fragments == [[0.0, len(init)], [5.0, len(init) + len(first)]]
+
+
+def test_absolute_offset_fragments_are_not_indexed(tmp_path):
+    """ Test fragments written without default_base_moof are not offered for splicing """
+    init = box(b"ftyp", b"isom") + box(b"moov", track(1, b"vide", 1000))
+    first = fragment([(1, 0)], base_data_offset=len(init))
+    path = tmp_path / "segment.mp4"
+    path.write_bytes(init + first + fragment([(1, 5000)], base_data_offset=len(init) + len(first)))
+
+    assert fragment_index(str(path)) == (len(init), [])
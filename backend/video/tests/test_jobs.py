@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from movies.models import MovieFile
+from video import jobs
+from video.jobs import DownloadJob
+
+PIECE_LENGTH = 1024 * 1024
+
+
+class FakeHandle:
+    """ Torrent handle recording piece deadlines, with the given pieces downloaded """
+
+    def __init__(self, downloaded=()):
+        self.downloaded = set(downloaded)
+        self.deadlines = {}
+
+    def have_piece(self, piece):
+        return piece in self.downloaded
+
+    def set_piece_deadline(self, piece, deadline):
+        self.deadlines[piece] = deadline
+
+    def reset_piece_deadline(self, piece):
+        self.deadlines.pop(piece, None)
+
+
+class FakePieceMap:
+    """ Single file torrent of 100 pieces """
+
+    file_size = 100 * PIECE_LENGTH
+
+    def pieces_for(self, start, end):
+        return range(start // PIECE_LENGTH, (end - 1) // PIECE_LENGTH + 1)
+
+
+def make_job(handle):
+    job = DownloadJob(MovieFile(tmdb_id=603, magnet_link="magnet:?xt=urn:btih:0000"))
+    job.handle = handle
+    job.piece_map = FakePieceMap()
+    job.video_duration = 100  # One second per piece
+    job.transcode_job = SimpleNamespace(total_segments=10, prioritize=lambda window: None)
+    return job
+
+
+def test_seek_keeps_head_deadlines():
+    """ Test a seek before the head is on disk leaves the head pieces first in line """
+    handle = FakeHandle()
+    job = make_job(handle)
+
+    assert job.seek(50) == 5
+    assert handle.deadlines[0] == 0
+    assert handle.deadlines[50] == 1000
+    assert handle.deadlines[79] == 3000
+
+
+def test_seek_drops_only_previous_window():
+    """ Test a second seek resets the pieces of the first window but not those of the trailing index """
+    handle = FakeHandle(downloaded=[0])
+    job = make_job(handle)
+    job._index_located = True
+    job._index_range = (98 * PIECE_LENGTH, 100 * PIECE_LENGTH)
+
+    job.seek(50)
+    job.seek(10)
+
+    assert not any(piece in handle.deadlines for piece in range(45, 80))
+    assert handle.deadlines[10] == 1000
+    assert handle.deadlines[98] == 0
+    assert handle.deadlines[99] == 100
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status, started_status", [
+    ("PENDING", "DOWNLOADING"),
+    ("DL_AND_CONVERT", "DL_AND_CONVERT"),
+    ("PLAYABLE", "PLAYABLE"),
+])
+def test_resumed_job_keeps_its_status(monkeypatch, status, started_status):
+    """ Test restarting a title whose conversion began does not take it back to DOWNLOADING """
+    movie_file = MovieFile.objects.create(tmdb_id=603, magnet_link="magnet:?xt=urn:btih:0000", download_status=status)
+    job = DownloadJob(movie_file)
+    monkeypatch.setattr(jobs.storage, "has_cold_files", lambda tmdb_id: False)
+    monkeypatch.setattr(job, "_add_torrent", lambda: None)
+    monkeypatch.setitem(jobs.active_jobs, 603, None)
+
+    job.start()
+
+    movie_file.refresh_from_db()
+    assert movie_file.download_status == started_status
@@ -0,0 +1,95 @@
+from video.pieces import PieceMap, select_files
+
+
+class FakeFiles:
+    def file_offset(self, index):
+        return [0, 250][index]
+
+    def file_size(self, index):
+        return [250, 1000][index]
+
+
+class FakeFileStorage:
+    def __init__(self, files):
+        self.files = files
+
+    def num_files(self):
+        return len(self.files)
+
+    def file_path(self, index):
+        return self.files[index][0]
+
+    def file_size(self, index):
+        return self.files[index][1]
+
+
+class FakeTorrentInfo:
+    def files(self):
+        return FakeFiles()
+
+    def piece_length(self):
+        return 100
+
+    def num_pieces(self):
+        return 13
+
+
+class FakeHandle:
+    def __init__(self, pieces):
+        self.pieces = set(pieces)
+
+    def get_torrent_info(self):
+        return FakeTorrentInfo()
+
+    def have_piece(self, piece):
+        return piece in self.pieces
+
+
+def test_pieces_for_maps_file_bytes_to_torrent_pieces():
+    """ Test byte ranges of a file are shifted by its offset in the torrent """
+    piece_map = PieceMap(FakeHandle([]), 1)
+
+    assert piece_map.pieces_for(0, 1) == range(2, 3)
+    assert piece_map.pieces_for(0, 1000) == range(2, 13)
+    assert piece_map.pieces_for(150, 350) == range(4, 6)
+
+
+def test_have_range_requires_every_piece():
+    """ Test a range is only available when all of its pieces are downloaded """
+    piece_map = PieceMap(FakeHandle([4, 5, 7]), 1)
+
+    assert piece_map.have_range(150, 350)
+    assert not piece_map.have_range(150, 500)
+
+
+def test_downloaded_prefix_stops_at_first_missing_piece():
+    """ Test the contiguous prefix ignores pieces downloaded after a gap """
+    piece_map = PieceMap(FakeHandle([2, 3, 4, 6]), 1)
+
+    assert piece_map.downloaded_prefix() == 250
+
+
+def test_downloaded_prefix_is_capped_at_file_size():
+    """ Test a fully downloaded file reports exactly its size """
+    piece_map = PieceMap(FakeHandle(range(13)), 1)
+
+    assert piece_map.downloaded_prefix() == 1000
+
+
+def test_downloaded_bytes_counts_the_file_part_of_each_piece():
+    """ Test pieces shared with a neighbouring file only count the bytes of this file """
+    assert PieceMap(FakeHandle([2, 3, 4, 6]), 1).downloaded_bytes() == 350
+    assert PieceMap(FakeHandle(range(13)), 1).downloaded_bytes() == 1000
+
+
+def test_select_files_skips_samples_and_extras():
+    """ Test the feature video is selected over larger bundles and samples """
+    files = FakeFileStorage([
+        ("Movie/Movie.iso", 9000),
+        ("Movie/Sample/movie-sample.mkv", 50),
+        ("Movie/Movie.mkv", 4000),
+        ("Movie/Movie.en.srt", 1),
+        ("Movie/Extras/Making of.mp4", 800),
+    ])
+
+    assert select_files(files) == (2, [3])
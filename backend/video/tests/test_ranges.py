@@ -0,0 +1,84 @@
+import pytest
+
+from video.ranges import (
+    RangeNotSatisfiable,
+    if_range_matches,
+    is_not_modified,
+    make_etag,
+    multipart_byteranges,
+    parse_range_header,
+)
+from video.services import VideoService
+
+
+def test_parse_single_and_open_ranges():
+    """ Test explicit and open-ended ranges are clamped to the file """
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=900-5000", 1000) == [(900, 999)]
+
+
+def test_parse_suffix_range():
+    """ Test bytes=-N selects the last N bytes """
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 999)]
+
+
+def test_parse_multiple_ranges_are_merged():
+    """ Test overlapping and adjacent ranges are merged and sorted """
+    assert parse_range_header("bytes=500-599, 0-9, 10-19, 550-700", 1000) == [(0, 19), (500, 700)]
+
+
+def test_unsatisfiable_ranges():
+    """ Test ranges outside the file raise RangeNotSatisfiable """
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-", 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=-0", 1000)
+
+
+def test_malformed_ranges_are_ignored():
+    """ Test invalid headers fall back to the whole file """
+    assert parse_range_header("items=0-10", 1000) is None
+    assert parse_range_header("bytes=10-5", 1000) is None
+    assert parse_range_header("bytes=abc", 1000) is None
+
+
+def test_conditional_headers():
+    """ Test If-None-Match and If-Range against the file validators """
+    etag = make_etag(1000, 1700000000.5)
+    assert is_not_modified({"If-None-Match": f'"other", W/{etag}'}, etag, 1700000000.5)
+    assert not is_not_modified({"If-None-Match": '"other"'}, etag, 1700000000.5)
+    assert if_range_matches({}, etag, 1700000000.5)
+    assert if_range_matches({"If-Range": etag}, etag, 1700000000.5)
+    assert not if_range_matches({"If-Range": '"stale"'}, etag, 1700000000.5)
+
+
+def test_multipart_byteranges(tmp_path):
+    """ Test the multipart body matches its announced length """
+    path = tmp_path / "segment.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+
+    body, length = multipart_byteranges(str(path), [(0, 9), (1000, 1023)], 1024, "video/mp4", "boundary")
+    data = b"".join(body)
+
+    assert len(data) == length
+    assert b"Content-Range: bytes 0-9/1024\r\n\r\n" + bytes(range(10)) + b"\r\n" in data
+    assert data.endswith(b"--boundary--\r\n")
+
+
+def test_rewritten_segment_is_revalidated(settings, tmp_path):
+    """ Test a segment converted again after eviction is not served from a cache holding the old bytes """
+    settings.VIDEO_ACCEL_REDIRECT_PREFIX = ""
+    path = tmp_path / "movie_segment_000.mp4"
+    path.write_bytes(b"\0" * 100)
+    service = VideoService()
+    first = service.stream_video(str(path))
+    assert first["Cache-Control"] == "no-cache"
+
+    path.write_bytes(b"\1" * 120)
+    second = service.stream_video(str(path), request_headers={"If-None-Match": first["ETag"]})
+
+    assert second.status_code == 200
+    assert second["Cache-Control"] == "no-cache"
+    assert second["ETag"] != first["ETag"]
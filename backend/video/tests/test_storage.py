@@ -0,0 +1,35 @@
+import os
+
+from video.storage import TieredStorage
+
+
+def write(path, content=b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def test_path_resolves_to_the_tier_holding_the_file(tmp_path):
+    """ Test relative paths resolve to the hot tier first, then the cold tier """
+    storage = TieredStorage(str(tmp_path / "hot"), str(tmp_path / "cold"))
+    write(str(tmp_path / "cold" / "movies" / "1" / "segment.mp4"))
+
+    assert storage.path("movies/1/segment.mp4") == str(tmp_path / "cold" / "movies" / "1" / "segment.mp4")
+    assert storage.tier(storage.path("movies/1/segment.mp4")) == storage.COLD
+    assert storage.path("movies/1/missing.mp4") == str(tmp_path / "hot" / "movies" / "1" / "missing.mp4")
+
+
+def test_demote_and_promote_move_every_file(tmp_path):
+    """ Test a title moves between tiers without leaving files or directories behind """
+    storage = TieredStorage(str(tmp_path / "hot"), str(tmp_path / "cold"))
+    write(str(tmp_path / "hot" / "movies" / "1" / "hls" / "init.mp4"), b"init")
+    write(str(tmp_path / "hot" / "movies" / "1" / "source.mkv"), b"source")
+
+    assert storage.demote(1) == 10
+    assert not os.path.exists(tmp_path / "hot" / "movies" / "1")
+    assert storage.has_cold_files(1)
+
+    assert storage.promote(1) == 10
+    assert not storage.has_cold_files(1)
+    with open(storage.path("movies/1/hls/init.mp4"), "rb") as f:
+        assert f.read() == b"init"
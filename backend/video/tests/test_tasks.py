@@ -0,0 +1,190 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from hypertube.celery import app
+from movies.models import MovieFile
+from video import tasks
+from video.models import Segment
+
+TMDB_ID = 603
+
+
+class FakeEngine:
+    """ Engine finishing each download attempt at once, with the next of the given statuses """
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.started = []
+
+    def start(self, tmdb_id, prefetch=False):
+        self.started.append((tmdb_id, prefetch))
+        MovieFile.objects.filter(tmdb_id=tmdb_id).update(download_status=self.statuses.pop(0))
+        return {"tmdb_id": tmdb_id}
+
+    def wait(self, tmdb_id, timeout=None):
+        return True
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"imdb_id": "tt0133093"}
+
+
+class NoWorkers:
+    """ Inspect replies of a broker no worker is connected to """
+
+    def active(self):
+        return None
+
+    def reserved(self):
+        return None
+
+
+class FakeChain:
+    """ Records the signatures of the queued pipelines instead of sending them """
+
+    queued = []
+
+    def __init__(self, *signatures):
+        self.signatures = signatures
+
+    def on_error(self, errback):
+        return self
+
+    def apply_async(self):
+        FakeChain.queued.append(self.signatures)
+        return SimpleNamespace(id=f"pipeline-{len(FakeChain.queued)}")
+
+
+def fake_get(failures):
+    """ requests.get failing the first failures calls """
+    calls = []
+
+    def get(url, headers=None, timeout=None):
+        calls.append(url)
+        if len(calls) <= failures:
+            raise requests.ConnectionError("TMDB unreachable")
+        return FakeResponse()
+
+    return get, calls
+
+
+@pytest.fixture
+def eager(settings):
+    """ Tasks run in the calling process, the Celery app reads its configuration from the Django settings """
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+
+
+@pytest.fixture
+def movie_file():
+    return MovieFile.objects.create(tmdb_id=TMDB_ID, magnet_link="magnet:?xt=urn:btih:0000")
+
+
+@pytest.mark.django_db
+def test_pipeline_runs_in_order(eager, monkeypatch, movie_file):
+    """ Test the chain stores the IMDb id, downloads, then drops segments missing on disk """
+    engine = FakeEngine(["READY"])
+    get, calls = fake_get(failures=0)
+    monkeypatch.setattr(tasks, "engine", engine)
+    monkeypatch.setattr(tasks.requests, "get", get)
+    Segment.objects.create(movie_file=movie_file, index=0, path="movies/603/missing.mp4", size=10, start_time=0)
+
+    result = tasks.enqueue_movie(TMDB_ID, prefetch=True)
+
+    assert result.get() == TMDB_ID
+    movie_file.refresh_from_db()
+    assert movie_file.imdb_id == "0133093"
+    assert movie_file.download_status == "READY"
+    assert engine.started == [(TMDB_ID, True)]
+    assert len(calls) == 1
+    assert not movie_file.segments.exists()
+
+
+@pytest.mark.django_db
+def test_pipeline_retries_failed_steps(eager, monkeypatch, movie_file):
+    """ Test a failed metadata fetch and a failed download are retried before the chain continues """
+    engine = FakeEngine(["ERROR", "READY"])
+    get, calls = fake_get(failures=1)
+    monkeypatch.setattr(tasks, "engine", engine)
+    monkeypatch.setattr(tasks.requests, "get", get)
+
+    assert tasks.enqueue_movie(TMDB_ID).get() == TMDB_ID
+
+    movie_file.refresh_from_db()
+    assert len(calls) == 2
+    assert movie_file.imdb_id == "0133093"
+    assert engine.started == [(TMDB_ID, False), (TMDB_ID, False)]
+    assert movie_file.download_status == "READY"
+
+
+@pytest.mark.django_db
+def test_downloads_give_up_after_max_retries(eager, monkeypatch, movie_file):
+    """ Test a title that keeps failing stops after VIDEO_DOWNLOAD_RETRIES instead of looping """
+    engine = FakeEngine(["ERROR"] * (tasks.download_movie.max_retries + 1))
+    monkeypatch.setattr(tasks, "engine", engine)
+    monkeypatch.setattr(tasks.requests, "get", fake_get(failures=0)[0])
+
+    with pytest.raises(RuntimeError):
+        tasks.enqueue_movie(TMDB_ID).get()
+    assert len(engine.started) == tasks.download_movie.max_retries + 1
+    # The error callback clears the pipeline, the title can be started again
+    movie_file.refresh_from_db()
+    assert movie_file.pipeline_task_id is None
+
+
+@pytest.mark.django_db
+def test_title_in_flight_is_not_queued_twice(monkeypatch, movie_file):
+    """ Test a title whose pipeline is queued is not queued again, whatever its status """
+    monkeypatch.setattr(tasks.AsyncResult, "state", property(lambda result: "STARTED"))
+    MovieFile.objects.filter(pk=movie_file.pk).update(pipeline_task_id="queued-task", download_status="ERROR")
+
+    assert tasks.enqueue_movie(TMDB_ID) is None
+
+
+@pytest.mark.django_db
+def test_reset_title_is_queued_again(eager, monkeypatch, movie_file):
+    """ Test a title back to PENDING with no pipeline left (evicted, lost worker) is queued again """
+    engine = FakeEngine(["READY"])
+    monkeypatch.setattr(tasks, "engine", engine)
+    monkeypatch.setattr(tasks.requests, "get", fake_get(failures=0)[0])
+    monkeypatch.setattr(tasks.AsyncResult, "state", property(lambda result: "SUCCESS"))
+    MovieFile.objects.filter(pk=movie_file.pk).update(pipeline_task_id="finished-task", download_status="PENDING")
+
+    assert tasks.enqueue_movie(TMDB_ID).get() == TMDB_ID
+    assert engine.started == [(TMDB_ID, False)]
+    movie_file.refresh_from_db()
+    assert movie_file.pipeline_task_id is None
+
+
+def test_queued_downloads_are_visible(monkeypatch):
+    """ Test downloads waiting in the in-memory broker show up in the queue overview """
+    monkeypatch.setattr(app.control, "inspect", lambda timeout=None: NoWorkers())
+    before = tasks.queue_overview()["waiting"].get("downloads", 0)
+
+    tasks.download_movie.apply_async(args=(TMDB_ID,))
+
+    overview = tasks.queue_overview()
+    assert overview["waiting"]["downloads"] == before + 1
+    assert overview["running"] == overview["reserved"] == []
+
+
+@pytest.mark.django_db
+def test_prefetches_use_their_own_queue(monkeypatch, movie_file):
+    """ Test prefetched downloads go to the prefetch queue, titles a user waits for to the downloads route """
+    monkeypatch.setattr(tasks, "chain", FakeChain)
+    monkeypatch.setattr(FakeChain, "queued", [])
+    other = MovieFile.objects.create(tmdb_id=TMDB_ID + 1, magnet_link="magnet:?xt=urn:btih:0001")
+
+    tasks.enqueue_movie(TMDB_ID, prefetch=True)
+    tasks.enqueue_movie(other.tmdb_id)
+
+    (_, prefetch_download, _), (_, waiting_download, _) = FakeChain.queued
+    assert prefetch_download.options.get("queue") == "prefetch"
+    assert "queue" not in waiting_download.options
+    movie_file.refresh_from_db()
+    assert movie_file.pipeline_task_id == "pipeline-1"
@@ -0,0 +1,63 @@
+import pytest
+
+from video.services import VideoService
+
+
+def make_service(startup_segments=()):
+    service = VideoService()
+    service.startup_segments = list(startup_segments)
+    return service
+
+
+def test_fixed_length_timeline():
+    """ Test segments of the default timeline start every segment_duration seconds """
+    service = make_service()
+
+    assert service.segment_bounds(0) == (0, 10)
+    assert service.segment_bounds(3) == (30, 10)
+    assert service.segment_at(0) == 0
+    assert service.segment_at(9.99) == 0
+    assert service.segment_at(10) == 1
+    assert service.segment_at(-5) == 0
+
+
+def test_startup_timeline():
+    """ Test the leading segments follow the startup profile and the following ones continue after it """
+    service = make_service([2, 4])
+
+    assert [service.segment_bounds(index) for index in range(4)] == [(0, 2), (2, 4), (6, 10), (16, 10)]
+    assert service.segment_at(1.99) == 0
+    assert service.segment_at(2) == 1
+    assert service.segment_at(5.99) == 1
+    assert service.segment_at(6) == 2
+    assert service.segment_at(16) == 3
+
+
+@pytest.mark.parametrize("startup_segments, video_duration, count", [
+    ((), 0, 0),
+    ((), 25, 3),
+    ((), 30, 3),  # No empty segment starting at the very end
+    ((), 30.5, 4),
+    ((2, 4), 1, 1),
+    ((2, 4), 6, 2),
+    ((2, 4), 6.5, 3),
+    ((2, 4), 25, 4),
+])
+def test_segment_count(startup_segments, video_duration, count):
+    """ Test the count covers the whole video, the last segment possibly shorter than nominal """
+    service = make_service(startup_segments)
+
+    assert service.segment_count(video_duration) == count
+    if count:
+        start, duration = service.segment_bounds(count - 1)
+        assert start < video_duration <= start + duration
+
+
+def test_startup_segments_are_reencoded_when_copying(monkeypatch):
+    """ Test copied video is re-encoded for startup segments only, cuts on keyframes would not match the profile """
+    service = make_service([2, 4])
+    monkeypatch.setattr(service, "get_codec_options", lambda input_path: {"vcodec": "copy", "acodec": "copy"})
+
+    assert service.segment_codec_options("movie.mkv", 1)["vcodec"] == "libx264"
+    assert service.segment_codec_options("movie.mkv", 1)["acodec"] == "copy"
+    assert service.segment_codec_options("movie.mkv", 2)["vcodec"] == "copy"
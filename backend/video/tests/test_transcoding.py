@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from video import services, transcoding
+from video.services import VideoService
+from video.transcoding import TranscodeJob, TranscodeScheduler
+
+
+class FakeVideoService:
+    startup_preview = False
+    startup_segments = []
+    max_retries = 3
+    retry_cooldown = 0
+
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.failed_segments = set()
+        self.segment_retry_count = {}
+        self.segment_last_attempt = {}
+        self.converted = []
+
+    def segment_count(self, video_duration):
+        return int(video_duration // 10)
+
+    def get_codec_options(self, input_path):
+        return {"vcodec": "copy"}
+
+    def convert_segment(self, input_path, output_dir, index, video_duration, preview=False):
+        self.converted.append(index)
+        if self.results.get(index, True):
+            return True
+        self.segment_retry_count[index] = self.segment_retry_count.get(index, 0) + 1
+        return False
+
+
+@pytest.fixture(autouse=True)
+def idle_scheduler(monkeypatch):
+    """ Jobs register with a scheduler that has no worker threads, tests run segments themselves """
+    idle = TranscodeScheduler(0)
+    monkeypatch.setattr(transcoding, "scheduler", idle)
+    return idle
+
+
+def make_job(service=None, segments=5, **callbacks):
+    return TranscodeJob(service or FakeVideoService(), "movie.mkv", "/tmp", segments * 10, **callbacks)
+
+
+def test_prioritized_segments_run_first():
+    """ Test segments around a seek position are taken before the rest, in order """
+    job = make_job()
+    job.submit_range(0, 5)
+    job.prioritize([3, 4])
+
+    assert [job.pop_next() for _ in range(5)] == [3, 4, 0, 1, 2]
+    assert job.pop_next() is None
+
+
+def test_scheduler_round_robins_across_jobs(idle_scheduler):
+    """ Test workers alternate between titles instead of draining one first """
+    first, second = make_job(), make_job()
+    first.submit_range(0, 3)
+    second.submit_range(0, 3)
+
+    work = [idle_scheduler._next_work() for _ in range(4)]
+    assert [(job is first, index) for job, index in work] == [(False, 0), (True, 0), (False, 1), (True, 1)]
+
+
+def test_segments_are_published_in_order():
+    """ Test a segment finishing early is only published once the ones before it are done """
+    ready = []
+    job = make_job(segments=3, on_ready=ready.append)
+    job.submit_range(0, 3)
+    for index in (2, 0, 1):
+        job._running.add(index)
+
+    job.run_segment(2)
+    assert ready == []
+    job.run_segment(0)
+    assert ready == [0]
+    job.run_segment(1)
+    assert ready == [0, 1, 2]
+    assert job.is_complete()
+
+
+def test_invalid_output_is_retried_then_skipped():
+    """ Test a segment that keeps failing is skipped after max_retries instead of looping forever """
+    service = FakeVideoService(results={1: False})
+    ready, completed = [], []
+    job = make_job(service, segments=2, on_ready=ready.append, on_complete=lambda: completed.append(True))
+    job.submit_range(0, 2)
+
+    while (index := job.pop_next()) is not None:
+        job.run_segment(index)
+
+    assert service.converted.count(1) == service.max_retries
+    assert service.failed_segments == {1}
+    assert ready == [0]
+    assert completed == [True]
+
+
+class FakeFfmpegStream:
+    """ ffmpeg-python stream writing the given bytes to its output instead of running ffmpeg """
+
+    def __init__(self, output):
+        self.output_bytes = output
+        self.path = None
+
+    def output(self, path, **options):
+        self.path = path
+        return self
+
+    def overwrite_output(self):
+        return self
+
+    def run(self, capture_stdout=False, capture_stderr=False):
+        with open(self.path, "wb") as output:
+            output.write(self.output_bytes)
+
+
+def test_invalid_segment_output_counts_as_attempt(monkeypatch, tmp_path):
+    """ Test the real convert_segment counts an unreadable output as a failed attempt and keeps no file """
+    service = VideoService()
+    monkeypatch.setattr(service, "get_codec_options", lambda input_path: {"vcodec": "copy", "acodec": "copy"})
+    monkeypatch.setattr(service, "probe", lambda path: None)
+    monkeypatch.setattr(services.ffmpeg, "input", lambda path, **options: FakeFfmpegStream(b"not an mp4 file"))
+    input_path = str(tmp_path / "movie.mkv")
+
+    for attempt in range(1, service.max_retries + 1):
+        assert service.convert_segment(input_path, str(tmp_path), 0, 60) is False
+        assert service.segment_retry_count[0] == attempt
+
+    segment_path = service.get_segment_path(input_path, str(tmp_path), 0)
+    assert not os.path.exists(segment_path)
+    assert not os.path.exists(f"{segment_path}.part")
+    assert 0 not in service.processed_segments
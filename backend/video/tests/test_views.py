@@ -0,0 +1,20 @@
+import pytest
+
+from movies.models import MovieFile
+from video import views
+from video.models import ProbeResult
+from video.storage import storage
+
+
+@pytest.mark.django_db
+def test_source_duration_of_growing_file_is_not_probed_again(monkeypatch, tmp_path):
+    """ Test the stored duration is used while the source keeps growing, without running ffprobe """
+    monkeypatch.setattr(storage, "hot_root", str(tmp_path))
+    source = tmp_path / "movies" / "603" / "movie.mkv"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"\0" * 1000)
+    ProbeResult.objects.create(path=str(source), size=10, mtime=0, duration=5400.0)
+    monkeypatch.setattr(views.metadata_service, "probe", lambda path: pytest.fail("ffprobe ran again"))
+    movie_file = MovieFile(tmdb_id=603, magnet_link="magnet:", source_path="movies/603/movie.mkv")
+
+    assert views.source_duration(movie_file) == 5400.0
@@ -0,0 +1,224 @@
+import logging
+import os
+import threading
+import time
+
+import libtorrent as lt
+from django.conf import settings
+
+
+class TorrentSessionManager:
+    """Owns the libtorrent session and routes its alerts to per-title jobs.
+
+    A single dispatcher thread waits on the session's alert queue, so the
+    number of threads does not grow with the number of active downloads.
+    The session is created on first use, only in the process running the jobs
+    (the torrent daemon when one is configured).
+
+    Resume data (including the torrent metadata) and the session state (DHT
+    routing table, settings) are saved to TORRENT_STATE_DIR, so a restarted
+    process continues torrents without fetching metadata or rechecking pieces.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    STATE_UPDATE_INTERVAL = 1  # seconds between state_update alerts
+    STATE_SAVE_INTERVAL = 60  # seconds between resume data / session state saves
+    SESSION_STATE_NAME = "session.state"
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(TorrentSessionManager, cls).__new__(cls)
+                cls._instance._initialize()
+            return cls._instance
+
+    def _initialize(self):
+        self.state_dir = settings.TORRENT_STATE_DIR
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.session = self._create_session()
+        self.session.apply_settings({
+            "alert_mask": (
+                lt.alert.category_t.status_notification
+                | lt.alert.category_t.error_notification
+                | lt.alert.category_t.storage_notification
+                | lt.alert.category_t.piece_progress_notification
+            ),
+            # Bandwidth budget shared by all torrents, bytes/s (0: unlimited)
+            "download_rate_limit": settings.TORRENT_DOWNLOAD_RATE_LIMIT,
+            "upload_rate_limit": settings.TORRENT_UPLOAD_RATE_LIMIT,
+            # Admission already caps the running downloads, keep the session queue out of the way
+            "active_downloads": -1,
+        })
+        self.session.listen_on(6881, 6891)
+        self.handles = {}
+        self.jobs = {}
+        self._pending_resume_saves = 0
+        self._dispatch_thread = threading.Thread(target=self._dispatch_loop, name="torrent-alerts", daemon=True)
+        self._dispatch_thread.start()
+
+    def _create_session(self):
+        """Session restored from the saved state of a previous run, if any."""
+        state_path = os.path.join(self.state_dir, self.SESSION_STATE_NAME)
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, "rb") as state_file:
+                    return lt.session(lt.read_session_params(state_file.read()))
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable session state {state_path}: {e}")
+        return lt.session()
+
+    def _dispatch_loop(self):
+        last_update = 0
+        last_save = time.time()
+        while True:
+            try:
+                now = time.time()
+                if now - last_update >= self.STATE_UPDATE_INTERVAL:
+                    self.session.post_torrent_updates()
+                    last_update = now
+                if now - last_save >= self.STATE_SAVE_INTERVAL:
+                    self.save_state()
+                    last_save = now
+
+                self.session.wait_for_alert(int(self.STATE_UPDATE_INTERVAL * 1000))
+                for alert in self.session.pop_alerts():
+                    try:
+                        self._dispatch(alert)
+                    except Exception as e:
+                        logging.error(f"Error handling {alert.what()} alert: {str(e)}")
+            except Exception as e:
+                logging.error(f"Error in torrent alert loop: {str(e)}")
+                time.sleep(1)
+
+    def _dispatch(self, alert):
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                job = self._job_for(status.handle)
+                if job:
+                    job.on_state_update(status)
+                # Finished: every wanted file is complete, skipped files are never downloaded
+                if status.is_finished and self._seeding_done(status):
+                    self.remove_torrent(self._handle_id_for(status.handle))
+                    if job:
+                        job.on_seeding_done()
+            return
+
+        if isinstance(alert, lt.save_resume_data_alert):
+            self._pending_resume_saves -= 1
+            with self._lock:
+                # Torrents removed since the request have no resume file to write, nor a valid handle
+                handle_id = self._handle_id_for(alert.handle)
+                if handle_id in self.handles:
+                    self._write_state(self._resume_path(handle_id), lt.write_resume_data_buf(alert.params))
+            return
+        if isinstance(alert, lt.save_resume_data_failed_alert):
+            logging.warning(f"Could not save resume data: {alert.message()}")
+            self._pending_resume_saves -= 1
+            return
+        if isinstance(alert, (lt.metadata_received_alert, lt.torrent_finished_alert)):
+            # Keep the metadata and the completed state across restarts right away
+            self._request_resume_data(alert.handle)
+
+        job = self._job_for(getattr(alert, "handle", None))
+        if job is None:
+            return
+
+        if isinstance(alert, lt.metadata_received_alert):
+            job.on_metadata()
+        elif isinstance(alert, lt.piece_finished_alert):
+            job.on_piece_finished(alert.piece_index)
+        elif isinstance(alert, lt.torrent_finished_alert):
+            job.on_finished()
+        elif isinstance(alert, lt.torrent_error_alert):
+            job.on_error(alert.message())
+
+    @staticmethod
+    def _seeding_done(status) -> bool:
+        """Seeding policy: seed until the share ratio or the seeding time is reached, whichever comes first."""
+        ratio = status.all_time_upload / max(status.total_wanted, 1)
+        if settings.TORRENT_SEED_RATIO and ratio >= settings.TORRENT_SEED_RATIO:
+            return True
+        return status.finished_time >= settings.TORRENT_SEED_MINUTES * 60
+
+    def _handle_id_for(self, handle):
+        if handle is None or not handle.is_valid():
+            return None
+        return str(handle.info_hash())
+
+    def _job_for(self, handle):
+        return self.jobs.get(self._handle_id_for(handle))
+
+    def add_torrent(self, magnet_link, save_path, job=None):
+        params = lt.parse_magnet_uri(magnet_link)
+        handle_id = str(params.info_hashes.v1)
+
+        resume_path = self._resume_path(handle_id)
+        if os.path.exists(resume_path):
+            try:
+                with open(resume_path, "rb") as resume_file:
+                    params = lt.read_resume_data(resume_file.read())
+                logging.info(f"Resuming torrent {handle_id} from saved resume data")
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable resume data {resume_path}: {e}")
+        params.save_path = save_path
+
+        with self._lock:
+            handle = self.handles.get(handle_id)
+            if handle is None or not handle.is_valid():
+                handle = self.session.add_torrent(params)
+                handle.set_download_limit(settings.TORRENT_PER_TORRENT_DOWNLOAD_LIMIT)
+                handle.set_upload_limit(settings.TORRENT_PER_TORRENT_UPLOAD_LIMIT)
+                handle_id = str(handle.info_hash())
+                self.handles[handle_id] = handle
+            if job is not None:
+                self.jobs[handle_id] = job
+            return handle_id
+
+    def get_handle(self, handle_id):
+        return self.handles.get(handle_id)
+
+    def remove_torrent(self, handle_id):
+        if handle_id is None:
+            return
+        with self._lock:
+            handle = self.handles.pop(handle_id, None)
+            if handle is not None and handle.is_valid():
+                self.session.remove_torrent(handle)
+            self.jobs.pop(handle_id, None)
+            # Not resumed by the next run, whether or not this process still knew the handle
+            if os.path.exists(self._resume_path(handle_id)):
+                os.remove(self._resume_path(handle_id))
+
+    def _resume_path(self, handle_id) -> str:
+        return os.path.join(self.state_dir, f"{handle_id}.resume")
+
+    def _request_resume_data(self, handle):
+        if handle is not None and handle.is_valid() and handle.status().has_metadata:
+            handle.save_resume_data(lt.torrent_handle.save_info_dict)
+            self._pending_resume_saves += 1
+
+    def _write_state(self, path: str, data: bytes):
+        with open(f"{path}.tmp", "wb") as state_file:
+            state_file.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def save_state(self, all_torrents: bool = False):
+        """Request resume data of changed torrents and write the session state."""
+        for handle in list(self.handles.values()):
+            if handle.is_valid() and (all_torrents or handle.need_save_resume_data()):
+                self._request_resume_data(handle)
+        self._write_state(
+            os.path.join(self.state_dir, self.SESSION_STATE_NAME),
+            lt.write_session_params_buf(self.session.session_state()),
+        )
+
+    def shutdown(self, timeout: float = 10):
+        """Save everything before the process exits, the dispatcher thread writes the resume files."""
+        self.save_state(all_torrents=True)
+        deadline = time.time() + timeout
+        while self._pending_resume_saves > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        self.session.pause()
+
@@ -0,0 +1,259 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+
+
+class TranscodeJob:
+    """Segment conversions of one title, executed by the shared TranscodeScheduler.
+
+    Segments may finish in any order (``on_converted``), but they are published
+    (``on_ready``) strictly in playback order. With the startup preview enabled,
+    the leading segments are first published at low resolution and converted
+    again at full quality once nothing more urgent is queued.
+    """
+
+    def __init__(self, video_service, input_path: str, output_dir: str, video_duration: float,
+                 on_ready: Optional[Callable[[int], None]] = None, on_complete: Optional[Callable[[], None]] = None,
+                 on_converted: Optional[Callable[[int], None]] = None):
+        self.video_service = video_service
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.video_duration = video_duration
+        self.on_ready = on_ready
+        self.on_complete = on_complete
+        self.on_converted = on_converted
+        self.total_segments = video_service.segment_count(video_duration)
+        self._preview_candidates = set()
+        if video_service.startup_preview and video_service.get_codec_options(input_path).get("vcodec") != "copy":
+            self._preview_candidates = set(range(min(len(video_service.startup_segments), self.total_segments)))
+        self.previews = set()  # Published segments still at preview quality
+        self.published = 0  # Segments [0, published) are done (converted or skipped)
+        self._pending = []  # Heap of (priority, index), urgent segments first
+        self._urgent = set()
+        self._queued = set()
+        self._running = set()
+        self._done = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._started_at = None
+        self._converted = 0
+
+    def submit(self, index: int):
+        """Queue a segment for conversion, ignoring segments already queued or done."""
+        if index >= self.total_segments:
+            return
+        with self._lock:
+            if index in self._queued or index in self._running or index in self._done:
+                return
+            if self._started_at is None:
+                self._started_at = time.time()
+            heapq.heappush(self._pending, self._entry(index))
+            self._queued.add(index)
+        scheduler.notify(self)
+
+    def _entry(self, index: int):
+        if index in self._done:
+            return (2, index)  # Full-quality replacement of a preview
+        return (0 if index in self._urgent else 1, index)
+
+    def prioritize(self, indices):
+        """Convert these segments (e.g. around a seek position) before any other queued segment."""
+        with self._lock:
+            self._urgent = set(indices)
+            self._pending = [self._entry(index) for _, index in self._pending]
+            heapq.heapify(self._pending)
+
+    def mark_done(self, indices):
+        """Treat segments converted by a previous run as done, without publishing them again."""
+        with self._lock:
+            self._done.update(index for index in indices if index < self.total_segments)
+            while self.published in self._done:
+                self.published += 1
+
+    def is_preview(self, index: int) -> bool:
+        with self._lock:
+            return index in self.previews
+
+    def is_done(self, index: int) -> bool:
+        with self._lock:
+            return index in self._done and index not in self.video_service.failed_segments
+
+    def submit_range(self, start: int, end: int):
+        for index in range(start, min(end, self.total_segments)):
+            self.submit(index)
+
+    def pop_next(self) -> Optional[int]:
+        """Take the earliest queued segment whose retry cooldown has passed."""
+        service = self.video_service
+        now = time.time()
+        with self._lock:
+            deferred = []
+            index = None
+            while self._pending:
+                _, candidate = heapq.heappop(self._pending)
+                retries = service.segment_retry_count.get(candidate, 0)
+                last_attempt = service.segment_last_attempt.get(candidate, 0)
+                if retries == 0 or now - last_attempt >= service.retry_cooldown:
+                    index = candidate
+                    break
+                deferred.append(candidate)
+            for candidate in deferred:
+                heapq.heappush(self._pending, self._entry(candidate))
+            if index is not None:
+                self._queued.discard(index)
+                self._running.add(index)
+            return index
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def run_segment(self, index: int):
+        service = self.video_service
+        with self._lock:
+            upgrade = index in self._done
+        if upgrade:
+            self._upgrade_segment(index)
+            return
+
+        preview = index in self._preview_candidates
+        success = False
+        try:
+            success = service.convert_segment(self.input_path, self.output_dir, index, self.video_duration, preview=preview)
+            if success and preview:
+                with self._lock:
+                    self.previews.add(index)
+            if success and self.on_converted:
+                self.on_converted(index)
+        except Exception as e:
+            logging.error(f"Error converting segment {index}: {e}")
+            service.segment_retry_count[index] = service.segment_retry_count.get(index, 0) + 1
+
+        with self._lock:
+            self._running.discard(index)
+            if success:
+                self._converted += 1
+                self._done.add(index)
+                if preview:
+                    heapq.heappush(self._pending, self._entry(index))
+                    self._queued.add(index)
+            elif service.segment_retry_count.get(index, 0) >= service.max_retries:
+                service.failed_segments.add(index)
+                logging.error(f"⚠ Skipping segment {index} after {service.max_retries} failed attempts")
+                self._done.add(index)
+            else:
+                heapq.heappush(self._pending, self._entry(index))
+                self._queued.add(index)
+
+            ready = []
+            published_before = self.published
+            while self.published in self._done:
+                if self.published not in service.failed_segments:
+                    ready.append(self.published)
+                self.published += 1
+            complete = published_before < self.published >= self.total_segments
+            if self.published >= self.total_segments:
+                self._log_throughput()
+            self._finished.notify_all()
+
+        if preview or (not success and index not in self._done):
+            scheduler.notify(self)
+        for segment in ready:
+            if self.on_ready:
+                self.on_ready(segment)
+        if complete and self.on_complete:
+            self.on_complete()
+
+    def _upgrade_segment(self, index: int):
+        """Replace a preview segment with its full-quality conversion, keeping the preview if that fails."""
+        try:
+            if self.video_service.convert_segment(self.input_path, self.output_dir, index, self.video_duration):
+                with self._lock:
+                    self.previews.discard(index)
+                if self.on_converted:
+                    self.on_converted(index)
+                logging.info(f"Replaced preview of segment {index} with full quality")
+        except Exception as e:
+            logging.error(f"Error upgrading segment {index}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(index)
+
+    def is_complete(self) -> bool:
+        return self.published >= self.total_segments
+
+    def throughput(self) -> float:
+        """Converted segments per second of wall time since the first submission."""
+        if not self._started_at:
+            return 0.0
+        elapsed = time.time() - self._started_at
+        return self._converted / elapsed if elapsed > 0 else 0.0
+
+    def _log_throughput(self):
+        elapsed = time.time() - (self._started_at or time.time())
+        logging.info(
+            f"Transcoded {self._converted}/{self.total_segments} segments of {self.input_path} "
+            f"in {elapsed:.1f}s ({self.throughput():.2f} segments/s)"
+        )
+
+    def wait(self):
+        """Block until every segment has been converted or skipped."""
+        with self._finished:
+            while self.published < self.total_segments:
+                self._finished.wait(timeout=5)
+
+
+class TranscodeScheduler:
+    """Bounded pool of ffmpeg workers shared by all titles.
+
+    Workers pick jobs round-robin so one long title cannot starve the others.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._jobs = []
+        self._cursor = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"transcode-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self, job: TranscodeJob):
+        with self._condition:
+            self._ensure_started()
+            if job not in self._jobs:
+                self._jobs.append(job)
+            self._condition.notify()
+
+    def _next_work(self):
+        for _ in range(len(self._jobs)):
+            self._cursor = (self._cursor + 1) % len(self._jobs)
+            job = self._jobs[self._cursor]
+            index = job.pop_next()
+            if index is not None:
+                return job, index
+        # Forget jobs with nothing left to run, they re-register on submit
+        self._jobs = [job for job in self._jobs if job.has_pending()]
+        return None, None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job, index = self._next_work()
+                while job is None:
+                    # Wake up periodically so retry cooldowns can expire
+                    self._condition.wait(timeout=1)
+                    job, index = self._next_work()
+            job.run_segment(index)
+
+
+scheduler = TranscodeScheduler(settings.VIDEO_TRANSCODE_WORKERS)
@@ -1,247 +1,107 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from movies.models import MovieFile
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from .fmp4 import fragment_index
+from .hls import HlsPackager
+from .engine import EngineUnavailable, engine
+from .models import ProbeResult, Segment
+from .progress import progress_store
 from .services import VideoService
-import re
+from .storage import storage
+from .tasks import enqueue_movie, queue_overview
 import os
-import threading
-import libtorrent as lt
+import json
 import logging
+import threading
 import time
 
-range_re = re.compile(r"bytes\s*=\s*(\d+)\s*-\s*(\d*)", re.I)
-
 logger = logging.getLogger(__name__)
 
 
-class TorrentSessionManager:
-    _instance = None
-    _lock = threading.Lock()
+# Shared service for read-only metadata lookups from request handlers
+metadata_service = VideoService()
 
-    def __new__(cls):
-        with cls._lock:
-            if cls._instance is None:
-                cls._instance = super(TorrentSessionManager, cls).__new__(cls)
-                cls._instance._initialize()
-            return cls._instance
+# Each open event stream holds a server thread; past this many, clients poll file-status instead
+event_streams = threading.BoundedSemaphore(settings.VIDEO_EVENTS_MAX_STREAMS)
 
-    def _initialize(self):
-        self.session = lt.session()
-        self.session.listen_on(6881, 6891)
-        self.handles = {}
-        self.handle_locks = {}
-        self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
-        self._cleanup_thread.start()
 
-    def _cleanup_loop(self):
-        while True:
-            try:
-                with self._lock:
-                    for handle_id, handle in list(self.handles.items()):
-                        if handle.is_valid() and handle.status().is_seeding:
-                            if handle.status().active_time > 3600:
-                                self.remove_torrent(handle_id)
-            except Exception as e:
-                logging.error(f"Error in cleanup loop: {str(e)}")
-            time.sleep(300)
-
-    def add_torrent(self, magnet_link, save_path):
-        params = lt.parse_magnet_uri(magnet_link)
-        params.save_path = save_path
-
-        with self._lock:
-            handle = self.session.add_torrent(params)
-            handle_id = str(hash(magnet_link))
-            self.handles[handle_id] = handle
-            self.handle_locks[handle_id] = threading.Lock()
-            return handle_id
-
-    def get_handle(self, handle_id):
-        return self.handles.get(handle_id)
-
-    def get_handle_lock(self, handle_id):
-        return self.handle_locks.get(handle_id)
-
-    def remove_torrent(self, handle_id):
-        with self._lock:
-            if handle_id in self.handles:
-                handle = self.handles[handle_id]
-                if handle.is_valid():
-                    self.session.remove_torrent(handle)
-                del self.handles[handle_id]
-                del self.handle_locks[handle_id]
-
-
-torrent_manager = TorrentSessionManager()
-
-
-def process_video_thread(video_id):
-    try:
-        movie_file = MovieFile.objects.get(id=video_id)
-        movie_file.download_status = "DOWNLOADING"
-        movie_file.save()
-
-        # Create standardized movie directory
-        downloads_dir = "/app/downloads"
-        movie_dir = os.path.join(downloads_dir, "movies", str(movie_file.tmdb_id))
-        os.makedirs(movie_dir, exist_ok=True)
-        logging.info(f"Using movie directory: {movie_dir}")
-
-        handle_id = torrent_manager.add_torrent(movie_file.magnet_link, movie_dir)
-        handle = torrent_manager.get_handle(handle_id)
-        handle_lock = torrent_manager.get_handle_lock(handle_id)
-
-        if not handle:
-            logging.error(f"Failed to get torrent handle for movie {video_id}")
-            movie_file.download_status = "ERROR"
-            movie_file.save()
-            return
-
-        with handle_lock:
-            handle.set_sequential_download(True)
-            while not handle.has_metadata():
-                time.sleep(1)
-
-            torrent_info = handle.get_torrent_info()
-            largest_file = max(torrent_info.files(), key=lambda f: f.size)
-            file_path_in_torrent = largest_file.path
-            downloaded_path = os.path.join(movie_dir, file_path_in_torrent)
-            
-            # Store the full relative path including any subdirectories
-            movie_file.file_path = os.path.join("movies", str(movie_file.tmdb_id), file_path_in_torrent)
-            movie_file.save()
-
-            # Ensure the full directory structure exists
-            os.makedirs(os.path.dirname(downloaded_path), exist_ok=True)
-
-            video_service = VideoService()
-            conversion_started = False
-            current_segment = 0
-            video_duration = None
-            first_segment_ready = False
-            last_attempt_time = 0
-
-            while True:
-                status = handle.status()
-                progress = status.progress * 100
-                movie_file.download_progress = progress
-                
-                # Try to start segmentation as soon as possible
-                if not conversion_started and os.path.exists(downloaded_path):
-                    current_time = time.time()
-                    if current_time - last_attempt_time > 2:
-                        last_attempt_time = current_time
-                        try:
-                            video_duration = video_service.get_video_duration(downloaded_path)
-                            if video_duration:
-                                conversion_started = True
-                                movie_file.download_status = "DL_AND_CONVERT"
-                                movie_file.save()
-                                logging.info(f"Starting segmentation at {progress:.2f}% for {file_path_in_torrent}")
-                        except Exception as e:
-                            logging.debug(f"File not ready yet: {e}")
-
-                if conversion_started and video_duration:
-                    segment_start_time = current_segment * video_service.segment_duration
-                    required_progress = (segment_start_time + video_service.segment_duration) / video_duration * 100
-                    required_progress = min(required_progress + 5, 100)  # Small buffer for safety
-
-                    if progress >= required_progress:
-                        try:
-                            if current_segment not in video_service.processed_segments:
-                                success = video_service.convert_segment(
-                                    downloaded_path,
-                                    movie_dir,
-                                    current_segment,
-                                    video_duration
-                                )
-                                if success:
-                                    current_segment += 1
-                                    if current_segment == 1:
-                                        # Get the directory structure from the original file path
-                                        rel_path = os.path.relpath(downloaded_path, movie_dir)
-                                        dir_path = os.path.dirname(rel_path)
-                                        base_name = os.path.splitext(os.path.basename(rel_path))[0]
-                                        
-                                        # Create segment path preserving directory structure
-                                        first_segment = f"{base_name}_segment_000.mp4"
-                                        if dir_path:
-                                            first_segment = os.path.join(dir_path, first_segment)
-                                        
-                                        movie_file.file_path = os.path.join("movies", str(movie_file.tmdb_id), first_segment)
-                                        movie_file.download_status = "PLAYABLE"
-                                        first_segment_ready = True
-                                        movie_file.save()
-                                        logging.info("First segment ready, movie is now playable")
-                        except Exception as e:
-                            logging.error(f"Error converting segment {current_segment}: {e}")
-                            if video_service.segment_retry_count.get(current_segment, 0) >= video_service.max_retries:
-                                current_segment += 1
-
-                movie_file.save()
-                logging.info(f"Download progress: {progress:.2f}%")
-
-                if status.is_seeding:
-                    break
-
-                time.sleep(1)
-
-            # Process remaining segments after download is complete
-            if video_duration:
-                remaining_segments = int(video_duration / video_service.segment_duration) + 1
-                while current_segment < remaining_segments:
-                    try:
-                        if current_segment not in video_service.processed_segments:
-                            success = video_service.convert_segment(
-                                downloaded_path,
-                                movie_dir,
-                                current_segment,
-                                video_duration
-                            )
-                            if success:
-                                current_segment += 1
-                            elif video_service.segment_retry_count.get(current_segment, 0) >= video_service.max_retries:
-                                current_segment += 1
-                    except Exception as e:
-                        logging.error(f"Error converting final segments: {e}")
-                        if video_service.segment_retry_count.get(current_segment, 0) >= video_service.max_retries:
-                            current_segment += 1
-                    time.sleep(1)
-
-            if not video_service.failed_segments:
-                movie_file.download_status = "READY"
-            else:
-                if not first_segment_ready:
-                    movie_file.download_status = "ERROR"
-                logging.error(f"Failed segments: {sorted(list(video_service.failed_segments))}")
-            movie_file.save()
+class EventStreamRenderer(BaseRenderer):
+    """Lets EventSource clients (Accept: text/event-stream) pass content negotiation."""
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only error payloads get here, the event stream itself bypasses renderers
+        return json.dumps(data).encode()
+
 
-    except Exception as e:
-        logging.error(f"Error processing video {video_id}: {str(e)}")
-        movie_file.download_status = "ERROR"
-        movie_file.save()
+def live_movie_file(tmdb_id):
+    """MovieFile carrying the live status of a title, read from the progress store while it is processed."""
+    live = progress_store.get(tmdb_id)
+    if live:
+        # Read-only instance, no database query needed
+        return MovieFile(tmdb_id=tmdb_id, **live)
+    return MovieFile.objects.get(tmdb_id=tmdb_id)
+
+
+def source_duration(movie_file):
+    """Duration of the downloaded original, from the probe cache.
+
+    The duration of a file does not change while it downloads, so a stored probe is used
+    even if the file grew since; ffprobe only runs while no duration is known yet. The
+    probe of a released original is kept as well.
+    """
+    if not movie_file.source_path:
+        return None
+    source_path = storage.path(movie_file.source_path)
+    cached = ProbeResult.objects.filter(path=source_path).first()
+    if cached and cached.duration:
+        return cached.duration
+    if not os.path.exists(source_path):
+        return None
+    return metadata_service.get_video_duration(source_path)
+
+
+def missing_segments(indexes, total_duration, complete):
+    """Segment numbers absent from the manifest, up to the last expected segment once conversion is complete."""
+    if complete and total_duration:
+        expected = metadata_service.segment_count(total_duration)
+    else:
+        expected = max(indexes) + 1 if indexes else 0
+    return sorted(set(range(expected)) - set(indexes))
 
 
 class VideoViewSet(viewsets.ViewSet):
     """
     ViewSet for video operations.
     POST /video/:id/start - Start movie download and processing
+    GET /video/queue - Queued and running processing work
     GET /video/:id/status - Get movie streaming status
-    GET /video/:id/stream - Stream movie content
+    POST /video/:id/seek - Prioritize the segments after a playback position
+    GET /video/:id/events - Server-sent status, progress and segment events
+    GET /video/:id/stream - Stream movie content (?segment=N&start=seconds into the segment)
+    GET /video/:id/hls/:name - Serve HLS playlists and segments (master.m3u8, <height>p/... renditions)
     """
 
     permission_classes = [permissions.AllowAny]
 
+    RENDITION_RETRY_AFTER = 2  # Seconds a client waits before asking again for a rendition being packaged
+
     @action(detail=True, methods=["post"], url_path="start")
     def start_stream(self, request, pk=None):
         """Start movie download and processing"""
         magnet_link = request.data.get("magnet_link")
+        prefetch = bool(request.data.get("prefetch", False))
         if not magnet_link:
             return Response({"error": "Magnet link is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Create or get existing movie file
-        movie_file, created = MovieFile.objects.get_or_create(
+        movie_file, _ = MovieFile.objects.get_or_create(
             tmdb_id=pk, defaults={"magnet_link": magnet_link, "download_status": "PENDING", "download_progress": 0}
         )
 
@@ -249,18 +109,75 @@ class VideoViewSet(viewsets.ViewSet):
         if movie_file.download_status in ["DOWNLOADING", "CONVERTING", "READY"]:
             return Response({"status": movie_file.download_status, "progress": movie_file.download_progress})
 
-        # Start processing in background thread
-        thread = threading.Thread(target=process_video_thread, args=(movie_file.id,))
-        thread.daemon = True
-        thread.start()
+        if settings.VIDEO_PIPELINE == "celery":
+            try:
+                result = enqueue_movie(movie_file.tmdb_id, prefetch=prefetch)
+            except Exception as e:
+                logger.error(f"Could not queue movie {movie_file.tmdb_id}: {e}")
+                return Response({"error": "Task queue unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            if result is None:
+                response_data = {"status": movie_file.download_status, "message": "Movie is queued for processing"}
+            else:
+                response_data = {"status": "PENDING", "message": "Queued movie processing", "task_id": result.id}
+            if settings.TORRENT_DAEMON_URL:
+                # Admitted right away: the daemon orders downloads (waiting titles before prefetches)
+                # whatever order workers pick the tasks in, and download_movie then joins the job
+                try:
+                    state = engine.start(movie_file.tmdb_id, prefetch=prefetch) or {}
+                except EngineUnavailable as e:
+                    logger.error(str(e))
+                    state = {}
+                response_data["queue_position"] = state.get("queue_position")
+            return Response(response_data)
+
+        # Add the torrent once admitted, the rest of the pipeline is driven by torrent alerts
+        try:
+            state = engine.start(movie_file.tmdb_id, prefetch=prefetch) or {}
+        except EngineUnavailable as e:
+            logger.error(str(e))
+            return Response({"error": "Torrent engine unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if state.get("queue_position"):
+            return Response(
+                {"status": "PENDING", "message": "Movie is queued for download", "queue_position": state["queue_position"]}
+            )
+        return Response({"status": "PENDING", "message": "Started movie processing", "queue_position": 0})
+
+    @action(detail=False, methods=["get"], url_path="queue")
+    def queue(self, request):
+        """Queued and running processing work"""
+        if settings.VIDEO_PIPELINE == "celery":
+            return Response(queue_overview())
+        try:
+            running = engine.jobs()
+        except EngineUnavailable as e:
+            logger.error(str(e))
+            running = []
+        return Response({"waiting": {}, "reserved": [], "running": running})
+
+    @action(detail=True, methods=["post"], url_path="seek")
+    def seek(self, request, pk=None):
+        """Prioritize downloading and transcoding the segments after a playback position"""
+        try:
+            position = float(request.data.get("position", 0))
+        except (TypeError, ValueError):
+            return Response({"error": "Position must be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"status": "PENDING", "message": "Started movie processing"})
+        try:
+            result = engine.seek(pk, position)
+        except EngineUnavailable as e:
+            logger.error(str(e))
+            return Response({"error": "Torrent engine unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if result is None:
+            # Nothing is downloading, every segment that will exist already does
+            return Response({"segment": metadata_service.segment_at(position), "ready": True})
+        return Response(result)
 
     @action(detail=True, methods=["get"], url_path="status")
     def status(self, request, pk=None):
         """Get movie streaming status"""
         try:
-            movie_file = MovieFile.objects.get(tmdb_id=pk)
+            movie_file = live_movie_file(pk)
             
             response_data = {
                 "status": movie_file.download_status,
@@ -273,41 +190,25 @@ class VideoViewSet(viewsets.ViewSet):
             # If movie is playable or ready, add segment information and total duration
             if movie_file.download_status in ["READY", "PLAYABLE"]:
                 try:
-                    # Get the full path from the stored file path
-                    file_path = os.path.join("/app/downloads", movie_file.file_path)
-                    dir_path = os.path.dirname(file_path)
-                    base_name = os.path.splitext(os.path.basename(file_path))[0]
-                    
-                    # Remove _segment_000 suffix if it exists
-                    if base_name.endswith("_segment_000"):
-                        base_name = base_name[:-12]
-                    
-                    # Get total movie duration from original file
-                    original_file_path = None
-                    for ext in ['.mkv', '.mp4', '.avi']:
-                        test_path = os.path.join(dir_path, f"{base_name}{ext}")
-                        if os.path.exists(test_path):
-                            original_file_path = test_path
-                            break
-                    
-                    total_duration = None
-                    if original_file_path:
-                        video_service = VideoService()
-                        total_duration = video_service.get_video_duration(original_file_path)
-                    
-                    # Count available segments
-                    available_segments = 0
-                    while True:
-                        segment_filename = f"{base_name}_segment_{available_segments:03d}.mp4"
-                        segment_path = os.path.join(dir_path, segment_filename)
-                        if os.path.exists(segment_path):
-                            available_segments += 1
-                        else:
-                            break
+                    total_duration = source_duration(movie_file)
+
+                    if movie_file.file_path.endswith(".m3u8"):
+                        response_data["packaging"] = "hls"
+                        playlist_path = storage.path(movie_file.file_path)
+                        available_segments = HlsPackager.count_segments(playlist_path)
+                        if os.path.exists(os.path.join(os.path.dirname(playlist_path), HlsPackager.MASTER_NAME)):
+                            response_data["master_playlist"] = HlsPackager.MASTER_NAME
+                    else:
+                        indexes = list(Segment.objects.filter(movie_file__tmdb_id=pk).values_list("index", flat=True))
+                        available_segments = len(indexes)
+                        response_data["missing_segments"] = missing_segments(
+                            indexes, total_duration, movie_file.download_status == "READY"
+                        )
                     
                     response_data["available_segments"] = available_segments
                     response_data["total_duration"] = total_duration
-                    response_data["segment_duration"] = VideoService().segment_duration
+                    response_data["segment_duration"] = metadata_service.segment_duration
+                    response_data["startup_segments"] = metadata_service.startup_segments
                 except Exception as e:
                     logging.error(f"Error counting segments: {e}")
             
@@ -315,6 +216,57 @@ class VideoViewSet(viewsets.ViewSet):
         except MovieFile.DoesNotExist:
             return Response({"error": "Movie not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=True, methods=["get"], url_path="events", renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request, pk=None):
+        """Server-sent events with status, progress, new segments and errors"""
+        try:
+            movie_file = live_movie_file(pk)
+        except MovieFile.DoesNotExist:
+            return Response({"error": "Movie not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not event_streams.acquire(blocking=False):
+            response = Response(
+                {"error": "Too many event streams, poll file-status instead"}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response["Retry-After"] = str(settings.VIDEO_EVENTS_STREAM_SECONDS)
+            return response
+
+        response = StreamingHttpResponse(self._event_stream(pk, movie_file), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Let nginx pass events through as they happen
+        return response
+
+    def _event_stream(self, pk, movie_file):
+        subscription = progress_store.subscribe(pk)
+        try:
+            # EventSource reconnects by itself when the stream ends
+            yield "retry: 1000\n\n"
+            yield self._format_event({
+                "type": "status",
+                "status": movie_file.download_status,
+                "progress": movie_file.download_progress,
+            })
+            if movie_file.download_status in ["READY", "ERROR"]:
+                return
+
+            # Streams are bounded so a worker thread is not held past its timeout
+            deadline = time.time() + settings.VIDEO_EVENTS_STREAM_SECONDS
+            while time.time() < deadline:
+                event = subscription.next_event(timeout=min(15, max(deadline - time.time(), 0.1)))
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield self._format_event(event)
+                if event["type"] == "status" and event["status"] in ["READY", "ERROR"]:
+                    return
+        finally:
+            subscription.close()
+            event_streams.release()
+
+    @staticmethod
+    def _format_event(event):
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
     @action(detail=True, methods=["get"], url_path="stream")
     def stream(self, request, pk=None):
         """Stream movie content"""
@@ -329,32 +281,33 @@ class VideoViewSet(viewsets.ViewSet):
 
             # Get segment parameter (default to 0 for first segment)
             segment = int(request.query_params.get("segment", 0))
-            
-            # Get the full path structure from the stored file path
-            file_path = os.path.join("/app/downloads", movie_file.file_path)
-            
-            if segment != 0:  # For segments other than 0, we need to construct the segment path
-                dir_path = os.path.dirname(file_path)
-                base_name = os.path.splitext(os.path.basename(file_path))[0]
-                
-                if base_name.endswith("_segment_000"):
-                    base_name = base_name[:-12]
-                
-                segment_filename = f"{base_name}_segment_{segment:03d}.mp4"
-                file_path = os.path.join(dir_path, segment_filename)
+
+            movie_file.mark_watched()
+            segment_row = Segment.objects.filter(movie_file=movie_file, index=segment).first()
+            if segment_row is None:
+                return Response({"error": f"Segment {segment} not found"}, status=status.HTTP_404_NOT_FOUND)
+            file_path = storage.path(segment_row.path)
             
             if not os.path.exists(file_path):
                 return Response({"error": f"Segment {segment} not found"}, status=status.HTTP_404_NOT_FOUND)
-
-            video_service = VideoService()
+            if storage.tier(file_path) == storage.COLD:
+                # Served from the slow volume this time, the title moves back for the next requests
+                storage.promote_async(movie_file.tmdb_id)
 
             range_header = request.META.get("HTTP_RANGE", "").strip()
             start_time = float(request.query_params.get("start", 0))
 
-            response = video_service.stream_video(
+            if start_time > 0 and segment_row.keyframe_index is None:
+                # Segments recorded before fragments were indexed
+                segment_row.init_size, segment_row.keyframe_index = fragment_index(file_path)
+                segment_row.save(update_fields=["init_size", "keyframe_index"])
+
+            response = metadata_service.stream_video(
                 file_path=file_path,
                 range_header=range_header,
-                start_time=start_time
+                start_time=start_time,
+                request_headers=request.headers,
+                segment=segment_row,
             )
 
             return response
@@ -365,11 +318,70 @@ class VideoViewSet(viewsets.ViewSet):
             logger.error(f"Streaming error: {str(e)}")
             return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=["get"], url_path=r"hls/(?P<name>(?:\d+p/)?[\w.-]+)")
+    def hls(self, request, pk=None, name=None):
+        """Serve the HLS playlists, init segments and media segments of a title and its renditions"""
+        try:
+            movie_file = MovieFile.objects.get(tmdb_id=pk)
+
+            if movie_file.download_status not in ["READY", "PLAYABLE"] or not movie_file.file_path.endswith(".m3u8"):
+                return Response(
+                    {"error": f"No HLS playlist for this movie (status: {movie_file.download_status})"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            movie_file.mark_watched()
+            playlist_path = storage.path(movie_file.file_path)
+            hls_dir = os.path.dirname(playlist_path)
+            file_path = storage.path(os.path.join(os.path.dirname(movie_file.file_path), name))
+            cold = storage.tier(file_path) == storage.COLD or storage.tier(playlist_path) == storage.COLD
+            if cold:
+                storage.promote_async(movie_file.tmdb_id)
+
+            rendition, _, _ = name.rpartition("/")
+            if rendition and cold and not os.path.isfile(file_path):
+                # Renditions are packaged on the hot tier only, once the title moved back
+                response = Response({"error": "Movie is being restored"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response["Retry-After"] = "5"
+                return response
+            if rendition:
+                # Lower renditions are only packaged once a client asks for them
+                if metadata_service.start_rendition(hls_dir, int(rendition[:-1])) is None:
+                    return Response({"error": f"{name} not found"}, status=status.HTTP_404_NOT_FOUND)
+                if not os.path.isfile(file_path) and not name.endswith(".tmp"):
+                    # The packager just started, the client retries instead of holding a worker
+                    response = Response({"error": f"{name} is being packaged"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                    response["Retry-After"] = str(self.RENDITION_RETRY_AFTER)
+                    return response
+
+            if not os.path.isfile(file_path) or name.endswith(".tmp"):
+                return Response({"error": f"{name} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            if name.endswith(".m3u8"):
+                with open(file_path, "rb") as playlist:
+                    response = HttpResponse(playlist.read(), content_type="application/vnd.apple.mpegurl")
+                response["Cache-Control"] = "no-cache"
+                return response
+
+            return metadata_service.stream_video(
+                file_path=file_path,
+                range_header=request.META.get("HTTP_RANGE", "").strip(),
+                request_headers=request.headers,
+            )
+
+        except MovieFile.DoesNotExist:
+            return Response({"error": "Movie not found"}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"HLS error: {str(e)}")
+            return Response({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     @action(detail=True, methods=["get"], url_path="file-status")
     def file_status(self, request, pk=None):
         """Get movie file status including download progress"""
         try:
             movie_file = MovieFile.objects.get(tmdb_id=pk)
+            for field, value in (progress_store.get(pk) or {}).items():
+                setattr(movie_file, field, value)
             return Response(
                 {
                     "magnet_link": movie_file.magnet_link,
@@ -393,53 +405,29 @@ class VideoViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             
-            # Get the full path from the stored file path
-            file_path = os.path.join("/app/downloads", movie_file.file_path)
-            dir_path = os.path.dirname(file_path)
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            
-            # Remove _segment_000 suffix if it exists
-            if base_name.endswith("_segment_000"):
-                base_name = base_name[:-12]
-            
-            # Get total movie duration from original file
-            original_file_path = None
-            for ext in ['.mkv', '.mp4', '.avi']:
-                test_path = os.path.join(dir_path, f"{base_name}{ext}")
-                if os.path.exists(test_path):
-                    original_file_path = test_path
-                    break
-            
-            total_duration = None
-            if original_file_path:
-                video_service = VideoService()
-                total_duration = video_service.get_video_duration(original_file_path)
-            
-            # Find all available segments
-            available_segments = []
-            segment_num = 0
-            
-            while True:
-                segment_filename = f"{base_name}_segment_{segment_num:03d}.mp4"
-                segment_path = os.path.join(dir_path, segment_filename)
-                
-                if os.path.exists(segment_path):
-                    available_segments.append({
-                        "segment": segment_num,
-                        "filename": segment_filename,
-                        "size": os.path.getsize(segment_path)
-                    })
-                    segment_num += 1
-                else:
-                    break
-            
-            video_service = VideoService()
-            segment_duration = video_service.segment_duration
+            total_duration = source_duration(movie_file)
+            segment_rows = list(movie_file.segments.values("index", "path", "size", "start_time", "duration", "preview"))
+            available_segments = [
+                {
+                    "segment": row["index"],
+                    "filename": os.path.basename(row["path"]),
+                    "size": row["size"],
+                    "start_time": row["start_time"],
+                    "duration": row["duration"],
+                    "preview": row["preview"],
+                }
+                for row in segment_rows
+            ]
+            indexes = [row["index"] for row in segment_rows]
             
             return Response({
                 "available_segments": available_segments,
-                "segment_duration": segment_duration,
-                "total_segments": len(available_segments),
+                "segment_duration": metadata_service.segment_duration,
+                # Durations of the leading segments, the others last segment_duration
+                "startup_segments": metadata_service.startup_segments,
+                # Segments are numbered from 0, gaps are listed in missing_segments
+                "total_segments": indexes[-1] + 1 if indexes else 0,
+                "missing_segments": missing_segments(indexes, total_duration, movie_file.download_status == "READY"),
                 "total_duration": total_duration
             })
             
@@ -21,11 +21,14 @@ interface SegmentInfo {
   segment: number;
   filename: string;
   size: number;
+  start_time?: number;
+  duration?: number;
 }
 
 interface SegmentsData {
   available_segments: SegmentInfo[];
   segment_duration: number;
+  startup_segments?: number[]; // Durations of the leading segments, the others last segment_duration
   total_segments: number;
   total_duration?: number;
 }
@@ -49,6 +52,30 @@ interface MoviePlayerComponentProps {
 
 const BUFFER_SEGMENTS = 2; // Number of segments to pre-buffer
 
+// Segments do not all last segment_duration: the leading ones follow the server's startup profile
+const segmentBounds = (data: SegmentsData, index: number): [number, number] => {
+  const recorded = data.available_segments.find(seg => seg.segment === index);
+  if (recorded?.start_time !== undefined && recorded.duration) {
+    return [recorded.start_time, recorded.duration];
+  }
+  const startup = data.startup_segments ?? [];
+  if (index < startup.length) {
+    return [startup.slice(0, index).reduce((sum, duration) => sum + duration, 0), startup[index]];
+  }
+  const startupTotal = startup.reduce((sum, duration) => sum + duration, 0);
+  return [startupTotal + (index - startup.length) * data.segment_duration, data.segment_duration];
+};
+
+const segmentAt = (data: SegmentsData, time: number): number => {
+  let start = 0;
+  const startup = data.startup_segments ?? [];
+  for (let index = 0; index < startup.length; index++) {
+    if (time < start + startup[index]) return index;
+    start += startup[index];
+  }
+  return startup.length + Math.floor((Math.max(time, 0) - start) / data.segment_duration);
+};
+
 const MoviePlayer: React.FC<MoviePlayerComponentProps> = ({ movieId, magnet }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
@@ -243,8 +270,11 @@ const MoviePlayer: React.FC<MoviePlayerComponentProps> = ({ movieId, magnet }) =
         setTotalDuration(response.data.total_duration);
       }
       // Calculate available time based on available segments
-      const lastAvailableSegment = Math.max(...response.data.available_segments.map(seg => seg.segment));
-      setAvailableTime((lastAvailableSegment + 1) * response.data.segment_duration);
+      if (response.data.available_segments.length > 0) {
+        const lastAvailableSegment = Math.max(...response.data.available_segments.map(seg => seg.segment));
+        const [lastStart, lastDuration] = segmentBounds(response.data, lastAvailableSegment);
+        setAvailableTime(lastStart + lastDuration);
+      }
       
       // Initialize video with first segment if not already loaded
       if (currentVideoRef.current && !currentVideoRef.current.src && response.data.available_segments.length > 0) {
@@ -329,8 +359,8 @@ const MoviePlayer: React.FC<MoviePlayerComponentProps> = ({ movieId, magnet }) =
   const handleSeek = useCallback((newTime: number) => {
     if (!segmentsData || !isTimeAvailable(newTime)) return;
     
-    const targetSegment = Math.floor(newTime / segmentsData.segment_duration);
-    const segmentTime = newTime % segmentsData.segment_duration;
+    const targetSegment = segmentAt(segmentsData, newTime);
+    const segmentTime = newTime - segmentBounds(segmentsData, targetSegment)[0];
     
     setVirtualTime(newTime);
     
@@ -384,12 +414,12 @@ const MoviePlayer: React.FC<MoviePlayerComponentProps> = ({ movieId, magnet }) =
       if (!currentVideoRef.current || !segmentsData || isDragging || isTransitioning) return;
       
       const segmentTime = currentVideoRef.current.currentTime;
-      const baseTime = currentSegment * segmentsData.segment_duration;
+      const [baseTime, duration] = segmentBounds(segmentsData, currentSegment);
       const newVirtualTime = baseTime + segmentTime;
       
       setVirtualTime(newVirtualTime);
       
-      if (segmentTime >= segmentsData.segment_duration - 0.5) {
+      if (segmentTime >= duration - 0.5) {
         const nextSegment = currentSegment + 1;
         if (nextSegment < segmentsData.total_segments && bufferedSegments.includes(nextSegment)) {
           switchToSegment(nextSegment);